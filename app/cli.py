@@ -1,23 +1,66 @@
 # app/cli.py
 
 import argparse
+from collections import deque
+import cProfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 import ipaddress
 import json
 import logging
+import multiprocessing
 import os
 import sys
+import time
 from dotenv import load_dotenv
 
+from app.invalidation import expand_scope
+from app.ip_index import IPIndex
+from app.lazy_render import TENANT_COLORS_FILENAME
+from app.color_design import design_color_palette
+from app.data_store import save_data_stores
+from app.generations import DEFAULT_KEEP_GENERATIONS, new_generation
 from app.logging_config import setup_logging
+from app.manifest import RENDER_VERSION, RenderManifest, compute_digest
+from app.metrics import LAST_SUCCESS, REGISTRY, RENDER_SECONDS, RENDERED_PREFIXES, STAGE_SECONDS
 from app.netbox_integration import NetboxAddressManager
+from app.plot_batched import plot_allocation_grid_batched
 from app.plot_map import build_tenant_color_map, plot_allocation_grid
 from app.prefix_tree import PrefixTree
-from app.utils import filter_keys_from_dicts, ip_in_prefix, sanitize_name
+from app.profiling import DEFAULT_TOP, StatsDump, get_profiler, profile_update, profiled, stage
+from app.raster import render_allocation_grid
+from app.snapshot_store import SNAPSHOT_FILENAME, SnapshotStore
+from app.updater_manager import DEFAULT_DEBOUNCE_INTERVAL, DEFAULT_MAX_WAIT, UpdateCancelled, check_cancelled
+from app.updater_worker import UpdaterWorker, get_socket_path
+from app.utils import filter_keys_from_dicts, sanitize_name
 
 logging_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 
 MAX_PREFIX_LEN = 32
 
+RENDERERS = {
+    'matplotlib': plot_allocation_grid,
+    'matplotlib-batched': plot_allocation_grid_batched,
+    'raster': render_allocation_grid,
+}
+DEFAULT_RENDERER = 'matplotlib'
+
+SYNC_MODES = ('full', 'delta', 'offline')
+
+# eager renders every prefix on update; lazy renders only hot prefixes and leaves the rest to the web app
+RENDER_MODES = ('eager', 'lazy')
+
+# Prefix depth rendered on update in lazy mode: 0 renders the top-level prefixes of each VRF
+DEFAULT_PREWARM_DEPTH = 0
+
+# Keys shipped to render workers; everything else in the NetBox records is dropped
+PREFIX_JOB_KEYS = {"id", "prefix", "vrf", "tenant", "status"}
+CHILD_PREFIX_KEYS = {"id", "prefix", "vrf", "tenant"}
+
+# Per-process render settings, set once by the pool initializer
+_worker_context = {}
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Generate IP Address Allocation Grid Image.")
@@ -46,6 +89,77 @@ def parse_arguments():
         default=12,
         help="Size of each grid cell in pixels. Default is 8."
     )
+    parser.add_argument(
+        "-r", "--renderer",
+        choices=sorted(RENDERERS),
+        default=DEFAULT_RENDERER,
+        help=f"Image rendering backend (default: {DEFAULT_RENDERER})."
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used to render prefixes (default: 1, render in-process)."
+    )
+    parser.add_argument(
+        "-f", "--force",
+        action="store_true",
+        help="Re-render all prefixes, ignoring the render manifest."
+    )
+    parser.add_argument(
+        "-m", "--render-mode",
+        choices=RENDER_MODES,
+        default="eager",
+        help="Render every prefix (eager), or only prefixes down to --prewarm-depth and the rest "
+             "on first view in the web app (lazy) (default: eager)."
+    )
+    parser.add_argument(
+        "--prewarm-depth",
+        type=int,
+        default=DEFAULT_PREWARM_DEPTH,
+        help=f"Nesting depth of prefixes rendered in lazy mode; 0 is the top-level prefixes "
+             f"(default: {DEFAULT_PREWARM_DEPTH})."
+    )
+    parser.add_argument(
+        "-s", "--sync",
+        choices=SYNC_MODES,
+        default="full",
+        help="NetBox fetch mode: full download, delta of objects changed since the last run, "
+             "or offline from the local snapshot store (default: full)."
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run as a resident updater worker, updating on webhooks forwarded by the web app."
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        default=os.getenv('METRICS_TEXTFILE'),
+        help="Write Prometheus metrics of the update to this file, for the node_exporter textfile collector."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=os.getenv('PROFILE', '').lower() in ('1', 'true', 'yes'),
+        help="Profile the update by stage and by prefix with cProfile (default: PROFILE environment variable)."
+    )
+    parser.add_argument(
+        "--profile-dir",
+        type=str,
+        help="Directory for profiles; each update writes a subdirectory (default: profiles in the output directory)."
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"Number of slowest prefixes in the profile report (default: {DEFAULT_TOP})."
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        help="Socket of the updater worker (default: updater.sock in the output directory)."
+    )
 
     args = parser.parse_args()
 
@@ -76,8 +190,9 @@ def save_vrf_data(vrfs, output_dir):
         vrf_data.append(vrf_entry)
 
     vrf_filepath = os.path.join(output_dir, 'vrf.json')
-    with open(vrf_filepath, 'w') as f:
+    with open(f"{vrf_filepath}.tmp", 'w') as f:
         json.dump(vrf_data, f, indent=2)
+    os.replace(f"{vrf_filepath}.tmp", vrf_filepath)
     logging.info(f"Saved VRF data to {vrf_filepath}")
 
 
@@ -99,155 +214,609 @@ def save_prefix_tree(prefixes, output_dir):
         prefix_tree[vrf_id]['prefixes'].append(prefix_entry)
 
     prefix_tree_filepath = os.path.join(output_dir, 'prefix_tree.json')
-    with open(prefix_tree_filepath, 'w') as f:
+    with open(f"{prefix_tree_filepath}.tmp", 'w') as f:
         json.dump(prefix_tree, f, indent=2)
+    os.replace(f"{prefix_tree_filepath}.tmp", prefix_tree_filepath)
     logging.info(f"Saved prefix tree data to {prefix_tree_filepath}")
 
 
-def process_prefix(prefix_tree_obj, prefix_entry, prefix_subtree, ip_addresses, cell_size, tenant_color_map, output_dir):
-    prefix = prefix_entry.get("prefix", "").strip()
-    if not prefix:
-        logging.warning("Empty Prefix field encountered.")
-        return
-    logging.debug(f"Processing prefix {str(prefix_entry)}")
+def save_tenant_colors(tenant_color_map, output_dir):
+    """Save the tenant color map for on-demand renders, as [tenant, color] pairs."""
+    tenant_colors_filepath = os.path.join(output_dir, TENANT_COLORS_FILENAME)
+    with open(f"{tenant_colors_filepath}.tmp", 'w') as f:
+        json.dump(sorted(tenant_color_map.items(), key=lambda item: str(item[0])), f)
+    os.replace(f"{tenant_colors_filepath}.tmp", tenant_colors_filepath)
 
-    # Get VRF name
-    vrf = prefix_entry.get('vrf', None)
 
-    # Sanitize VRF and prefix for filenames
-    sanitized_vrf = sanitize_name(vrf)
-    sanitized_prefix = sanitize_name(prefix)
+def build_prefix_job(prefix_entry, child_prefixes, ip_table):
+    """
+    Build a compact, picklable payload with everything needed to render one prefix.
 
-    # Define output filenames
-    output_filename = f"address_map-{sanitized_vrf}-{sanitized_prefix}.png"
-    output_filepath = os.path.join(output_dir, output_filename)
+    Args:
+        prefix_entry (dict): The prefix being rendered.
+        child_prefixes (list): All prefixes below it, from PrefixTree.get_descendants.
+        ip_table (IPTable): The IPs inside the prefix, sorted by address.
 
-    json_filename = f"data-{sanitized_vrf}-{sanitized_prefix}.json"
-    json_filepath = os.path.join(output_dir, json_filename)
+    Returns:
+        dict: The job payload for process_prefix.
+    """
+    return {
+        'prefix_entry': {k: prefix_entry[k] for k in PREFIX_JOB_KEYS if k in prefix_entry},
+        'child_prefixes': filter_keys_from_dicts(child_prefixes, CHILD_PREFIX_KEYS),
+        'ip_addresses': ip_table,
+    }
 
-    # Collect child prefixes from the prefix subtree
-    child_prefixes = filter_keys_from_dicts(prefix_subtree.get("children", []), {"id", "prefix", "vrf", "tenant"})
 
-    # # Prepare data to save
-    # data_to_save = {
-    #     'prefix': prefix_entry,
-    #     'child_prefixes': child_prefixes,
-    #     'ip_addresses': ip_addresses,
-    # }
+def get_output_key(prefix_entry):
+    """Return the '<vrf>-<prefix>' stem shared by all output files of a prefix."""
+    return f"{sanitize_name(prefix_entry.get('vrf', None))}-{sanitize_name(prefix_entry.get('prefix', '').strip())}"
 
-    # # Check if JSON data has changed
-    # data_changed = True
-    # if os.path.exists(json_filepath):
-    #     with open(json_filepath, 'r') as f:
-    #         existing_data = json.load(f)
-    #     if existing_data == data_to_save:
-    #         data_changed = False
 
-    # if data_changed:
-    #     # Save JSON data
-    #     with open(json_filepath, 'w') as f:
-    #         json.dump(data_to_save, f, indent=2)
-    #     logging.info(f"Saved data for prefix {prefix} to {json_filepath}")
+def get_image_path(prefix_entry, output_dir):
+    """Get the image file path for a prefix."""
+    return os.path.join(output_dir, f"address_map-{get_output_key(prefix_entry)}.png")
 
-    # if not data_changed and os.path.exists(output_filepath):
-    #     logging.debug(f"No changes detected for prefix {prefix}. Skipping image regeneration.")
-    #     return
 
-    # Generate image
+def compute_job_digest(job, cell_size, tenant_color_map, renderer):
+    """
+    Digest every input that affects the rendered image of a prefix job.
+    """
+    tenants = {child.get('tenant') for child in job['child_prefixes']}
+    return compute_digest({
+        'prefix': job['prefix_entry'],
+        'child_prefixes': job['child_prefixes'],
+        'ip_addresses': job['ip_addresses'].fingerprint(),
+        'cell_size': cell_size,
+        'palette': design_color_palette(),
+        'tenant_colors': sorted((str(tenant), tenant_color_map.get(tenant)) for tenant in tenants),
+        'renderer': [renderer, RENDER_VERSION],
+    })
 
-    plot_allocation_grid(prefix_entry, child_prefixes, ip_addresses, output_filepath, cell_size, tenant_color_map)
-    logging.debug(f"Generated image for prefix {prefix} at {output_filepath}")
 
-    prefix_tree = prefix_tree_obj.build_tree(vrf)
-    filtered_ip_addresses = filter_keys_from_dicts(ip_addresses, {"id", "address", "vrf", "tenant"})
-    data_to_save = {
-        'prefix': prefix_entry["prefix"],
-        'child_prefixes': child_prefixes,
-        'ip_addresses': filtered_ip_addresses,
-    }
+def process_prefix(job, cell_size, tenant_color_map, output_dir, renderer=DEFAULT_RENDERER):
+    prefix_entry = job['prefix_entry']
+    child_prefixes = job['child_prefixes']
+    ip_table = job['ip_addresses']
 
-    with open(json_filepath, 'w') as f:
-        json.dump(data_to_save, f, indent=2)
-    logging.debug(f"Saved data for prefix {prefix} to {json_filepath}")
+    prefix = prefix_entry.get("prefix", "").strip()
+    if not prefix:
+        logging.warning("Empty Prefix field encountered.")
+        return
+    logging.debug(f"Processing prefix {str(prefix_entry)}")
 
+    output_filepath = get_image_path(prefix_entry, output_dir)
 
-def process_all_prefixes(prefixes, ip_addresses, cell_size, output_dir):
+    # The previous image may be hard-linked into older output generations; unlink it instead of overwriting
+    if os.path.exists(output_filepath):
+        os.remove(output_filepath)
 
-    # Build separate prefix trees for each VRF
-    prefix_tree_obj = PrefixTree()
-    for prefix_entry in prefixes:
-        prefix_data = {
-            'id': prefix_entry['id'],
-            'vrf': prefix_entry.get('vrf'),
-            'tenant': prefix_entry.get('tenant'),
-            'prefix': prefix_entry['prefix']
-        }
-        prefix_tree_obj.add_prefix(prefix_data)
+    # Generate image
+
+    render = RENDERERS[renderer]
+    render(prefix_entry, child_prefixes, ip_table, output_filepath, cell_size, tenant_color_map)
+    logging.debug(f"Generated image for prefix {prefix} at {output_filepath}")
 
 
-    tenant_color_map = build_tenant_color_map(prefixes)
+def _init_worker(context, log_level):
+    """Initialize a render worker process."""
+    setup_logging(level=log_level)  # Spawned workers start without logging handlers
+    _worker_context.update(context)
 
+
+def run_prefix_job(job, context=None):
+    """
+    Render one prefix job, logging errors instead of raising them.
+
+    Returns:
+        tuple: (prefix, error message or None).
+    """
+    context = context if context is not None else _worker_context
+    prefix = job['prefix_entry'].get('prefix')
+    try:
+        process_prefix(job, **context)
+        return prefix, None
+    except Exception as e:
+        logging.error(f"Error processing prefix '{prefix}': {e}")
+        return prefix, str(e)
+
+
+def _imap_ordered(executor, fn, items, window):
+    """
+    Map fn over items in the executor, keeping at most window jobs in flight.
+    Yields (item, result) pairs in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def run_timed_prefix_job(job, context=None, profile=False):
+    """
+    Run a prefix job and measure it in the worker, where the render time is known.
+
+    Args:
+        profile (bool): Also profile the job with cProfile.
+
+    Returns:
+        tuple: (run_prefix_job result, seconds, StatsDump of the job or None).
+    """
+    if not profile:
+        start = time.perf_counter()
+        result = run_prefix_job(job, context)
+        return result, time.perf_counter() - start, None
+    job_profile = cProfile.Profile()
+    start = time.perf_counter()
+    with profiled(job_profile):
+        result = run_prefix_job(job, context)
+    return result, time.perf_counter() - start, StatsDump(job_profile)
+
+
+def _record_job_result(manifest, digests, job, error, rendered, failed, renderer=DEFAULT_RENDERER, seconds=None):
+    """Update the manifest and the render metrics with the outcome of one prefix job."""
+    key = get_output_key(job['prefix_entry'])
+    if error:
+        manifest.discard(key)
+        failed.append(key)
+    else:
+        manifest.record(key, digests[key])
+        rendered.append(key)
+        if seconds is not None:
+            RENDER_SECONDS.observe(seconds, renderer=renderer)
+    RENDERED_PREFIXES.inc(result='failed' if error else 'ok')
+
+
+def generate_prefix_jobs(prefixes, prefix_tree_obj, ip_index, targets=None):
+    """
+    Yield a render job for every plottable prefix.
+    When targets is given, only (vrf, prefix) pairs in it are yielded.
+    """
     for prefix_entry in prefixes:
+        prefix = prefix_entry.get('prefix')
         try:
             vrf = prefix_entry.get('vrf')  # None for Global VRF
-            prefix = prefix_entry['prefix']
-            # Get the subtree for the current prefix
-            prefix_subtree = prefix_tree_obj.get_subtree(prefix, vrf)
+            if targets is not None and (vrf, prefix) not in targets:
+                continue
+            # Get all prefixes below the current prefix
+            child_prefixes = prefix_tree_obj.get_descendants(prefix, vrf)
             network = ipaddress.ip_network(prefix, strict=False)
             prefix_length = network.prefixlen
             if prefix_length > MAX_PREFIX_LEN:
                 continue
 
-            # Filter ip_addresses by prefix
-            filtered_ip_addresses = [
-                ip for ip in ip_addresses
-                if ip_in_prefix(ip.get("address", ""), prefix)
-            ]
-
-            process_prefix(prefix_tree_obj, prefix_entry, prefix_subtree, filtered_ip_addresses, cell_size, tenant_color_map, output_dir)
+            # Slice the IP addresses of this prefix and VRF from the index
+            with stage('ip_filter'):
+                ip_table = ip_index.lookup_table(prefix, vrf)
+            job = build_prefix_job(prefix_entry, child_prefixes, ip_table)
         except Exception as e:
             logging.error(f"Error processing prefix '{prefix}': {e}")
             continue
+        yield job
+
+
+def filter_stale_jobs(jobs, manifest, context, digests):
+    """
+    Yield only the jobs whose input digest differs from the manifest or whose files are missing.
+    Digests of yielded jobs are stored in digests by output key.
+    """
+    for job in jobs:
+        key = get_output_key(job['prefix_entry'])
+        digest = compute_job_digest(job, context['cell_size'], context['tenant_color_map'], context['renderer'])
+        digests[key] = digest
+        if manifest.is_current(key, digest, [get_image_path(job['prefix_entry'], context['output_dir'])]):
+            logging.debug(f"No changes detected for prefix {job['prefix_entry'].get('prefix')}. Skipping.")
+            continue
+        yield job
+
+
+def remove_orphaned_images(output_dir, keep_keys):
+    """Remove images of prefixes that no longer exist."""
+    keep_files = {f"address_map-{key}.png" for key in keep_keys}
+    for filename in os.listdir(output_dir):
+        if filename.startswith('address_map-') and filename.endswith('.png') and filename not in keep_files:
+            os.remove(os.path.join(output_dir, filename))
+            logging.debug(f"Removed orphaned image {filename}")
+
+
+def select_prewarm_targets(prefix_tree_obj, depth):
+    """
+    Select the prefixes nested at most depth levels below a top-level prefix.
+
+    Returns:
+        set: (vrf, prefix) pairs.
+    """
+    targets = set()
+    for vrf in list(prefix_tree_obj.trees):
+        for tree_key in ('ipv4', 'ipv6'):
+            materialized = prefix_tree_obj.get_materialized(vrf, tree_key)
+            depths = []
+            for i, parent in enumerate(materialized.parent):
+                # Parents precede their children in preorder
+                depths.append(0 if parent < 0 else depths[parent] + 1)
+                if depths[i] <= depth:
+                    targets.add((vrf, materialized.prefixes[i]))
+    return targets
+
+
+def build_prefix_tree(prefixes):
+    """Build separate prefix trees for each VRF."""
+    with stage('tree_build'):
+        prefix_tree_obj = PrefixTree()
+        for prefix_entry in prefixes:
+            prefix_data = {
+                'id': prefix_entry['id'],
+                'vrf': prefix_entry.get('vrf'),
+                'tenant': prefix_entry.get('tenant'),
+                'prefix': prefix_entry['prefix']
+            }
+            prefix_tree_obj.add_prefix(prefix_data)
+    return prefix_tree_obj
+
+
+def process_all_prefixes(prefixes, ip_addresses, cell_size, output_dir, renderer=DEFAULT_RENDERER, workers=1,
+                         force=False, targets=None, prefix_tree_obj=None, ip_scope=None, prewarm_depth=None,
+                         cancel=None):
+    """
+    Render images for all prefixes, or only for the (vrf, prefix) pairs in targets,
+    and write the per-VRF data stores.
+    ip_scope lists the (vrf, prefix) pairs whose IPs ip_addresses holds, when it holds only part of them.
+    With prewarm_depth, only prefixes down to that depth are rendered (lazy mode); images of
+    the other prefixes are removed from the output, as the web app renders them on demand.
+    With cancel, the update stops with UpdateCancelled between render jobs and before the data stores
+    are written; rendered images are kept in the manifest, so the next run resumes.
+    """
+    if prefix_tree_obj is None:
+        prefix_tree_obj = build_prefix_tree(prefixes)
 
-    save_prefix_tree(prefixes, output_dir)
-
-
-def full_update(args=None) -> bool:
+    tenant_color_map = build_tenant_color_map(prefixes)
+    with stage('json_write'):
+        save_tenant_colors(tenant_color_map, output_dir)
+
+    render_targets = targets
+    if prewarm_depth is not None:
+        hot = select_prewarm_targets(prefix_tree_obj, prewarm_depth)
+        render_targets = hot if targets is None else targets & hot
+
+    # Parse IP addresses once (unless already columnar) into per-VRF sorted integer arrays
+    with stage('ip_index'):
+        ip_index = IPIndex(ip_addresses)
+
+    context = {
+        'cell_size': cell_size,
+        'tenant_color_map': tenant_color_map,
+        'output_dir': output_dir,
+        'renderer': renderer,
+    }
+    manifest = RenderManifest(output_dir)
+    if force:
+        manifest.entries.clear()
+    digests = {}
+    jobs = filter_stale_jobs(
+        generate_prefix_jobs(prefixes, prefix_tree_obj, ip_index, render_targets), manifest, context, digests
+    )
 
+    rendered = []
+    failed = []
+    profiler = get_profiler()
+    run_job = partial(run_timed_prefix_job, profile=profiler is not None)
+    with stage('render'):
+        try:
+            if workers > 1:
+                logging.info(f"Rendering prefixes with {workers} worker processes")
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(context, logging.getLogger().level),
+                ) as executor:
+                    for job, ((prefix, error), seconds, stats) in _imap_ordered(executor, run_job, jobs, workers * 4):
+                        _record_job_result(manifest, digests, job, error, rendered, failed, renderer, seconds)
+                        if profiler:
+                            profiler.add_prefix(job, seconds, stats)
+                        check_cancelled(cancel, "next render job")
+            else:
+                for job in jobs:
+                    (prefix, error), seconds, stats = run_job(job, context)
+                    _record_job_result(manifest, digests, job, error, rendered, failed, renderer, seconds)
+                    if profiler:
+                        profiler.add_prefix(job, seconds, stats)
+                    check_cancelled(cancel, "next render job")
+            if targets is None:
+                manifest.prune(digests)
+                remove_orphaned_images(output_dir, digests)
+        finally:
+            # Persist progress even when interrupted, so the next run resumes
+            manifest.save()
+
+    logging.info(f"Rendered {len(rendered)} prefixes, {len(digests) - len(rendered) - len(failed)} unchanged")
+    if failed:
+        logging.warning(f"Failed to render {len(failed)} prefixes")
+
+    check_cancelled(cancel, "data stores")
+    with stage('data_stores'):
+        save_data_stores(output_dir, prefix_tree_obj, ip_index, ip_scope, targets)
+    with stage('json_write'):
+        save_prefix_tree(prefixes, output_dir)
+
+
+class UpdateState:
+    def __init__(self):
+        """
+        State kept between updates by a resident updater: the NetBox client with the last
+        dataset, and the prefix tree, which is reused as long as the prefixes do not change.
+        """
+        self.mgr = None
+        self.prefix_key = None
+        self.prefix_tree_obj = None
+
+    def get_manager(self):
+        if self.mgr is None:
+            self.mgr = NetboxAddressManager(fetch=False)
+        return self.mgr
+
+    def get_prefix_tree(self, prefixes):
+        # Only the fields used by build_prefix_tree decide whether the tree changed
+        prefix_key = [
+            (entry['id'], entry.get('vrf'), entry.get('tenant'), entry['prefix']) for entry in prefixes
+        ]
+        if prefix_key != self.prefix_key:
+            self.prefix_tree_obj = build_prefix_tree(prefixes)
+            self.prefix_key = prefix_key
+        else:
+            logging.debug("Prefixes unchanged; reusing the prefix tree")
+        return self.prefix_tree_obj
+
+
+def get_update_settings(args=None):
+    """
+    Resolve update settings from environment variables and CLI arguments.
+
+    Returns:
+        dict or None: Settings, or None if they are invalid.
+    """
     load_dotenv()
 
     if (args):
-        cell_size = int(os.getenv('CELL_SIZE', args.cell_size))
-        output_dir = os.getenv('OUTPUT_DIR', args.output)
+        settings = {
+            'cell_size': int(os.getenv('CELL_SIZE', args.cell_size)),
+            'output_dir': os.getenv('OUTPUT_DIR', args.output),
+            'renderer': os.getenv('RENDERER', args.renderer),
+            'workers': int(os.getenv('WORKERS', args.workers)),
+            'force': args.force,
+            'sync': os.getenv('SYNC_MODE', args.sync),
+            'reconcile_interval': float(os.getenv('SYNC_RECONCILE_INTERVAL', 3600)),
+            'keep_generations': int(os.getenv('KEEP_GENERATIONS', DEFAULT_KEEP_GENERATIONS)),
+            'render_mode': os.getenv('RENDER_MODE', args.render_mode),
+            'prewarm_depth': int(os.getenv('PREWARM_DEPTH', args.prewarm_depth)),
+            'profile': args.profile,
+            'profile_dir': os.getenv('PROFILE_DIR', args.profile_dir),
+            'profile_top': int(os.getenv('PROFILE_TOP', args.profile_top)),
+        }
     else:
-        cell_size = int(os.getenv('CELL_SIZE', 4))
-        output_dir = os.getenv('OUTPUT_DIR', 'output')
+        settings = {
+            'cell_size': int(os.getenv('CELL_SIZE', 4)),
+            'output_dir': os.getenv('OUTPUT_DIR', 'output'),
+            'renderer': os.getenv('RENDERER', DEFAULT_RENDERER),
+            'workers': int(os.getenv('WORKERS', 1)),
+            'force': False,
+            'sync': os.getenv('SYNC_MODE', 'full'),
+            'reconcile_interval': float(os.getenv('SYNC_RECONCILE_INTERVAL', 3600)),
+            'keep_generations': int(os.getenv('KEEP_GENERATIONS', DEFAULT_KEEP_GENERATIONS)),
+            'render_mode': os.getenv('RENDER_MODE', 'eager'),
+            'prewarm_depth': int(os.getenv('PREWARM_DEPTH', DEFAULT_PREWARM_DEPTH)),
+            'profile': os.getenv('PROFILE', '').lower() in ('1', 'true', 'yes'),
+            'profile_dir': os.getenv('PROFILE_DIR'),
+            'profile_top': int(os.getenv('PROFILE_TOP', DEFAULT_TOP)),
+        }
+
+    if settings['renderer'] not in RENDERERS:
+        logging.error(f"Unknown renderer '{settings['renderer']}'. Choose from {', '.join(sorted(RENDERERS))}.")
+        return None
+    if settings['render_mode'] not in RENDER_MODES:
+        logging.error(f"Unknown render mode '{settings['render_mode']}'. Choose from {', '.join(RENDER_MODES)}.")
+        return None
+    if settings['sync'] not in SYNC_MODES:
+        logging.error(f"Unknown sync mode '{settings['sync']}'. Choose from {', '.join(SYNC_MODES)}.")
+        return None
+    settings['snapshot_db'] = os.getenv('SNAPSHOT_DB', os.path.join(settings['output_dir'], SNAPSHOT_FILENAME))
+    if not settings['profile_dir']:
+        settings['profile_dir'] = os.path.join(settings['output_dir'], 'profiles')
 
     # TIME_ZONE = os.getenv('TIME_ZONE', 'UTC')
 
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(settings['output_dir'], exist_ok=True)
+    return settings
 
+
+def profile_run(settings, kind):
+    """Return a context profiling an update of the given kind if profiling is enabled, else a no-op."""
+    if not settings['profile']:
+        return nullcontext()
+    run_dir = os.path.join(settings['profile_dir'], f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}")
+    return profile_update(run_dir, settings['profile_top'])
+
+
+def full_update(args=None, cancel=None, state=None) -> bool:
+    """
+    Sync the NetBox snapshot and render all prefixes into a new output generation.
+
+    Args:
+        args: Parsed CLI arguments, or None to use environment variables only.
+        cancel (threading.Event): Preempts the update at the next stage boundary when set.
+        state (UpdateState): State reused from previous updates, or None.
+
+    Returns:
+        bool: True on success.
+
+    Raises:
+        UpdateCancelled: If the update was preempted; the generation is left unpublished.
+    """
+    settings = get_update_settings(args)
+    if settings is None:
+        return False
+
+    with profile_run(settings, 'full'):
+        try:
+            logging.info("Starting IP Address Allocation Visualization Script")
+            start = time.perf_counter()
+            mgr = state.get_manager() if state else NetboxAddressManager(fetch=False)
+            store = SnapshotStore(settings['snapshot_db'])
+            try:
+                with stage('sync'):
+                    if settings['sync'] == 'offline':
+                        mgr.load_snapshot(store)
+                    else:
+                        mgr.sync_snapshot(store, settings['reconcile_interval'], full=settings['sync'] == 'full')
+            finally:
+                store.close()
+            prefixes = mgr.get_prefixes()
+            ip_addresses = mgr.get_ip_addresses()
+            vrfs = mgr.get_vrfs()
+            check_cancelled(cancel, "rendering")
+            with new_generation(settings['output_dir'], settings['keep_generations']) as generation_dir:
+                with stage('json_write'):
+                    save_vrf_data(vrfs, generation_dir)
+                process_all_prefixes(
+                    prefixes, ip_addresses, settings['cell_size'], generation_dir,
+                    settings['renderer'], settings['workers'], settings['force'],
+                    prewarm_depth=settings['prewarm_depth'] if settings['render_mode'] == 'lazy' else None,
+                    prefix_tree_obj=state.get_prefix_tree(prefixes) if state else None, cancel=cancel,
+                )
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='full_update')
+            LAST_SUCCESS.set(time.time(), kind='full')
+            return True
+
+        except UpdateCancelled:
+            raise
+        except Exception as e:
+            logging.error(e)
+            return False
+
+
+def update_prefixes(scope, args=None, cancel=None, state=None) -> bool:
+    """
+    Re-render only the prefixes in scope and their ancestors.
+
+    All prefixes are fetched, since tenant colors and the saved prefix tree depend on them,
+    but IP addresses are fetched only inside the root prefixes covering the scope.
+
+    Args:
+        scope (dict): {vrf: set of prefixes}, as produced by scope_webhook.
+        cancel (threading.Event): Preempts the update at the next stage boundary when set.
+        state (UpdateState): State reused from previous updates, or None.
+
+    Returns:
+        bool: True on success. False in lazy render mode, so the caller falls back to a full update.
+    """
+    settings = get_update_settings(args)
+    if settings is None:
+        return False
+    if settings['render_mode'] == 'lazy':
+        # On-demand renders read the snapshot store, which only a full update refreshes
+        logging.info("Scoped updates are not used in lazy render mode")
+        return False
+
+    with profile_run(settings, 'scoped'):
+        try:
+            logging.info(f"Starting scoped update of {sum(len(p) for p in scope.values())} prefixes")
+            start = time.perf_counter()
+            mgr = state.get_manager() if state else NetboxAddressManager(fetch=False)
+            with stage('sync'):
+                prefixes = mgr.fetch_prefixes()
+            prefix_tree_obj = state.get_prefix_tree(prefixes) if state else build_prefix_tree(prefixes)
+            targets = expand_scope(scope, prefix_tree_obj)
+
+            # The root of every covering chain holds all IPs needed by the targets below it
+            roots = set()
+            for vrf, prefix in targets:
+                covering = prefix_tree_obj.get_covering_prefixes(prefix, vrf)
+                if covering:
+                    roots.add((vrf, covering[-1]))
+            with stage('sync'):
+                ip_addresses = mgr.fetch_ip_addresses_within(roots)
+
+            check_cancelled(cancel, "rendering")
+            with new_generation(settings['output_dir'], settings['keep_generations']) as generation_dir:
+                process_all_prefixes(
+                    prefixes, ip_addresses, settings['cell_size'], generation_dir,
+                    settings['renderer'], settings['workers'], settings['force'],
+                    targets=targets, prefix_tree_obj=prefix_tree_obj, ip_scope=roots, cancel=cancel,
+                )
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='scoped_update')
+            LAST_SUCCESS.set(time.time(), kind='scoped')
+            return True
+
+        except UpdateCancelled:
+            raise
+        except Exception as e:
+            logging.error(e)
+            return False
+
+
+def write_metrics(path):
+    """Write the metrics to a textfile, if a path is configured."""
+    if not path:
+        return
     try:
-        logging.info("Starting IP Address Allocation Visualization Script")
-        mgr = NetboxAddressManager()
-        prefixes = mgr.get_prefixes()
-        ip_addresses = mgr.get_ip_addresses()
-        vrfs = mgr.get_vrfs()
-        save_vrf_data(vrfs, output_dir)
-        process_all_prefixes(prefixes, ip_addresses, cell_size, output_dir)
-        return True
+        REGISTRY.write_textfile(path)
+    except OSError as e:
+        logging.error(f"Failed to write metrics to {path}: {e}")
 
-    except Exception as e:
-        logging.error(e)
+
+def run_daemon(args) -> bool:
+    """
+    Run a resident updater worker, which keeps its imports and an UpdateState warm between updates.
+    """
+    settings = get_update_settings(args)
+    if settings is None:
         return False
 
+    state = UpdateState()
+
+    def run_full(cancel=None):
+        try:
+            return full_update(args, cancel=cancel, state=state)
+        finally:
+            write_metrics(args.metrics_file)
+
+    def run_scoped(scope, cancel=None):
+        try:
+            return update_prefixes(scope, args, cancel=cancel, state=state)
+        finally:
+            write_metrics(args.metrics_file)
+
+    worker = UpdaterWorker(
+        args.socket or get_socket_path(settings['output_dir']),
+        settings['output_dir'],
+        run_full,
+        run_scoped,
+        debounce_interval=float(os.getenv('UPDATE_DEBOUNCE', DEFAULT_DEBOUNCE_INTERVAL)),
+        max_wait=float(os.getenv('UPDATE_MAX_WAIT', DEFAULT_MAX_WAIT)),
+    )
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Updater worker interrupted")
+    return True
+
 
 def cli():
     args = parse_arguments()
 
     setup_logging(level=getattr(logging, args.log_level), debug=args.debug)
 
+    if args.daemon:
+        if not run_daemon(args):
+            sys.exit(1)
+        return
+
     result = full_update(args)
+    write_metrics(args.metrics_file)
     if result:
         logging.info("Script completed successfully")
     else:
@@ -78,3 +78,28 @@ def blend_colors(color1, color2, alpha):
         int((1 - alpha) * c1 + alpha * c2) for c1, c2 in zip(rgb1, rgb2)
     )
     return '#{:02x}{:02x}{:02x}'.format(*blended)
+
+
+NAMED_COLORS = {
+    'black': '#000000',
+    'white': '#ffffff',
+}
+
+
+def color_to_rgb(color):
+    """
+    Convert a hex or named color to an (r, g, b) tuple of integers.
+
+    Args:
+        color (str): Color in hex format (e.g., '#ff0000') or a name from NAMED_COLORS.
+
+    Returns:
+        tuple or None: The RGB components (0-255), or None for 'none'.
+    """
+    if not color or color == 'none':
+        return None
+    color = NAMED_COLORS.get(color, color)
+    if not color.startswith('#') or len(color) != 7:
+        raise ValueError(f"Unsupported color: {color}")
+    color = color.lstrip('#')
+    return tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
@@ -0,0 +1,413 @@
+# app/data_store.py
+
+from collections import OrderedDict
+import gzip
+import ipaddress
+import json
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+
+from app.ip_table import IPTable
+from app.utils import sanitize_name
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when the file layout changes
+DATA_STORE_VERSION = 2
+
+# Fields of the IP addresses and prefixes served by /data/<vrf>/<prefix>
+IP_DATA_KEYS = ('id', 'address', 'vrf', 'tenant')
+PREFIX_DATA_KEYS = ('id', 'prefix', 'vrf', 'tenant')
+
+# Payload formats of /data/<vrf>/<prefix>, by media type
+PACKED_MIMETYPE = 'application/vnd.prefix-map.packed'
+FORMATS = {
+    'json': 'application/json',
+    'packed': PACKED_MIMETYPE,
+}
+
+# Packed payload: magic, header length, JSON header padded to 4 bytes, then fixed-width records.
+# tenant is -1 (NULL_ID) for no tenant; NetBox IDs fit in 32 bits.
+PACKED_MAGIC = b'PMAP'
+PACKED_RECORD = np.dtype({
+    'names': ['id', 'address', 'tenant', 'prefixlen'],
+    'formats': ['<u4', '<u4', '<i4', 'u1'],
+    'offsets': [0, 4, 8, 12],
+    'itemsize': 16,
+})
+
+# Content encodings precompressed at generation time, in order of preference
+ENCODINGS = {'br': '.br', 'gzip': '.gz'} if brotli else {'gzip': '.gz'}
+
+# Payloads smaller than this are served uncompressed rather than stored compressed
+PRECOMPRESS_MIN_SIZE = 16 * 1024
+
+# Upper bound of the serialized size of a prefix in a payload header
+PREFIX_SIZE_ESTIMATE = 256
+
+# Parsed indexes kept in memory, across VRFs and generations
+MAX_CACHED_INDEXES = 32
+
+# Index path -> (file identity, parsed index), least recently used first
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_store_paths(output_dir, vrf):
+    """
+    Get the file paths of a VRF store.
+
+    Args:
+        output_dir (str): Output directory.
+        vrf: The VRF ID (None for Global VRF), or its name as used in URLs.
+
+    Returns:
+        tuple: (JSON lines IP file path, packed IP file path, index path).
+    """
+    vrf_key = sanitize_name(str(vrf))
+    return (
+        os.path.join(output_dir, f"ips-{vrf_key}.jsonl"),
+        os.path.join(output_dir, f"ips-{vrf_key}.bin"),
+        os.path.join(output_dir, f"index-{vrf_key}.json"),
+    )
+
+
+def get_payload_path(output_dir, vrf, sanitized_prefix, fmt, encoding):
+    """Get the path of a precompressed payload of a prefix."""
+    return os.path.join(
+        output_dir, f"payload-{sanitize_name(str(vrf))}-{sanitized_prefix}.{fmt}{ENCODINGS[encoding]}"
+    )
+
+
+def _write_atomic(path, data):
+    """Write bytes to a temporary file and move it into place, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode_lines(ip_table):
+    """Return the IPs of a table as compact JSON lines."""
+    records = ip_table.to_records(IP_DATA_KEYS)
+    return [json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n' for record in records]
+
+
+def _pack_records(ip_table):
+    """Return the IPs of a table as packed records."""
+    records = np.zeros(len(ip_table), dtype=PACKED_RECORD)
+    for name in PACKED_RECORD.names:
+        records[name] = ip_table.columns[name]
+    return records
+
+
+def _load_stored(ips_path, bin_path):
+    """
+    Load the stored IPs of a VRF as (JSON lines, packed records) in the same order.
+    Stores written before the packed file existed are repacked from the JSON lines.
+    """
+    if not os.path.exists(ips_path):
+        return [], np.zeros(0, dtype=PACKED_RECORD)
+    with open(ips_path, 'rb') as f:
+        lines = f.readlines()
+    if os.path.exists(bin_path):
+        records = np.fromfile(bin_path, dtype=PACKED_RECORD)
+    else:
+        records = _pack_records(IPTable.from_records(json.loads(line) for line in lines))
+    return lines, records
+
+
+def _network_range(prefix):
+    network = ipaddress.ip_network(prefix, strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def encode_payload(fmt, prefix_data, child_prefixes, ip_data):
+    """
+    Build the /data/<vrf>/<prefix> response body.
+
+    Args:
+        fmt (str): 'json' or 'packed'.
+        prefix_data (dict): The prefix.
+        child_prefixes (list): Its descendants, in preorder.
+        ip_data (bytes): Its IPs as JSON lines for 'json', or as packed records for 'packed'.
+                         Both are copied into the body without being decoded.
+
+    Returns:
+        bytes: The response body.
+    """
+    header = {
+        'prefix': prefix_data['prefix'],
+        'vrf': prefix_data.get('vrf'),
+        'child_prefixes': child_prefixes,
+        'url': f"/map/{sanitize_name(str(prefix_data.get('vrf')))}/{sanitize_name(prefix_data['prefix'])}",
+    }
+    if fmt == 'json':
+        ip_addresses = b'[' + b','.join(ip_data.splitlines()) + b']'
+        return json.dumps(header).encode('utf-8')[:-1] + b', "ip_addresses": ' + ip_addresses + b'}'
+
+    header['count'] = len(ip_data) // PACKED_RECORD.itemsize
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 4)
+    return PACKED_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + ip_data
+
+
+def compress_payload(payload, encoding):
+    if encoding == 'br':
+        return brotli.compress(payload)
+    return gzip.compress(payload, mtime=0)
+
+
+def _precompress(output_dir, vrf, sanitized_prefix, fmt, payload):
+    for encoding in ENCODINGS:
+        path = get_payload_path(output_dir, vrf, sanitized_prefix, fmt, encoding)
+        _write_atomic(path, compress_payload(payload, encoding))
+
+
+def _remove_payloads(output_dir, vrf, keep=None):
+    """Remove the precompressed payloads of a VRF, except those of the sanitized prefixes in keep."""
+    stem = f"payload-{sanitize_name(str(vrf))}-"
+    for filename in os.listdir(output_dir):
+        if filename.startswith(stem):
+            if keep is not None and filename[len(stem):].split('.')[0] in keep:
+                continue
+            os.remove(os.path.join(output_dir, filename))
+
+
+def write_vrf_store(output_dir, vrf, materialized, ip_table, refreshed=None, targets=None):
+    """
+    Write the IP files, index and precompressed payloads of a VRF.
+
+    The IP files hold one entry per IP, sorted by address: a compact JSON line, and a packed
+    record at the same position. The index lists the prefixes in preorder and maps every prefix
+    to its position, the byte range of its IPs in the JSON lines file, the position range of its
+    descendants, and the record range of its IPs. Each IP and prefix is thus stored once,
+    however deeply it is nested. Only payloads of at least PRECOMPRESS_MIN_SIZE bytes are
+    also stored compressed.
+
+    Args:
+        output_dir (str): Output directory.
+        vrf: The VRF ID (None for Global VRF).
+        materialized (MaterializedTree): The IPv4 prefixes of the VRF.
+        ip_table (IPTable): IPs of the VRF, sorted by address.
+        refreshed (list): (first, last) integer address ranges covered by ip_table. Stored IPs
+                          outside these ranges are kept. None replaces all stored IPs.
+        targets (set): Sanitized prefixes whose payloads may have changed. Precompressed payloads
+                       of the other prefixes are kept as they are. None rewrites all payloads.
+    """
+    ips_path, bin_path, index_path = get_store_paths(output_dir, vrf)
+    lines = _encode_lines(ip_table)
+    records = _pack_records(ip_table)
+    if refreshed is not None:
+        stored_lines, stored_records = _load_stored(ips_path, bin_path)
+        keep = np.ones(len(stored_records), dtype=bool)
+        for first, last in refreshed:
+            keep &= (stored_records['address'] < first) | (stored_records['address'] > last)
+        if keep.any():
+            lines = [line for line, kept in zip(stored_lines, keep.tolist()) if kept] + lines
+            # concatenate drops the record padding, so restore the packed layout
+            records = np.concatenate((stored_records[keep], records)).astype(PACKED_RECORD)
+            order = np.argsort(records['address'], kind='stable')
+            records = records[order]
+            lines = [lines[i] for i in order.tolist()]
+    _write_atomic(ips_path, b''.join(lines))
+    _write_atomic(bin_path, records.tobytes())
+
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+
+    prefixes = [{k: data.get(k) for k in PREFIX_DATA_KEYS} for data in materialized.data]
+    if targets is None:
+        _remove_payloads(output_dir, vrf)
+    else:
+        # Payloads of removed prefixes go as well
+        _remove_payloads(output_dir, vrf, {sanitize_name(prefix) for prefix in materialized.prefixes} - targets)
+    entries = {}
+    precompressed = 0
+    for i, prefix in enumerate(materialized.prefixes):
+        first, last = _network_range(prefix)
+        lo = int(np.searchsorted(records['address'], first, side='left'))
+        hi = int(np.searchsorted(records['address'], last, side='right'))
+        sanitized_prefix = sanitize_name(prefix)
+        subtree_end = materialized.subtree_end[i]
+        entries[sanitized_prefix] = [i, int(offsets[lo]), int(offsets[hi] - offsets[lo]), subtree_end, lo, hi - lo]
+        if targets is not None and sanitized_prefix not in targets:
+            continue
+
+        # Skip building payloads that are certainly too small to precompress
+        if entries[sanitized_prefix][2] + PREFIX_SIZE_ESTIMATE * (subtree_end - i) < PRECOMPRESS_MIN_SIZE:
+            continue
+        ip_data = {'json': b''.join(lines[lo:hi]), 'packed': records[lo:hi].tobytes()}
+        for fmt in FORMATS:
+            payload = encode_payload(fmt, prefixes[i], prefixes[i + 1:subtree_end], ip_data[fmt])
+            if len(payload) >= PRECOMPRESS_MIN_SIZE:
+                _precompress(output_dir, vrf, sanitized_prefix, fmt, payload)
+                precompressed += 1
+
+    index = {'version': DATA_STORE_VERSION, 'prefixes': prefixes, 'entries': entries}
+    _write_atomic(index_path, json.dumps(index, separators=(',', ':')).encode('utf-8'))
+    logging.debug(
+        f"Saved data store for VRF {vrf}: {len(prefixes)} prefixes, {len(lines)} IP addresses, "
+        f"{precompressed} precompressed payloads"
+    )
+
+
+def save_data_stores(output_dir, prefix_tree_obj, ip_index, ip_scope=None, targets=None):
+    """
+    Write the data stores of all VRFs with IPv4 prefixes and remove any other data files.
+
+    Args:
+        output_dir (str): Output directory.
+        prefix_tree_obj (PrefixTree): All prefixes.
+        ip_index (IPIndex): The IP addresses.
+        ip_scope (iterable): (vrf, prefix) pairs whose IPs ip_index holds completely, for scoped
+                             updates. None means ip_index holds every IP address.
+        targets (iterable): (vrf, prefix) pairs whose payloads may have changed, for scoped updates.
+                            None rewrites the payloads of all prefixes. With ip_scope, the stores
+                            of VRFs with neither refreshed IPs nor targets are left as they are.
+    """
+    ranges = None
+    if ip_scope is not None:
+        ranges = {}
+        for vrf, prefix in ip_scope:
+            ranges.setdefault(vrf, []).append(_network_range(prefix))
+    vrf_targets = None
+    if targets is not None:
+        vrf_targets = {}
+        for vrf, prefix in targets:
+            vrf_targets.setdefault(vrf, set()).add(sanitize_name(prefix))
+
+    written = set()
+    for vrf in list(prefix_tree_obj.trees):
+        materialized = prefix_tree_obj.get_materialized(vrf, 'ipv4')
+        if not materialized.prefixes:
+            continue
+        refreshed = None if ranges is None else ranges.get(vrf, [])
+        payload_targets = None if vrf_targets is None else vrf_targets.get(vrf, set())
+        if refreshed == [] and payload_targets == set() and all(map(os.path.exists, get_store_paths(output_dir, vrf))):
+            # Untouched by a scoped update: the files seeded from the previous generation are current
+            written.add(sanitize_name(str(vrf)))
+            continue
+        _, rows = ip_index.vrfs.get(vrf, (None, np.empty(0, dtype=np.int64)))
+        write_vrf_store(output_dir, vrf, materialized, ip_index.table.take(rows), refreshed, payload_targets)
+        written.add(sanitize_name(str(vrf)))
+
+    for filename in os.listdir(output_dir):
+        # Per-prefix data files are superseded by the stores
+        if filename.startswith('data-') and filename.endswith('.json'):
+            os.remove(os.path.join(output_dir, filename))
+        # Stores of VRFs that no longer have IPv4 prefixes
+        elif filename.startswith(('ips-', 'index-', 'payload-')):
+            vrf_key = filename.split('-')[1].split('.')[0]
+            if vrf_key not in written:
+                os.remove(os.path.join(output_dir, filename))
+
+
+def _load_index(index_path):
+    """
+    Return the parsed index at index_path, or None if it does not exist.
+
+    Parsed indexes are cached and reused while the file is unchanged. Indexes are replaced
+    rather than rewritten, so the inode, modification time and size identify the contents.
+    The returned index is shared and must not be modified.
+    """
+    try:
+        st = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _index_lock:
+        cached = _index_cache.get(index_path)
+        if cached is not None and cached[0] == key:
+            _index_cache.move_to_end(index_path)
+            return cached[1]
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    with _index_lock:
+        _index_cache[index_path] = (key, index)
+        _index_cache.move_to_end(index_path)
+        if len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def _read_entry(output_dir, vrf, sanitized_prefix):
+    """Return (index, entry) of a prefix, or (None, None) if not found."""
+    _, _, index_path = get_store_paths(output_dir, vrf)
+    index = _load_index(index_path)
+    if index is None or index.get('version') != DATA_STORE_VERSION:
+        return None, None
+    return index, index['entries'].get(sanitized_prefix)
+
+
+def _read_range(path, offset, length):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def read_payload(output_dir, vrf, sanitized_prefix, fmt='json'):
+    """
+    Build the uncompressed /data/<vrf>/<prefix> response body of a prefix from its VRF store.
+
+    Args:
+        output_dir (str): Output directory.
+        vrf (str): The VRF as used in URLs ('None' for Global VRF).
+        sanitized_prefix (str): The prefix as used in URLs (e.g., '10_0_0_0_16').
+        fmt (str): A key of FORMATS.
+
+    Returns:
+        bytes or None: The body, or None if the prefix is not in the store.
+    """
+    index, entry = _read_entry(output_dir, vrf, sanitized_prefix)
+    if entry is None:
+        return None
+    position, offset, length, subtree_end, first_record, record_count = entry
+    ips_path, bin_path, _ = get_store_paths(output_dir, vrf)
+    if fmt == 'packed':
+        ip_data = _read_range(bin_path, first_record * PACKED_RECORD.itemsize, record_count * PACKED_RECORD.itemsize)
+    else:
+        ip_data = _read_range(ips_path, offset, length)
+    prefixes = index['prefixes']
+    return encode_payload(fmt, prefixes[position], prefixes[position + 1:subtree_end], ip_data)
+
+
+def find_precompressed(output_dir, vrf, sanitized_prefix, fmt, accepted):
+    """
+    Find a precompressed payload of a prefix.
+
+    Args:
+        accepted (callable): Returns whether the client accepts a content encoding.
+
+    Returns:
+        tuple or None: (encoding, path) of the preferred accepted encoding, or None.
+    """
+    for encoding in ENCODINGS:
+        if accepted(encoding):
+            path = get_payload_path(output_dir, vrf, sanitized_prefix, fmt, encoding)
+            if os.path.exists(path):
+                return encoding, path
+    return None
+
+
+def decode_packed(payload):
+    """
+    Decode a packed payload into (header dict, NumPy record array).
+    Used by tests and tools; the browser decodes the same layout in prefix_tree.js.
+    """
+    if payload[:4] != PACKED_MAGIC:
+        raise ValueError("Not a packed prefix payload")
+    (header_length,) = struct.unpack_from('<I', payload, 4)
+    header = json.loads(payload[8:8 + header_length])
+    records = np.frombuffer(payload, dtype=PACKED_RECORD, offset=8 + header_length)
+    return header, records
@@ -0,0 +1,162 @@
+# app/generations.py
+
+from contextlib import contextmanager
+import logging
+import os
+import shutil
+import time
+
+GENERATIONS_DIR = 'generations'
+CURRENT_LINK = 'current'
+
+# Created in a generation when it is published; generations without it are failed or interrupted updates
+PUBLISHED_MARKER = '.published'
+
+# Published generations kept on disk, so pages loaded before a swap can still fetch their images
+DEFAULT_KEEP_GENERATIONS = 2
+
+
+def get_generations_root(output_dir):
+    return os.path.join(output_dir, GENERATIONS_DIR)
+
+
+def list_generations(output_dir):
+    """Return the generation IDs in output_dir, oldest first."""
+    root = get_generations_root(output_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if not name.startswith('.'))
+
+
+def current_generation(output_dir):
+    """
+    Return the ID of the published generation, or None if nothing was published yet.
+    """
+    link = os.path.join(output_dir, CURRENT_LINK)
+    if not os.path.islink(link):
+        return None
+    return os.path.basename(os.readlink(link))
+
+
+def get_current_dir(output_dir):
+    """
+    Return the directory of the published generation, or output_dir itself if nothing was published yet.
+    """
+    link = os.path.join(output_dir, CURRENT_LINK)
+    return os.path.realpath(link) if os.path.islink(link) else output_dir
+
+
+def get_generation_dir(output_dir, generation):
+    """
+    Return the directory of a generation, or None if it does not exist.
+    Generation IDs come from URLs, so anything that is not a plain directory name is rejected.
+    """
+    if not generation or generation != os.path.basename(generation) or generation.startswith('.'):
+        return None
+    path = os.path.join(get_generations_root(output_dir), generation)
+    return path if os.path.isdir(path) else None
+
+
+def _new_generation_id(existing):
+    generation = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+    suffix = 1
+    candidate = generation
+    # IDs sort in creation order, even for several generations within a second
+    while existing and candidate <= existing[-1]:
+        candidate = f"{generation}.{suffix:03d}"
+        suffix += 1
+    return candidate
+
+
+def _seed(source_dir, target_dir):
+    """
+    Hard-link every file of source_dir into target_dir, copying where links are not supported.
+    Linked files are shared between generations, so files in a generation must be replaced,
+    never rewritten in place.
+    """
+    count = 0
+    for name in os.listdir(source_dir):
+        source = os.path.join(source_dir, name)
+        if not os.path.isfile(source) or name.endswith('.tmp') or name == PUBLISHED_MARKER:
+            continue
+        target = os.path.join(target_dir, name)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        count += 1
+    return count
+
+
+def is_published(output_dir, generation):
+    """Return whether a generation was ever published."""
+    return os.path.exists(os.path.join(get_generations_root(output_dir), generation, PUBLISHED_MARKER))
+
+
+def publish(output_dir, generation):
+    """Atomically point the current link at a generation."""
+    open(os.path.join(get_generations_root(output_dir), generation, PUBLISHED_MARKER), 'w').close()
+    tmp_link = os.path.join(output_dir, f".{CURRENT_LINK}.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.join(GENERATIONS_DIR, generation), tmp_link)
+    os.replace(tmp_link, os.path.join(output_dir, CURRENT_LINK))
+    logging.info(f"Published output generation {generation}")
+
+
+def collect_garbage(output_dir, keep=DEFAULT_KEEP_GENERATIONS):
+    """
+    Remove all but the newest keep published generations. The current generation is always kept.
+    Unpublished generations are removed too, except the newest generation, which the next update
+    resumes from.
+
+    Returns:
+        list: IDs of the removed generations.
+    """
+    current = current_generation(output_dir)
+    generations = list_generations(output_dir)
+    published = [generation for generation in generations
+                 if generation == current or is_published(output_dir, generation)]
+    kept = set(published[max(len(published) - keep, 0):])
+    kept.add(current)
+    if generations:
+        kept.add(generations[-1])
+    removed = []
+    for generation in generations:
+        if generation in kept:
+            continue
+        shutil.rmtree(os.path.join(get_generations_root(output_dir), generation), ignore_errors=True)
+        removed.append(generation)
+    if removed:
+        logging.info(f"Removed {len(removed)} old output generations")
+    return removed
+
+
+@contextmanager
+def new_generation(output_dir, keep=DEFAULT_KEEP_GENERATIONS):
+    """
+    Create a generation directory to write an update into, and publish it when the block succeeds.
+
+    The new generation starts as a copy of the newest existing one, published or not, so
+    unchanged renders are reused and an interrupted update resumes where it stopped.
+    A failed update is left unpublished; the readers keep seeing the current generation.
+
+    Args:
+        output_dir (str): Output directory.
+        keep (int): Generations kept by garbage collection after publishing.
+
+    Yields:
+        str: The generation directory.
+    """
+    generations = list_generations(output_dir)
+    generation = _new_generation_id(generations)
+    path = os.path.join(get_generations_root(output_dir), generation)
+    os.makedirs(path)
+    if generations:
+        seeded = _seed(os.path.join(get_generations_root(output_dir), generations[-1]), path)
+        logging.debug(f"Seeded output generation {generation} with {seeded} files from {generations[-1]}")
+
+    yield path
+
+    publish(output_dir, generation)
+    collect_garbage(output_dir, keep)
@@ -0,0 +1,145 @@
+# app/invalidation.py
+
+import ipaddress
+import logging
+from collections import Counter
+
+from app.prefix_tree import PrefixTree
+
+# Webhook models that can be scoped to prefixes, with the field holding their address
+SCOPED_MODELS = {
+    'ipaddress': 'address',
+    'prefix': 'prefix',
+}
+
+
+def _object_id(value):
+    """Return the ID of a nested NetBox object, which may be a dict, a bare ID or None."""
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+def build_prefix_tree_from_saved(saved_tree):
+    """
+    Rebuild a PrefixTree and tenant usage counts from saved prefix_tree.json data.
+
+    Args:
+        saved_tree (dict): Data written by save_prefix_tree, keyed by VRF ID string ('None' for Global).
+
+    Returns:
+        tuple: (PrefixTree, Counter of prefixes per tenant ID).
+    """
+    prefix_tree = PrefixTree()
+    tenant_counts = Counter()
+    for vrf_key, vrf_data in saved_tree.items():
+        vrf = None if vrf_key == 'None' else int(vrf_key)
+        for entry in vrf_data.get('prefixes', []):
+            prefix_tree.add_prefix({
+                'id': entry.get('id'),
+                'prefix': entry['prefix'],
+                'vrf': vrf,
+                'tenant': entry.get('tenant'),
+            })
+            tenant_counts[entry.get('tenant')] += 1
+    return prefix_tree, tenant_counts
+
+
+def _changes_tenant_colors(payload, tenant_counts):
+    """
+    Check whether a prefix change alters the set of tenants in use.
+    Tenant colors are assigned over that whole set, so changing it recolors every map.
+    """
+    snapshots = payload.get('snapshots') or {}
+    prechange = snapshots.get('prechange')
+    postchange = snapshots.get('postchange')
+    if not prechange and not postchange:
+        return True  # No snapshots to compare
+    if prechange and postchange and _object_id(prechange.get('tenant')) == _object_id(postchange.get('tenant')):
+        return False
+    if tenant_counts is None:
+        return True
+
+    counts = Counter(tenant_counts)
+    if prechange:
+        counts[_object_id(prechange.get('tenant'))] -= 1
+    if postchange:
+        counts[_object_id(postchange.get('tenant'))] += 1
+    tenants_before = {tenant for tenant, count in tenant_counts.items() if count > 0}
+    tenants_after = {tenant for tenant, count in counts.items() if count > 0}
+    return tenants_before != tenants_after
+
+
+def scope_webhook(payload, prefix_tree, tenant_counts=None):
+    """
+    Work out which prefixes are affected by a NetBox webhook event.
+
+    The pre-change and post-change snapshots are both considered, so moving an
+    object between addresses or VRFs invalidates the old and the new location.
+
+    Args:
+        payload (dict): The webhook body (event, model, data, snapshots).
+        prefix_tree (PrefixTree): Tree of the currently published prefixes.
+        tenant_counts (Counter): Prefixes per tenant ID, to detect tenant color changes.
+
+    Returns:
+        dict or None: {vrf: set of prefixes} to re-render including ancestors,
+                      or None when the change cannot be scoped and needs a full update.
+    """
+    model = payload.get('model')
+    field = SCOPED_MODELS.get(model)
+    if not field:
+        return None
+
+    snapshots = payload.get('snapshots') or {}
+    states = [
+        state for state in (snapshots.get('prechange'), snapshots.get('postchange'), payload.get('data')) if state
+    ]
+    if not states:
+        return None
+
+    if model == 'prefix' and _changes_tenant_colors(payload, tenant_counts):
+        logging.debug("Prefix change alters the tenant set; full update required")
+        return None
+
+    scope = {}
+    for state in states:
+        value = state.get(field)
+        if not value:
+            return None
+        vrf = _object_id(state.get('vrf'))
+        try:
+            if model == 'ipaddress':
+                # Look up the host, not the network of its mask, which may be wider than the covering prefixes
+                value = str(ipaddress.ip_interface(value).ip)
+            covering = prefix_tree.get_covering_prefixes(value, vrf)
+        except ValueError:
+            logging.warning(f"Cannot scope webhook for invalid {model} '{value}'")
+            return None
+        targets = scope.setdefault(vrf, set())
+        targets.update(covering)
+        if model == 'prefix':
+            targets.add(str(ipaddress.ip_network(value, strict=False)))
+    return scope
+
+
+def merge_scopes(target, scope):
+    """Merge a {vrf: set of prefixes} scope into target in place."""
+    for vrf, prefixes in scope.items():
+        target.setdefault(vrf, set()).update(prefixes)
+    return target
+
+
+def expand_scope(scope, prefix_tree):
+    """
+    Expand a scope to include the ancestors of every prefix in a (fresh) prefix tree.
+
+    Returns:
+        set: (vrf, prefix) pairs to re-render.
+    """
+    targets = set()
+    for vrf, prefixes in scope.items():
+        for prefix in prefixes:
+            targets.add((vrf, prefix))
+            targets.update((vrf, covering) for covering in prefix_tree.get_covering_prefixes(prefix, vrf))
+    return targets
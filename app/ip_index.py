@@ -0,0 +1,86 @@
+# app/ip_index.py
+
+import ipaddress
+import logging
+
+import numpy as np
+
+from app.ip_table import NULL_ID, IPTable
+
+
+class IPIndex:
+    def __init__(self, ip_addresses):
+        """
+        Sort IP addresses once into per-VRF integer ranges.
+        Only IPv4 addresses are indexed, since only IPv4 prefixes can be plotted.
+
+        Args:
+            ip_addresses (IPTable or list): IP address table, or serialized NetBox IP address dictionaries.
+        """
+        if not isinstance(ip_addresses, IPTable):
+            ip_addresses = IPTable.from_records(ip_addresses)
+        self.table = ip_addresses
+        vrf_column = ip_addresses.columns['vrf']
+        address_column = ip_addresses.columns['address']
+
+        # Sort by VRF, then address; lexsort is stable so equal addresses keep input order
+        order = np.lexsort((address_column, vrf_column))
+        sorted_vrfs = vrf_column[order]
+        boundaries = np.flatnonzero(np.diff(sorted_vrfs)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(order) else np.empty(0, dtype=np.int64)
+        ends = np.concatenate((boundaries, [len(order)])) if len(order) else np.empty(0, dtype=np.int64)
+
+        # vrf: (sorted addresses, table rows in the same order)
+        self.vrfs = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            vrf = int(sorted_vrfs[start])
+            rows = order[start:end]
+            self.vrfs[None if vrf == NULL_ID else vrf] = (address_column[rows], rows)
+        logging.debug(f"Indexed {len(ip_addresses)} IP addresses in {len(self.vrfs)} VRFs")
+
+    def lookup_range(self, vrf, start, end):
+        """
+        Return the index range of addresses between start and end (inclusive) in a VRF.
+
+        Returns:
+            tuple: (addresses, rows) NumPy array slices.
+        """
+        addresses, rows = self.vrfs.get(vrf, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+        lo = np.searchsorted(addresses, start, side="left")
+        hi = np.searchsorted(addresses, end, side="right")
+        return addresses[lo:hi], rows[lo:hi]
+
+    def _lookup_rows(self, prefix, vrf):
+        network = ipaddress.ip_network(prefix, strict=False)
+        if network.version != 4:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self.lookup_range(vrf, int(network.network_address), int(network.broadcast_address))
+
+    def lookup_table(self, prefix, vrf=None):
+        """
+        Get the IP addresses belonging to a prefix in a given VRF as a table sorted by address.
+
+        Args:
+            prefix (str): The prefix (e.g., '10.0.0.0/16').
+            vrf: The VRF ID (None for Global VRF).
+
+        Returns:
+            IPTable: The matching rows.
+        """
+        _, rows = self._lookup_rows(prefix, vrf)
+        return self.table.take(rows)
+
+    def lookup(self, prefix, vrf=None):
+        """
+        Get the IP addresses belonging to a prefix in a given VRF.
+
+        Args:
+            prefix (str): The prefix (e.g., '10.0.0.0/16').
+            vrf: The VRF ID (None for Global VRF).
+
+        Returns:
+            tuple: (addresses, entries) where addresses is a sorted int64 NumPy array
+                   and entries is the list of matching IP address dictionaries in the same order.
+        """
+        addresses, rows = self._lookup_rows(prefix, vrf)
+        return addresses, self.table.take(rows).to_records()
@@ -0,0 +1,159 @@
+# app/ip_table.py
+
+from array import array
+import hashlib
+import ipaddress
+import json
+import logging
+
+import numpy as np
+
+# Stored in the vrf and tenant columns for "no VRF" (Global) and "no tenant"
+NULL_ID = -1
+
+# Columns holding codes into the interned value tables; code 0 is always None
+CODED_COLUMNS = ('status', 'role', 'tags')
+
+# Default fields of to_records, as written to the prefix data files
+RECORD_KEYS = ('id', 'address', 'vrf', 'tenant', 'status', 'role', 'tags')
+
+
+def _object_id(value):
+    """Return the ID of a nested NetBox object, which may be a dict, a bare ID or None."""
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+class Interner:
+    def __init__(self):
+        """
+        Table of distinct values, each identified by a small integer code.
+        Unhashable values such as tag lists are keyed by their JSON form.
+        """
+        self.values = [None]
+        self._codes = {'null': 0}
+
+    def code(self, value):
+        key = json.dumps(value, sort_keys=True, default=str)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class IPTable:
+    def __init__(self, columns, values):
+        """
+        Columnar storage of IPv4 addresses.
+
+        Each field is a NumPy array with one element per address. Repeated status, role
+        and tag values are interned, so a record costs a few dozen bytes instead of a dict.
+        Use from_records to build a table.
+
+        Args:
+            columns (dict): Column name -> NumPy array: id, address (integer), prefixlen,
+                            vrf and tenant (NULL_ID for None), status, role and tags (codes).
+            values (dict): Coded column name -> list of values indexed by code.
+        """
+        self.columns = columns
+        self.values = values
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a table from serialized NetBox IP address dictionaries, consuming them one at a time
+        so a streamed source is never held in memory as a whole.
+        Only IPv4 addresses are kept, since only IPv4 prefixes can be plotted.
+
+        Args:
+            records (iterable): IP address dictionaries.
+
+        Returns:
+            IPTable: The table, in input order.
+        """
+        ids, addresses, prefixlens, vrfs, tenants = array('q'), array('q'), array('b'), array('q'), array('q')
+        coded = {name: array('i') for name in CODED_COLUMNS}
+        interners = {name: Interner() for name in CODED_COLUMNS}
+
+        for ip_entry in records:
+            ip_field = (ip_entry.get("address") or "").strip()
+            if not ip_field:
+                logging.warning("Empty IP Address field encountered.")
+                continue
+            address, _, prefixlen = ip_field.partition('/')
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                logging.error(f"Invalid IP address format: {ip_field}")
+                continue
+            if ip.version != 4:
+                continue
+            vrf = _object_id(ip_entry.get("vrf"))
+            tenant = _object_id(ip_entry.get("tenant"))
+            ids.append(ip_entry.get("id") or 0)
+            addresses.append(int(ip))
+            prefixlens.append(int(prefixlen) if prefixlen.isdigit() else 32)
+            vrfs.append(NULL_ID if vrf is None else int(vrf))
+            tenants.append(NULL_ID if tenant is None else int(tenant))
+            for name in CODED_COLUMNS:
+                coded[name].append(interners[name].code(ip_entry.get(name)))
+
+        columns = {
+            'id': np.frombuffer(ids, dtype=np.int64),
+            'address': np.frombuffer(addresses, dtype=np.int64),
+            'prefixlen': np.frombuffer(prefixlens, dtype=np.int8),
+            'vrf': np.frombuffer(vrfs, dtype=np.int64),
+            'tenant': np.frombuffer(tenants, dtype=np.int64),
+        }
+        columns.update((name, np.frombuffer(coded[name], dtype=np.int32)) for name in CODED_COLUMNS)
+        return cls(columns, {name: interners[name].values for name in CODED_COLUMNS})
+
+    def take(self, rows):
+        """Return a table of the given rows (index array or boolean mask), sharing the value tables."""
+        return IPTable({name: column[rows] for name, column in self.columns.items()}, self.values)
+
+    def to_records(self, keys=RECORD_KEYS):
+        """
+        Convert rows back to dictionaries.
+
+        Args:
+            keys (tuple): Fields to include.
+
+        Returns:
+            list: IP address dictionaries, with None for missing VRF and tenant.
+        """
+        fields = {}
+        for key in keys:
+            if key == 'address':
+                fields[key] = [
+                    f"{ipaddress.IPv4Address(address)}/{prefixlen}"
+                    for address, prefixlen in zip(self.columns['address'].tolist(), self.columns['prefixlen'].tolist())
+                ]
+            elif key in ('vrf', 'tenant'):
+                fields[key] = [None if value == NULL_ID else value for value in self.columns[key].tolist()]
+            elif key in CODED_COLUMNS:
+                values = self.values[key]
+                fields[key] = [values[code] for code in self.columns[key].tolist()]
+            else:
+                fields[key] = self.columns[key].tolist()
+        return [dict(zip(keys, row)) for row in zip(*(fields[key] for key in keys))]
+
+    def fingerprint(self):
+        """
+        Digest the table contents. Codes are resolved to their values, so the result does not
+        depend on the order in which values were interned.
+        """
+        digest = hashlib.sha256()
+        for name, column in sorted(self.columns.items()):
+            if name in CODED_COLUMNS:
+                codes, column = np.unique(column, return_inverse=True)
+                values = [self.values[name][code] for code in codes.tolist()]
+                digest.update(json.dumps(values, sort_keys=True, default=str).encode('utf-8'))
+            digest.update(name.encode('utf-8'))
+            digest.update(np.ascontiguousarray(column, dtype=np.int64).tobytes())
+        return digest.hexdigest()
@@ -0,0 +1,248 @@
+# app/lazy_render.py
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import json
+import logging
+import os
+import threading
+
+from app.ip_table import IPTable
+from app.snapshot_store import SnapshotStore
+
+RENDER_CACHE_DIR = 'render_cache'
+
+# Tenant color map saved with every output generation for on-demand renders
+TENANT_COLORS_FILENAME = 'tenant_colors.json'
+
+# Input digests remembered per (snapshot version, prefix, VRF)
+MAX_CACHED_DIGESTS = 16384
+
+# Default size limit of the render cache, in bytes
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Run a function once per key at a time; concurrent callers with the same key share its result.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class RenderCache:
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        """
+        Size-bounded directory of rendered images, evicting the least recently used.
+        Use time is tracked through file modification times, so the cache survives restarts
+        and can be shared by several web processes.
+
+        Args:
+            directory (str): Cache directory, created if missing.
+            max_bytes (int): Total size above which the oldest images are removed.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.startswith('.')]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Return the path of a cached image and mark it as used, or None on a miss."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, write):
+        """
+        Add an image to the cache.
+
+        Args:
+            key (str): Cache key.
+            write (callable): Writes the image to the PNG path it is given.
+
+        Returns:
+            str: The path of the cached image.
+        """
+        path = self._path(key)
+        tmp_path = os.path.join(self.directory, f".{key}-{threading.get_ident()}.png")
+        try:
+            write(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.size += size
+            if self.size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        """Remove the least recently used images until the cache fits, never the one just added."""
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+            except FileNotFoundError:
+                continue
+        logging.debug(f"Render cache holds {self.size} bytes")
+
+
+def load_tenant_colors(data_dir):
+    """Load the tenant color map saved with an output generation."""
+    path = os.path.join(data_dir, TENANT_COLORS_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return {tenant: color for tenant, color in json.load(f)}
+
+
+def build_snapshot_job(store, prefix, vrf):
+    """
+    Build the render job of a prefix from the snapshot store.
+
+    Returns:
+        dict or None: The job, or None if the prefix is not in the store.
+    """
+    from app.cli import build_prefix_job
+    prefixes = store.prefixes_within(prefix, vrf)
+    prefix_entry = next((entry for entry in prefixes if entry.get('prefix') == prefix), None)
+    if prefix_entry is None:
+        return None
+    child_prefixes = [entry for entry in prefixes if entry is not prefix_entry]
+    ip_table = IPTable.from_records(store.ip_addresses_within(prefix, vrf))
+    return build_prefix_job(prefix_entry, child_prefixes, ip_table)
+
+
+class LazyRenderer:
+    def __init__(self, snapshot_db, cache_dir, cell_size, renderer, max_bytes=DEFAULT_CACHE_SIZE):
+        """
+        Render prefix images on first request from the snapshot store, caching them by input digest.
+        Unchanged prefixes therefore keep their cached image across updates. The rendering stack
+        is imported on the first request, not when the web app starts.
+
+        The digest of a prefix is remembered until the snapshot store or the output generation
+        changes, so requests for cached images neither query the store nor hash the inputs.
+
+        Args:
+            snapshot_db (str): SnapshotStore database written by the updater.
+            cache_dir (str): Render cache directory.
+            cell_size (int): Cell size in pixels.
+            renderer (str): A key of app.cli.RENDERERS, or None for the default renderer.
+            max_bytes (int): Render cache size limit.
+        """
+        self.snapshot_db = snapshot_db
+        self.cell_size = cell_size
+        self.renderer = renderer
+        self.cache = RenderCache(cache_dir, max_bytes)
+        self._flights = SingleFlight()
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _snapshot_version(self, data_dir):
+        """Return a key that changes whenever the snapshot store or the output generation changes."""
+        try:
+            st = os.stat(self.snapshot_db)
+        except FileNotFoundError:
+            return None
+        return data_dir, st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _remember_digest(self, key, digest):
+        with self._lock:
+            self._digests[key] = digest
+            self._digests.move_to_end(key)
+            if len(self._digests) > MAX_CACHED_DIGESTS:
+                self._digests.popitem(last=False)
+
+    def render(self, prefix, vrf, data_dir):
+        """
+        Get the image of a prefix, rendering it if it is not cached.
+
+        Args:
+            prefix (str): The prefix (e.g., '10.0.0.0/16').
+            vrf: The VRF ID (None for Global VRF).
+            data_dir (str): The output generation holding the tenant colors.
+
+        Returns:
+            str or None: Path of the image, or None if the prefix is not in the snapshot.
+        """
+        version = self._snapshot_version(data_dir)
+        if version is None:
+            return None
+        key = (version, prefix, vrf)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is not None:
+            path = self.cache.get(digest)
+            if path:
+                return path
+
+        from app.cli import DEFAULT_RENDERER, RENDERERS, compute_job_digest
+        renderer = self.renderer or DEFAULT_RENDERER
+        store = SnapshotStore(self.snapshot_db, readonly=True)
+        try:
+            job = build_snapshot_job(store, prefix, vrf)
+        finally:
+            store.close()
+        if job is None:
+            return None
+
+        tenant_color_map = load_tenant_colors(data_dir)
+        digest = compute_job_digest(job, self.cell_size, tenant_color_map, renderer)
+        self._remember_digest(key, digest)
+        path = self.cache.get(digest)
+        if path:
+            return path
+
+        def render():
+            # Another request may have finished the same render while this one waited
+            path = self.cache.get(digest)
+            if path:
+                return path
+            logging.info(f"Rendering prefix {prefix} (VRF {vrf}) on demand")
+            render_fn = RENDERERS[renderer]
+            return self.cache.put(digest, lambda output_file: render_fn(
+                job['prefix_entry'], job['child_prefixes'], job['ip_addresses'], output_file,
+                self.cell_size, tenant_color_map,
+            ))
+
+        return self._flights.do(digest, render)
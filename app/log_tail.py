@@ -0,0 +1,118 @@
+# app/log_tail.py
+
+import glob
+import os
+import re
+
+# Levels shown for each filter level
+LEVELS = {
+    'DEBUG': ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'),
+    'INFO': ('INFO', 'WARNING', 'ERROR', 'CRITICAL'),
+    'WARNING': ('WARNING', 'ERROR', 'CRITICAL'),
+    'ERROR': ('ERROR', 'CRITICAL'),
+    'CRITICAL': ('CRITICAL',),
+}
+
+# Rotated logs in these formats cannot be read backwards and are skipped
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.zst')
+
+BLOCK_SIZE = 64 * 1024
+
+# Upper bound of bytes read per page, so a rare level filter cannot scan every rotated log
+DEFAULT_MAX_SCAN = 8 * 1024 * 1024
+
+
+def list_log_files(path):
+    """
+    Return the log file and its rotated copies, newest first, as (suffix, path) pairs.
+    The live log has the empty suffix; rotated copies are 'path.<suffix>'.
+    """
+    files = [('', path)] if os.path.exists(path) else []
+    rotated = [
+        rotated_path for rotated_path in glob.glob(f"{glob.escape(path)}.*")
+        if not rotated_path.endswith(COMPRESSED_SUFFIXES)
+    ]
+    rotated.sort(key=lambda rotated_path: os.path.getmtime(rotated_path), reverse=True)
+    files.extend((rotated_path[len(path) + 1:], rotated_path) for rotated_path in rotated)
+    return files
+
+
+def read_lines_backward(f, end, block_size=BLOCK_SIZE):
+    """
+    Yield (start offset, line) pairs of a binary file, from the line ending at end backwards.
+    Lines are returned without their newline; empty lines are skipped.
+    """
+    position = end
+    remainder = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        block = f.read(size) + remainder
+        lines = block.split(b'\n')
+        # The first piece may continue in the previous block
+        remainder = lines[0]
+        line_end = position + len(block)
+        for line in reversed(lines[1:]):
+            line_start = line_end - len(line)
+            if line:
+                yield line_start, line
+            line_end = line_start - 1
+    if remainder:
+        yield 0, remainder
+
+
+def parse_cursor(cursor):
+    """Parse a '<suffix>:<offset>' cursor into (suffix, offset), or (None, None) if invalid."""
+    suffix, _, offset = (cursor or '').rpartition(':')
+    if not offset.isdigit():
+        return None, None
+    return suffix, int(offset)
+
+
+def tail_log(path, limit=100, cursor=None, level=None, max_scan=DEFAULT_MAX_SCAN):
+    """
+    Read the last lines of a log and its rotated copies, seeking from the end.
+
+    Args:
+        path (str): The live log file.
+        limit (int): Maximum number of lines returned.
+        cursor (str): Continue with the lines before this cursor, as returned by a previous call.
+        level (str): Only return lines of this level or above (a key of LEVELS).
+        max_scan (int): Stop after reading this many bytes, even with fewer than limit lines.
+
+    Returns:
+        tuple: (lines, cursor) where lines are the matching lines in file order, and cursor
+               continues with older lines, or is None at the start of the oldest log.
+    """
+    pattern = None
+    if level in LEVELS:
+        pattern = re.compile(rb'\b(' + '|'.join(LEVELS[level]).encode('ascii') + rb')\b')
+
+    files = list_log_files(path)
+    start_file, start_offset = 0, None
+    if cursor:
+        suffix, offset = parse_cursor(cursor)
+        suffixes = [file_suffix for file_suffix, _ in files]
+        if suffix not in suffixes:
+            return [], None
+        start_file, start_offset = suffixes.index(suffix), offset
+
+    lines = []
+    scanned = 0
+    for i in range(start_file, len(files)):
+        suffix, file_path = files[i]
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if i != start_file or start_offset is None else min(start_offset, size)
+            for line_start, line in read_lines_backward(f, end):
+                scanned += end - line_start
+                end = line_start
+                if pattern is None or pattern.search(line):
+                    lines.append(line.decode('utf-8', errors='replace'))
+                if len(lines) >= limit or scanned >= max_scan:
+                    lines.reverse()
+                    more = line_start > 0 or i + 1 < len(files)
+                    return lines, f"{suffix}:{line_start}" if more else None
+    lines.reverse()
+    return lines, None
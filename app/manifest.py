@@ -0,0 +1,87 @@
+# app/manifest.py
+
+import hashlib
+import json
+import logging
+import os
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Bump when the rendered output changes for identical inputs
+RENDER_VERSION = 1
+
+
+def compute_digest(inputs):
+    """
+    Compute a stable SHA-256 digest of JSON-serializable inputs.
+
+    Args:
+        inputs: Any structure of dicts, lists and scalars. Dict key order does not matter.
+
+    Returns:
+        str: Hex digest.
+    """
+    payload = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RenderManifest:
+    def __init__(self, output_dir, flush_interval=50):
+        """
+        Persistent record of the input digest each prefix was last rendered from.
+        Entries are flushed to disk as renders complete, so an interrupted run
+        resumes by skipping everything that already finished.
+
+        Args:
+            output_dir (str): Directory holding the rendered files and the manifest.
+            flush_interval (int): Number of recorded renders between flushes to disk.
+        """
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.flush_interval = flush_interval
+        self.entries = self._load()
+        self._dirty = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != RENDER_VERSION:
+                logging.info("Render manifest version changed; all prefixes will be re-rendered")
+                return {}
+            return data.get('entries', {})
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable render manifest {self.path}: {e}")
+            return {}
+
+    def is_current(self, key, digest, paths=()):
+        """
+        Check whether a prefix was rendered from the same inputs and its files still exist.
+        """
+        return self.entries.get(key) == digest and all(os.path.exists(path) for path in paths)
+
+    def record(self, key, digest):
+        """Record a completed render, flushing periodically."""
+        self.entries[key] = digest
+        self._dirty += 1
+        if self._dirty >= self.flush_interval:
+            self.save()
+
+    def discard(self, key):
+        """Forget a prefix so it is re-rendered on the next run."""
+        if self.entries.pop(key, None) is not None:
+            self._dirty += 1
+
+    def prune(self, keep_keys):
+        """Drop entries for prefixes that no longer exist."""
+        for key in set(self.entries) - set(keep_keys):
+            self.discard(key)
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': RENDER_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
@@ -0,0 +1,216 @@
+# app/metrics.py
+
+from abc import ABC, abstractmethod
+import bisect
+from contextlib import contextmanager
+import math
+import os
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; update stages range from milliseconds to many minutes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Seconds; web requests and single renders
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        """
+        A metric family in the Prometheus text format, with one child per label value combination.
+        Updates take a lock and a dictionary lookup, so they are cheap enough for every request.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): HELP text.
+            labelnames (tuple): Label names; values are passed as keyword arguments.
+            registry (Registry): Registry to add the metric to, the default REGISTRY if None.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self):
+        """Yield (name suffix, label values, extra labels, value) tuples."""
+
+    def render(self):
+        lines = []
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        if not lines:
+            return ''
+        header = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(header + lines) + '\n'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._children.items())
+        for values, value in items:
+            yield '_total', values, (), value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._children.items())
+        for values, value in items:
+            yield '', values, (), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # Per-bucket counts (the last one is +Inf) and the sum
+                child = self._children[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            child[0][index] += 1
+            child[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((values, (list(counts), total)) for values, (counts, total) in self._children.items())
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield '_bucket', values, (('le', _format_value(float(bound))),), cumulative
+            yield '_sum', values, (), total
+            yield '_count', values, (), cumulative
+
+
+class Registry:
+    def __init__(self):
+        """A set of metric families rendered together."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """Return the metrics in the Prometheus text format. Families without samples are omitted."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(metric.render() for metric in metrics)
+
+    def write_textfile(self, path):
+        """
+        Write the metrics for the node_exporter textfile collector, replacing the file atomically.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+# Update pipeline
+FETCH_SECONDS = Histogram(
+    'prefix_map_fetch_seconds', "Time to fetch a dataset from NetBox.", ('dataset',),
+)
+STAGE_SECONDS = Histogram(
+    'prefix_map_stage_seconds', "Time spent in an update stage.", ('stage',),
+)
+RENDER_SECONDS = Histogram(
+    'prefix_map_render_seconds', "Time to render the image of one prefix.", ('renderer',), buckets=LATENCY_BUCKETS,
+)
+RENDERED_PREFIXES = Counter(
+    'prefix_map_rendered_prefixes', "Prefix images rendered, by outcome.", ('result',),
+)
+LAST_SUCCESS = Gauge(
+    'prefix_map_update_last_success_timestamp_seconds', "Time the last successful update finished.", ('kind',),
+)
+
+# Updater state, as seen by the web app
+UPDATER_UP = Gauge(
+    'prefix_map_updater_up', "Whether the updater answered the last stats request.",
+)
+UPDATER_RUNNING = Gauge(
+    'prefix_map_updater_running', "Whether an update is running.",
+)
+UPDATER_QUEUED = Gauge(
+    'prefix_map_updater_queued_webhooks', "Webhooks waiting for the next update.",
+)
+UPDATER_LAST_SUCCESS = Gauge(
+    'prefix_map_updater_last_success_timestamp_seconds', "Time the last successful update finished.",
+)
+UPDATER_LAST_DURATION = Gauge(
+    'prefix_map_updater_last_success_duration_seconds', "Duration of the last successful update.",
+)
+
+# Web app
+REQUEST_SECONDS = Histogram(
+    'prefix_map_http_request_duration_seconds', "Time to handle a web request.", ('route', 'method', 'status'),
+    buckets=LATENCY_BUCKETS,
+)
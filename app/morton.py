@@ -0,0 +1,108 @@
+# app/morton.py
+
+import numpy as np
+
+
+def _build_decode_tables():
+    """
+    Build byte lookup tables that split an interleaved byte into its x and y nibbles.
+    Bit 2*i of the byte belongs to x, bit 2*i+1 belongs to y.
+    """
+    decode_x = np.zeros(256, dtype=np.uint64)
+    decode_y = np.zeros(256, dtype=np.uint64)
+    for value in range(256):
+        x = y = 0
+        for i in range(4):
+            x |= ((value >> (2 * i)) & 1) << i
+            y |= ((value >> (2 * i + 1)) & 1) << i
+        decode_x[value] = x
+        decode_y[value] = y
+    return decode_x, decode_y
+
+
+def _build_encode_table():
+    """
+    Build a byte lookup table that spreads 8 bits into the even bits of a 16-bit value.
+    """
+    spread = np.zeros(256, dtype=np.uint64)
+    for value in range(256):
+        z = 0
+        for i in range(8):
+            z |= ((value >> i) & 1) << (2 * i)
+        spread[value] = z
+    return spread
+
+
+DECODE_X, DECODE_Y = _build_decode_tables()
+SPREAD = _build_encode_table()
+
+_BYTE_MASK = np.uint64(0xFF)
+
+
+def morton_decode_array(offsets, max_bits):
+    """
+    Decode an array of Z-order offsets into x and y coordinate arrays.
+
+    Args:
+        offsets (array-like): Non-negative offsets within the grid.
+        max_bits (int): Number of bits per coordinate.
+
+    Returns:
+        tuple: (x, y) as int64 NumPy arrays of the same shape as offsets.
+    """
+    z = np.asarray(offsets, dtype=np.uint64)
+    x = np.zeros(z.shape, dtype=np.uint64)
+    y = np.zeros(z.shape, dtype=np.uint64)
+    n_bytes = (2 * max_bits + 7) // 8
+    for k in range(n_bytes):
+        chunk = (z >> np.uint64(8 * k)) & _BYTE_MASK
+        x |= DECODE_X[chunk] << np.uint64(4 * k)
+        y |= DECODE_Y[chunk] << np.uint64(4 * k)
+    coord_mask = np.uint64((1 << max_bits) - 1)
+    return (x & coord_mask).astype(np.int64), (y & coord_mask).astype(np.int64)
+
+
+def morton_encode_array(x, y, max_bits):
+    """
+    Encode x and y coordinate arrays into Z-order offsets (inverse of morton_decode_array).
+
+    Args:
+        x (array-like): Column indices.
+        y (array-like): Row indices.
+        max_bits (int): Number of bits per coordinate.
+
+    Returns:
+        numpy.ndarray: int64 offsets.
+    """
+    coord_mask = np.uint64((1 << max_bits) - 1)
+    x = np.asarray(x, dtype=np.uint64) & coord_mask
+    y = np.asarray(y, dtype=np.uint64) & coord_mask
+    z = np.zeros(np.broadcast(x, y).shape, dtype=np.uint64)
+    n_bytes = (max_bits + 7) // 8
+    for k in range(n_bytes):
+        shift = np.uint64(8 * k)
+        z |= SPREAD[(x >> shift) & _BYTE_MASK] << np.uint64(16 * k)
+        z |= SPREAD[(y >> shift) & _BYTE_MASK] << np.uint64(16 * k + 1)
+    return z.astype(np.int64)
+
+
+def prefix_bounding_boxes(offset_starts, offset_ends, max_bits):
+    """
+    Calculate bounding boxes for arrays of sub-prefixes given their first and last offsets.
+
+    Args:
+        offset_starts (array-like): Offsets of the network addresses.
+        offset_ends (array-like): Offsets of the broadcast addresses.
+        max_bits (int): Number of bits per coordinate.
+
+    Returns:
+        tuple: (x1, y1, x2, y2) int64 arrays.
+    """
+    x_start, y_start = morton_decode_array(offset_starts, max_bits)
+    x_end, y_end = morton_decode_array(offset_ends, max_bits)
+    return (
+        np.minimum(x_start, x_end),
+        np.minimum(y_start, y_end),
+        np.maximum(x_start, x_end),
+        np.maximum(y_start, y_end),
+    )
@@ -5,40 +5,180 @@ import os
 from dotenv import load_dotenv
 
 from pynetbox.core.api import Api
+from requests.adapters import HTTPAdapter
+
+from app.ip_table import IPTable
+from app.metrics import FETCH_SECONDS
+from app.netbox_sync import DeltaSync, query_params, run_concurrently
+
+# Default limit of concurrent requests to NetBox
+DEFAULT_CONCURRENCY = 4
+
+
+def _timed_fetch(dataset, fetch):
+    """Wrap a fetch callable to record its duration in the fetch metrics."""
+    def run():
+        with FETCH_SECONDS.time(dataset=dataset):
+            return fetch()
+    return run
+
 
 class NetboxAddressManager:
 
-    def __init__(self, api_url: str = None, api_token: str = None):
+    def __init__(self, api_url: str = None, api_token: str = None, fetch: bool = True, concurrency: int = None):
         """
         Initializes NetBox address manager by connecting to the API and fetching data.
         :param api_url: URL for the NetBox API.
         :param api_token: Token for authentication with the NetBox API.
+        :param fetch: Fetch all datasets immediately. Pass False to fetch selectively.
+        :param concurrency: Maximum number of concurrent requests (default: NETBOX_CONCURRENCY or 4).
+        """
+        self.api_url = api_url
+        self.api_token = api_token
+        self.concurrency = concurrency
+        self._nb = None
+        self.prefixes = []
+        self.ip_addresses = IPTable.from_records([])
+        self.tenants_list = []
+        self.tenants = {}
+        self.vrf_list = []
+        self.vrfs = {}
+        if fetch:
+            self.fetch_all()
+
+    @property
+    def nb(self) -> Api:
+        """
+        The NetBox API, connected on first use so snapshot-only runs need no credentials.
+        """
+        if self._nb is None:
+            self._nb = self.nb_connect(self.api_url, self.api_token, self.concurrency)
+        return self._nb
+
+    def fetch_all(self):
+        """
+        Fetch all prefixes, IP addresses, tenants and VRFs concurrently.
+        """
+        nb = self.nb
+        tasks = {
+            'prefixes': lambda: self._fetch_data(
+                lambda: nb.ipam.prefixes.filter(**query_params('prefixes')), "prefixes"),
+            'ip_addresses': lambda: self._fetch_data(
+                lambda: nb.ipam.ip_addresses.filter(**query_params('ip_addresses')), "IP addresses"),
+            'tenants': lambda: self._fetch_data(
+                lambda: nb.tenancy.tenants.filter(**query_params('tenants')), "tenants"),
+            'vrfs': lambda: self._fetch_data(
+                lambda: nb.ipam.vrfs.filter(**query_params('vrfs')), "vrfs"),
+        }
+        self._set_datasets(run_concurrently({name: _timed_fetch(name, task) for name, task in tasks.items()}))
+
+    def sync_snapshot(self, store, reconcile_interval: float = 3600, full: bool = False):
+        """
+        Fetch only objects changed since the previous sync into the snapshot store,
+        then load the merged datasets from it, streaming IP addresses into a columnar table.
+        :param store: SnapshotStore holding the local copy of the datasets and the sync state.
+        :param reconcile_interval: Seconds between reconciliations of object IDs to detect deletions.
+        :param full: Discard the local copy and fetch everything.
+        """
+        delta_sync = DeltaSync(store, reconcile_interval)
+        if full:
+            delta_sync.reset()
+        delta_sync.sync(self.nb, self._fetch_data)
+        self._load_store(store)
+
+    def load_snapshot(self, store):
         """
-        self.nb = self.nb_connect(api_url, api_token)
-        self.prefixes = self._fetch_data(self.nb.ipam.prefixes.all, "prefixes")
-        self.ip_addresses = self._fetch_data(self.nb.ipam.ip_addresses.all, "IP addresses")
-        self.tenants_list = self._fetch_data(self.nb.tenancy.tenants.all, "tenants")
+        Load all datasets from the snapshot store without contacting NetBox.
+        :param store: SnapshotStore populated by a previous sync.
+        """
+        if store.get_meta('high_water') is None and not store.count('prefixes'):
+            raise RuntimeError(f"Snapshot store {store.path} is empty; run a full sync first")
+        self._load_store(store)
+        logging.info(
+            f"Loaded {len(self.prefixes)} prefixes and {len(self.ip_addresses)} IP addresses from {store.path}"
+        )
+
+    def _load_store(self, store):
+        self._set_datasets({
+            'prefixes': store.load('prefixes'),
+            'ip_addresses': IPTable.from_records(store.iter_records('ip_addresses')),
+            'tenants': store.load('tenants'),
+            'vrfs': store.load('vrfs'),
+        })
+
+    def _set_datasets(self, datasets: dict):
+        self.prefixes = datasets['prefixes']
+        ip_addresses = datasets['ip_addresses']
+        if not isinstance(ip_addresses, IPTable):
+            ip_addresses = IPTable.from_records(ip_addresses)
+        self.ip_addresses = ip_addresses
+        self.tenants_list = datasets['tenants']
         self.tenants = {item["id"]: item for item in self.tenants_list}
-        self.vrf_list = self._fetch_data(self.nb.ipam.vrfs.all, "vrfs")
+        self.vrf_list = datasets['vrfs']
         self.vrfs = {item["id"]: item for item in self.vrf_list}
 
+    def fetch_prefixes(self) -> list:
+        """
+        Fetch all prefixes only.
+        """
+        with FETCH_SECONDS.time(dataset='prefixes'):
+            self.prefixes = self._fetch_data(
+                lambda: self.nb.ipam.prefixes.filter(**query_params('prefixes')), "prefixes"
+            )
+        return self.prefixes
+
+    def fetch_ip_addresses_within(self, parents) -> list:
+        """
+        Fetch only the IP addresses inside the given parent prefixes.
+        :param parents: Iterable of (vrf_id, prefix) pairs; vrf_id None selects the Global VRF.
+        :return: An IPTable of the IP addresses without duplicates.
+        """
+        nb = self.nb
+
+        def fetch(vrf, parent):
+            vrf_filter = vrf if vrf is not None else "null"
+            with FETCH_SECONDS.time(dataset='ip_addresses'):
+                return self._fetch_data(
+                    lambda: nb.ipam.ip_addresses.filter(
+                        **query_params('ip_addresses', parent=parent, vrf_id=vrf_filter)
+                    ),
+                    f"IP addresses in {parent} (VRF {vrf})",
+                )
+
+        parents = sorted(parents, key=lambda item: (str(item[0]), item[1]))
+        results = run_concurrently({parent: lambda parent=parent: fetch(*parent) for parent in parents})
+        ip_addresses = {}
+        for parent in parents:
+            ip_addresses.update((item["id"], item) for item in results[parent])
+        self.ip_addresses = IPTable.from_records(ip_addresses.values())
+        return self.ip_addresses
+
     @staticmethod
-    def nb_connect(api_url: str = None, api_token: str = None) -> Api:
+    def nb_connect(api_url: str = None, api_token: str = None, concurrency: int = None) -> Api:
         """
         Connect to the NetBox API using provided credentials or environment variables.
+
+        Pages of list requests are fetched in parallel, over a pooled session that blocks
+        when all its connections are busy, so at most `concurrency` requests are in flight
+        even while several datasets are fetched at once.
         :param api_url: URL for the NetBox API.
         :param api_token: Token for authentication with the NetBox API.
+        :param concurrency: Maximum number of concurrent requests (default: NETBOX_CONCURRENCY or 4).
         :return: An instance of the NetBox API.
         """
-        if not api_url or not api_token:
-            load_dotenv()
-            api_url = api_url or os.getenv('NETBOX_API_URL')
-            api_token = api_token or os.getenv('NETBOX_API_TOKEN')
+        load_dotenv()
+        api_url = api_url or os.getenv('NETBOX_API_URL')
+        api_token = api_token or os.getenv('NETBOX_API_TOKEN')
+        concurrency = concurrency or int(os.getenv('NETBOX_CONCURRENCY', DEFAULT_CONCURRENCY))
 
         if not api_url or not api_token:
             raise ValueError("NetBox API URL and token must be provided.")
-        
-        return Api(api_url, token=api_token)
+
+        nb = Api(api_url, token=api_token, threading=True, max_workers=concurrency)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, pool_block=True)
+        nb.http_session.mount('http://', adapter)
+        nb.http_session.mount('https://', adapter)
+        return nb
 
     @staticmethod
     def _fetch_data(fetch_method, data_type: str) -> list:
@@ -46,10 +186,12 @@ class NetboxAddressManager:
         Fetch and serialize data from the NetBox API.
         :param fetch_method: The API method to fetch data.
         :param data_type: Description of the data type being fetched (for logging purposes).
-        :return: A list of serialized data.
+        :return: A list of serialized data, sorted by ID.
         """
         try:
             data = [item.serialize() for item in fetch_method()]
+            # Pages fetched in parallel arrive in completion order
+            data.sort(key=lambda item: item.get('id') or 0)
             logging.info(f"Loaded {len(data)} {data_type} from NetBox")
             return data
         except Exception as e:
@@ -59,7 +201,7 @@ class NetboxAddressManager:
     def get_prefixes(self) -> list:
         return self.prefixes
 
-    def get_ip_addresses(self) -> list:
+    def get_ip_addresses(self) -> IPTable:
         return self.ip_addresses
 
     def get_vrfs(self) -> list:
@@ -0,0 +1,175 @@
+# app/netbox_sync.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import math
+
+from app.metrics import FETCH_SECONDS
+
+# Synchronized datasets and their NetBox (app, endpoint)
+DATASETS = {
+    'prefixes': ('ipam', 'prefixes'),
+    'ip_addresses': ('ipam', 'ip_addresses'),
+    'tenants': ('tenancy', 'tenants'),
+    'vrfs': ('ipam', 'vrfs'),
+}
+
+# Seconds by which high-water marks trail the newest timestamp seen, in addition to the
+# fetch duration, to allow for timestamp resolution
+SYNC_OVERLAP = 5
+
+# Fields used by rendering, the data files and the web pages.
+# NetBox 4.0+ returns only these; older versions ignore the parameter and return full records.
+DATASET_FIELDS = {
+    'prefixes': ('id', 'prefix', 'vrf', 'tenant', 'status', 'last_updated'),
+    'ip_addresses': ('id', 'address', 'vrf', 'tenant', 'status', 'role', 'tags', 'last_updated'),
+    'tenants': ('id', 'name', 'slug', 'last_updated'),
+    'vrfs': (
+        'id', 'name', 'rd', 'description', 'tenant', 'url', 'display_url', 'prefix_count', 'ipaddress_count',
+        'last_updated',
+    ),
+}
+
+
+def query_params(name, **filters):
+    """Return list view filters for a dataset, limited to the fields in DATASET_FIELDS."""
+    return dict(filters, fields=','.join(DATASET_FIELDS[name]))
+
+
+def run_concurrently(tasks):
+    """
+    Run callables in threads.
+
+    Args:
+        tasks (dict): Key -> callable without arguments.
+
+    Returns:
+        dict: Key -> result. The first exception raised by a task is re-raised.
+    """
+    with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as pool:
+        futures = {key: pool.submit(task) for key, task in tasks.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def parse_timestamp(value):
+    """
+    Parse a NetBox last_updated timestamp.
+
+    Returns:
+        datetime or None: Timezone-aware timestamp, or None if missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+class DeltaSync:
+    def __init__(self, store, reconcile_interval=3600):
+        """
+        Keeps a SnapshotStore current by fetching only objects changed in NetBox.
+
+        Every dataset has its own high-water mark, derived from the last_updated timestamps it
+        returned, so clock skew between NetBox and this host does not matter. A paginated fetch
+        is not a consistent snapshot: an object changed after its page was read may be older
+        than objects on later pages. The mark therefore trails the newest timestamp by the fetch
+        duration plus SYNC_OVERLAP, and the next sync fetches such objects again; upserts make
+        the overlap harmless. Deleted objects leave no trace in a last_updated query, so object
+        IDs are periodically reconciled against NetBox.
+
+        Args:
+            store (SnapshotStore): Local copy of the datasets, also holding the sync state.
+            reconcile_interval (float): Seconds between ID reconciliations.
+        """
+        self.store = store
+        self.reconcile_interval = reconcile_interval
+
+    def reset(self):
+        """Forget the high-water marks so the next sync performs a full fetch."""
+        with self.store:
+            self.store.set_meta('high_water', None)
+
+    def sync(self, nb, fetch_data):
+        """
+        Bring the local datasets in the store up to date.
+
+        Args:
+            nb: pynetbox API instance.
+            fetch_data (callable): fetch_data(fetch_method, data_type) returning serialized records,
+                                   as NetboxAddressManager._fetch_data.
+        """
+        high_water = self.store.get_meta('high_water')
+        if isinstance(high_water, str):
+            # A single mark for all datasets, from stores written before marks were kept per dataset
+            high_water = {name: high_water for name in DATASETS}
+        marks = high_water or {}
+        full = not marks
+        now = time.time()
+        reconcile = not full and now - self.store.get_meta('last_reconcile', 0) >= self.reconcile_interval
+
+        def fetch(name):
+            with FETCH_SECONDS.time(dataset=name):
+                start = time.monotonic()
+                fetched, live_ids = fetch_dataset(name)
+                return fetched, live_ids, time.monotonic() - start
+
+        def fetch_dataset(name):
+            app, endpoint = DATASETS[name]
+            api = getattr(getattr(nb, app), endpoint)
+            mark = marks.get(name)
+            if mark is None:
+                fetched = fetch_data(lambda: api.filter(**query_params(name)), name)
+            else:
+                # >= rather than > so objects sharing the high-water timestamp are not missed
+                fetched = fetch_data(
+                    lambda: api.filter(**query_params(name, last_updated__gte=mark)), f"changed {name}"
+                )
+            live_ids = None
+            if reconcile:
+                live_ids = {item['id'] for item in fetch_data(lambda: api.filter(brief=1), f"{name} IDs")}
+            return fetched, live_ids
+
+        # Datasets are fetched concurrently; the store is only written from this thread
+        results = run_concurrently({name: lambda name=name: fetch(name) for name in DATASETS})
+
+        new_marks = {}
+        with self.store:
+            for name, (fetched, live_ids, duration) in results.items():
+                if marks.get(name) is None:
+                    self.store.replace(name, fetched)
+                else:
+                    self.store.upsert(name, fetched)
+
+                if live_ids is not None:
+                    deleted = self.store.ids(name) - live_ids
+                    self.store.delete(name, deleted)
+                    if deleted:
+                        logging.info(f"Removed {len(deleted)} deleted {name}")
+
+                new_marks[name] = self._next_mark(marks.get(name), fetched, duration)
+
+            self.store.set_meta('high_water', new_marks if any(new_marks.values()) else None)
+            if full or reconcile:
+                self.store.set_meta('last_reconcile', now)
+
+    @staticmethod
+    def _next_mark(mark, fetched, duration):
+        """
+        Return the high-water mark of a dataset after a fetch that took duration seconds.
+
+        Objects changed while the fetch ran have timestamps within duration of the newest one
+        fetched, and no older than the previous mark, so the mark never moves past them.
+        """
+        timestamps = [parse_timestamp(item.get('last_updated')) for item in fetched]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        if not timestamps:
+            return mark
+        candidate = max(timestamps) - timedelta(seconds=math.ceil(duration) + SYNC_OVERLAP)
+        previous = parse_timestamp(mark)
+        if previous is not None and previous > candidate:
+            return mark
+        return candidate.isoformat()
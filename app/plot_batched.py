@@ -0,0 +1,209 @@
+# app/plot_batched.py
+
+"""
+Batched matplotlib renderer.
+
+Draws the same layout as plot_allocation_grid, but all prefix rectangles and all IP
+cells each go into a single PolyCollection, and the figure with the grid lines and
+navigation labels is reused across prefixes of the same grid size. The cost of an
+image therefore no longer grows with the number of Artist objects.
+"""
+
+from collections import OrderedDict
+import ipaddress
+import logging
+import threading
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba, to_rgba_array
+from matplotlib.figure import Figure
+import numpy as np
+
+from app.color_design import blend_colors, design_color_palette
+from app.morton import prefix_bounding_boxes
+from app.plot_map import (
+    Z_DEPTH_IP_CELLS,
+    Z_DEPTH_PREFIX_LABEL,
+    Z_DEPTH_PREFIX_PATCH,
+    calculate_grid_dimensions,
+    create_allocation_grid,
+    determine_ip_colors,
+    draw_sparse_grid,
+    finalize_plot,
+    get_max_bits,
+    get_prefix_rectangles,
+    get_tenant_color,
+)
+
+# Figures kept per thread; grid sizes only vary with the prefix length
+MAX_CACHED_FIGURES = 8
+
+# Figures are not thread-safe, so each thread (web app request, render worker) has its own
+_local = threading.local()
+
+
+def rectangle_vertices(x1, y1, x2, y2):
+    """
+    Return the corners of axis-aligned rectangles as an (n, 4, 2) array for PolyCollection.
+
+    Args:
+        x1, y1, x2, y2 (numpy.ndarray): Left, top, right and bottom edges.
+    """
+    return np.stack([
+        np.stack([x1, y1], axis=-1),
+        np.stack([x2, y1], axis=-1),
+        np.stack([x2, y2], axis=-1),
+        np.stack([x1, y2], axis=-1),
+    ], axis=1).astype(float)
+
+
+class GridFigure:
+    def __init__(self, grid_width, grid_height, cell_size, palette):
+        """
+        A figure for one grid size with the parts shared by all prefixes of that size:
+        background, sparse grid lines and the navigation label artists, whose texts
+        are set per prefix.
+
+        Args:
+            grid_width (int): Width of the grid in cells.
+            grid_height (int): Height of the grid in cells.
+            cell_size (int): Size of each grid cell in pixels.
+            palette (dict): Color palette for styling.
+        """
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cell_size = cell_size
+        image_width = grid_width * cell_size
+        image_height = grid_height * cell_size
+        # Object-oriented API: no pyplot global state, safe to use from worker processes
+        self.figure = Figure(figsize=(image_width / 100, image_height / 100), dpi=100)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.subplots()
+        self.ax.set_facecolor(palette['background'])
+        draw_sparse_grid(self.ax, cell_size, grid_width, grid_height, palette)
+        finalize_plot(self.ax, image_width, image_height, None)
+        self.labels = self._create_navigation_labels(palette)
+
+    def _create_navigation_labels(self, palette):
+        """
+        Create one text artist per /24 subnet, at the positions shared by all prefixes of this grid size.
+        """
+        cells = self.grid_width * self.grid_height
+        if cells < 256:
+            return []
+        max_bits = get_max_bits(self.grid_width, self.grid_height)
+        offset_starts = np.arange(0, cells, 256, dtype=np.int64)
+        x1s, y1s, x2s, y2s = prefix_bounding_boxes(offset_starts, offset_starts + 255, max_bits)
+        labels = []
+        for x1, y1, x2, y2 in zip(x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist()):
+            labels.append(self.ax.text(
+                (x1 + x2) * self.cell_size / 2,
+                (y1 + y2) * self.cell_size / 2,
+                "",
+                fontsize=self.cell_size * 2,
+                ha='center',
+                va='center',
+                weight='bold',
+                color=palette.get('grid_text', '#cccccc'),
+                bbox=dict(facecolor='white', alpha=0.3, edgecolor='none', boxstyle='round,pad=0.3'),
+                zorder=Z_DEPTH_PREFIX_LABEL
+            ))
+        return labels
+
+    def set_navigation_labels(self, top_network):
+        """Label every /24 subnet of top_network with its third octet, as construct_prefix_label does."""
+        first_subnet = int(top_network.network_address) >> 8
+        for i, label in enumerate(self.labels):
+            label.set_text(str((first_subnet + i) & 0xFF))
+
+    def save(self, output_file, collections):
+        """Draw the collections on the shared parts, save the PNG and remove them again."""
+        for collection in collections:
+            self.ax.add_collection(collection, autolim=False)
+        try:
+            self.figure.savefig(output_file, dpi=100, pad_inches=0)
+        finally:
+            for collection in collections:
+                collection.remove()
+
+
+def get_grid_figure(grid_width, grid_height, cell_size, palette):
+    """Return the figure of this thread for a grid size, creating it if needed."""
+    figures = _local.__dict__.setdefault('figures', OrderedDict())
+    key = (grid_width, grid_height, cell_size)
+    figure = figures.get(key)
+    if figure is None:
+        figure = figures[key] = GridFigure(grid_width, grid_height, cell_size, palette)
+        if len(figures) > MAX_CACHED_FIGURES:
+            figures.popitem(last=False)
+    else:
+        figures.move_to_end(key)
+    return figure
+
+
+def build_prefix_collection(rectangles, cell_size, tenant_color_map):
+    """
+    Build one collection of low-contrast prefix rectangles based on tenant, shorter prefixes
+    first, so that nested prefixes are drawn on top as with per-prefix z-orders.
+    """
+    ordered = sorted(rectangles, key=lambda r: int(r['prefix'].split('/')[1]))
+    x1 = np.array([r['x1'] for r in ordered]) * cell_size
+    y1 = np.array([r['y1'] for r in ordered]) * cell_size
+    x2 = (np.array([r['x2'] for r in ordered]) + 1) * cell_size
+    y2 = (np.array([r['y2'] for r in ordered]) + 1) * cell_size
+    colors = {}
+    for r in ordered:
+        if r['tenant'] not in colors:
+            colors[r['tenant']] = blend_colors(get_tenant_color(r['tenant'], tenant_color_map), "#FFFFFF", 0.5)
+    return PolyCollection(
+        rectangle_vertices(x1, y1, x2, y2),
+        facecolors=to_rgba_array([colors[r['tenant']] for r in ordered]),
+        edgecolors="black",
+        linewidths=0.5,
+        linestyles=":",
+        antialiaseds=False,
+        zorder=Z_DEPTH_PREFIX_PATCH,
+    )
+
+
+def build_ip_collection(ip_cells, cell_size, palette):
+    """
+    Build one collection of allocated IP cells, colored per row by determine_ip_color.
+    """
+    codes, styles = determine_ip_colors(ip_cells['ips'], palette)
+    style_colors = np.array([
+        to_rgba(color, alpha) if color != 'none' else (0, 0, 0, 0) for color, alpha in styles
+    ]).reshape(-1, 4)
+    visible = np.array([color != 'none' for color, _ in styles], dtype=bool)[codes]
+    x1 = ip_cells['x'][visible] * cell_size + 1  # Adjust for spacing
+    y1 = ip_cells['y'][visible] * cell_size + 1
+    return PolyCollection(
+        rectangle_vertices(x1, y1, x1 + cell_size - 1, y1 + cell_size - 1),
+        facecolors=style_colors[codes[visible]],
+        edgecolors='none',
+        antialiaseds=False,
+        zorder=Z_DEPTH_IP_CELLS,  # on top
+    )
+
+
+def plot_allocation_grid_batched(top_level_prefix_entry, child_prefixes, ip_table, output_file, cell_size,
+                                 tenant_color_map):
+    """Visualize the allocation grid with matplotlib collections on a reused figure and save it as a PNG."""
+    top_level_prefix = top_level_prefix_entry.get("prefix", "").strip()
+    logging.info(top_level_prefix)
+
+    grid, ip_cells = create_allocation_grid(top_level_prefix, ip_table)
+    grid_width, grid_height = calculate_grid_dimensions(top_level_prefix)
+    max_bits = get_max_bits(grid_width, grid_height)
+    rectangles = get_prefix_rectangles(top_level_prefix, child_prefixes, max_bits)
+
+    palette = design_color_palette()
+
+    figure = get_grid_figure(grid_width, grid_height, cell_size, palette)
+    figure.set_navigation_labels(ipaddress.ip_network(top_level_prefix))
+    figure.save(output_file, [
+        build_prefix_collection(rectangles, cell_size, tenant_color_map),
+        build_ip_collection(ip_cells, cell_size, palette),
+    ])
+    logging.debug(f"Prefix map {top_level_prefix} saved to {output_file}")
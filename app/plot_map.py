@@ -3,13 +3,13 @@
 import ipaddress
 import logging
 import math
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
-import matplotlib.pyplot as plt
 import numpy as np
-import sys
 
 from app.color_design import TABLEAU10_PALETTE, blend_colors, design_color_palette
-from app.utils import expand_ip_entry, extract_ip_details
+from app.morton import morton_decode_array, prefix_bounding_boxes
 
 
 Z_DEPTH_IP_CELLS = 110  # on top
@@ -27,21 +27,22 @@ def morton_decode(z, max_bits):
 
 def decode_offset(offset, max_bits, grid_width, grid_height):
     """
-    Decode the IP offset to (x, y) coordinates based on grid dimensions.
+    Decode IP offsets to (x, y) coordinates based on grid dimensions.
     For rectangular grids (grid_width == 2 * grid_height), treat as two adjacent square grids.
+    Accepts a scalar offset or an array of offsets; returns scalars or arrays accordingly.
     """
+    offsets = np.asarray(offset, dtype=np.int64)
     if grid_width == grid_height:
-        x, y = morton_decode(offset, max_bits)
+        x, y = morton_decode_array(offsets, max_bits)
     elif grid_width == 2 * grid_height:
         cells_per_grid = grid_height * (grid_width // 2)
-        if offset < cells_per_grid:
-            x, y = morton_decode(offset, max_bits)
-        else:
-            offset_adj = offset - cells_per_grid
-            x, y = morton_decode(offset_adj, max_bits)
-            x += grid_width // 2
+        right_half = offsets >= cells_per_grid
+        x, y = morton_decode_array(np.where(right_half, offsets - cells_per_grid, offsets), max_bits)
+        x = x + right_half * (grid_width // 2)
     else:
         raise NotImplementedError("Unsupported grid dimensions. grid_width must be equal to grid_height or twice the grid_width.")
+    if offsets.ndim == 0:
+        return int(x), int(y)
     return x, y
 
 
@@ -72,11 +73,18 @@ def get_max_bits(grid_width: int, grid_height: int) -> int:
     return math.ceil(math.log2(max(grid_width, grid_height)))
 
 
-def create_allocation_grid(prefix, ip_addresses):
+def create_allocation_grid(prefix, ip_table):
     """
     Create a grid representation for a prefix using Z-order curve.
     Each cell represents a single IP address.
-    Returns a dictionary mapping (x, y) to IP details.
+
+    Args:
+        prefix (str): The prefix to plot.
+        ip_table (IPTable): IP addresses inside the prefix sorted by address, as sliced by IPIndex.
+
+    Returns:
+        tuple: (grid, ip_cells) where ip_cells is a dict of 'x' and 'y' cell coordinate arrays
+               and the 'ips' table rows occupying them. Of duplicate addresses, the last one is kept.
     """
     try:
         prefix_obj = ipaddress.ip_network(prefix)
@@ -85,41 +93,29 @@ def create_allocation_grid(prefix, ip_addresses):
         logging.debug(f"Processing prefix: {prefix_obj}")
     except ValueError as ve:
         logging.error(f"Invalid prefix '{prefix}': {ve}")
-        sys.exit(1)
+        raise
     except Exception as e:
         logging.error(f"Error processing prefix '{prefix}': {e}")
-        sys.exit(1)
+        raise
 
     grid_width, grid_height = calculate_grid_dimensions(prefix)
     max_bits = get_max_bits(grid_width, grid_height)
 
     grid = np.zeros((grid_height, grid_width), dtype=int)
-    ip_details = {}  # (x, y): details
 
-    allocated_count = 0
-    for idx, ip_entry in enumerate(ip_addresses, start=1):
-        expanded_ips = expand_ip_entry(ip_entry)
-        if not expanded_ips:
-            logging.debug(f"No valid IPs found for entry {idx}")
-            continue
+    offsets = ip_table.columns['address'] - int(prefix_obj.network_address)
+    inside = (offsets >= 0) & (offsets < prefix_obj.num_addresses)
+    if not inside.all():
+        logging.debug(f"{int((~inside).sum())} IPs are outside the prefix {prefix_obj}")
+    # Addresses are sorted, so duplicates are adjacent; a cell shows the last of them
+    last = np.append(offsets[1:] != offsets[:-1], True) if len(offsets) else inside
+    keep = inside & last
+
+    xs, ys = decode_offset(offsets[keep], max_bits, grid_width, grid_height)
+    grid[ys, xs] = 1  # Mark as allocated
 
-        for ip in expanded_ips:
-            if ip in prefix_obj:
-                offset = int(ip) - int(prefix_obj.network_address)
-                x, y = decode_offset(offset, max_bits, grid_width, grid_height)
-                if 0 <= x < grid_width and 0 <= y < grid_height:
-                    grid[y][x] = 1  # Mark as allocated
-                    ip_details[(x, y)] = extract_ip_details(ip, ip_entry)
-                    allocated_count += 1
-                    if allocated_count % 1000 == 0:
-                        logging.info(f"Allocated {allocated_count} IPs...")
-                else:
-                    logging.warning(f"IP {ip} is out of grid bounds.")
-            else:
-                logging.debug(f"IP {ip} is outside the prefix {prefix_obj}")
-
-    logging.debug(f"Total allocated IPs within prefix {prefix_obj}: {allocated_count}")
-    return grid, ip_details
+    logging.debug(f"Total allocated IPs within prefix {prefix_obj}: {int(inside.sum())}")
+    return grid, {'x': xs, 'y': ys, 'ips': ip_table.take(keep)}
 
 
 def calculate_bounding_box(sub_prefix: ipaddress.IPv4Network, top_network: ipaddress.IPv4Network, max_bits: int):
@@ -149,9 +145,12 @@ def get_prefix_rectangles(top_prefix, prefixes, max_bits):
     Each rectangle is defined by top-left (x1, y1) and bottom-right (x2, y2) coordinates on the grid.
     Returns a list of rectangles with their positions on the grid.
     """
-    rectangles = []
     top_network = ipaddress.ip_network(top_prefix)
+    top_start = int(top_network.network_address)
 
+    valid_entries = []
+    offset_starts = []
+    offset_ends = []
     for prefix_entry in prefixes:
         sub_prefix = prefix_entry.get("prefix", "").strip()
         if not sub_prefix:
@@ -160,22 +159,35 @@ def get_prefix_rectangles(top_prefix, prefixes, max_bits):
             sub_prefix_obj = ipaddress.ip_network(sub_prefix)
             if not sub_prefix_obj.subnet_of(top_network):
                 continue  # Ignore prefixes outside the top_prefix
-            x1, y1, x2, y2 = calculate_bounding_box(sub_prefix_obj, top_network, max_bits)
-            rectangles.append({
-                'x1': x1,
-                'y1': y1,
-                'x2': x2,
-                'y2': y2,
-                'prefix': str(sub_prefix_obj),
-                'status': prefix_entry.get('status'),
-                'tenant': prefix_entry.get('tenant'),
-            })
-            logging.debug(f"Prefix {sub_prefix_obj} mapped to rectangle: ({x1},{y1}) - ({x2},{y2})")
+            offset_starts.append(int(sub_prefix_obj.network_address) - top_start)
+            offset_ends.append(int(sub_prefix_obj.broadcast_address) - top_start)
+            valid_entries.append((sub_prefix_obj, prefix_entry))
         except ipaddress.AddressValueError:
             logging.error(f"Invalid prefix format: {sub_prefix}")
             continue
         except Exception as e:
             logging.error(f"Error processing prefix '{sub_prefix}': {e}")
+
+    x1s, y1s, x2s, y2s = prefix_bounding_boxes(
+        np.array(offset_starts, dtype=np.int64),
+        np.array(offset_ends, dtype=np.int64),
+        max_bits,
+    )
+
+    rectangles = []
+    for x1, y1, x2, y2, (sub_prefix_obj, prefix_entry) in zip(
+        x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist(), valid_entries
+    ):
+        rectangles.append({
+            'x1': x1,
+            'y1': y1,
+            'x2': x2,
+            'y2': y2,
+            'prefix': str(sub_prefix_obj),
+            'status': prefix_entry.get('status'),
+            'tenant': prefix_entry.get('tenant'),
+        })
+        logging.debug(f"Prefix {sub_prefix_obj} mapped to rectangle: ({x1},{y1}) - ({x2},{y2})")
     return rectangles
 
 
@@ -227,6 +239,27 @@ def determine_ip_color(details, palette):
         return ('black', 1)  # Normal
 
 
+def determine_ip_colors(ip_table, palette):
+    """
+    Apply determine_ip_color to every row of an IP table, once per distinct combination of details.
+
+    Returns:
+        tuple: (style codes, styles) where styles[code] is the (color, alpha) of a row.
+    """
+    columns = ip_table.columns
+    details_codes = np.stack([columns['role'], columns['status'], columns['tags']], axis=1)
+    combinations, codes = np.unique(details_codes, axis=0, return_inverse=True)
+    styles = []
+    for role, status, tags in combinations.tolist():
+        details = {
+            'role': ip_table.values['role'][role],
+            'status': ip_table.values['status'][status],
+            'tags': ip_table.values['tags'][tags],
+        }
+        styles.append(determine_ip_color(details, palette))
+    return codes.reshape(-1), styles
+
+
 def get_prefix_label(prefix):
     """
     Extract a relevant part of the prefix to use as a unique label on the map.
@@ -311,12 +344,13 @@ def draw_sparse_grid(ax, cell_size, grid_width, grid_height, palette):
         ax.axvline(i * cell_size, color=palette['grid_lines'], linestyle=':', linewidth=1, zorder=Z_DEPTH_AXES, aa=False)
 
 
-def plot_allocated_ips(ax, ip_details, cell_size, palette):
+def plot_allocated_ips(ax, ip_cells, cell_size, palette):
     """
     Plot allocated IP addresses on the grid.
     """
-    for (x, y), details in ip_details.items():
-        color, alpha = determine_ip_color(details, palette)
+    codes, styles = determine_ip_colors(ip_cells['ips'], palette)
+    for x, y, code in zip(ip_cells['x'].tolist(), ip_cells['y'].tolist(), codes.tolist()):
+        color, alpha = styles[code]
         if color != 'none':  # Only plot if not transparent
             rect = Rectangle(
                 (x * cell_size + 1, y * cell_size + 1),  # Adjust for spacing
@@ -400,10 +434,15 @@ def draw_navigation_labels(ax, top_level_prefix, cell_size, grid_width, grid_hei
         return
 
     max_bits = get_max_bits(grid_width, grid_height)
-    # Iterate over /24 subnets
-    for subnet in top_network.subnets(new_prefix=24):
+    # Compute all /24 subnet boxes in one batch
+    subnets = list(top_network.subnets(new_prefix=24))
+    top_start = int(top_network.network_address)
+    offset_starts = np.array([int(subnet.network_address) - top_start for subnet in subnets], dtype=np.int64)
+    offset_ends = np.array([int(subnet.broadcast_address) - top_start for subnet in subnets], dtype=np.int64)
+    x1s, y1s, x2s, y2s = prefix_bounding_boxes(offset_starts, offset_ends, max_bits)
+
+    for subnet, x1, y1, x2, y2 in zip(subnets, x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist()):
         try:
-            x1, y1, x2, y2 = calculate_bounding_box(subnet, top_network, max_bits)
             # Calculate the position for the label
             label_x = (x1 + x2) * cell_size / 2
             label_y = (y1 + y2) * cell_size / 2
@@ -424,13 +463,14 @@ def draw_navigation_labels(ax, top_level_prefix, cell_size, grid_width, grid_hei
             logging.error(f"Error generating label for subnet: {subnet}")
 
 
-def plot_allocation_grid(top_level_prefix_entry, child_prefixes, relevant_ips, output_file, cell_size, tenant_color_map):
+def plot_allocation_grid(top_level_prefix_entry, child_prefixes, ip_table, output_file, cell_size,
+                         tenant_color_map):
     """Visualize the allocation grid and save it as a PNG."""
     top_level_prefix = top_level_prefix_entry.get("prefix", "").strip()
     logging.info(top_level_prefix)
 
     # Create a grid for IP allocation
-    grid, ip_details = create_allocation_grid(top_level_prefix, relevant_ips)
+    grid, ip_cells = create_allocation_grid(top_level_prefix, ip_table)
     grid_width, grid_height = calculate_grid_dimensions(top_level_prefix)
     max_bits = get_max_bits(grid_width, grid_height)
 
@@ -442,7 +482,10 @@ def plot_allocation_grid(top_level_prefix_entry, child_prefixes, relevant_ips, o
 
     image_width = grid_width * cell_size
     image_height = grid_height * cell_size
-    fig, ax = plt.subplots(figsize=(image_width / 100, image_height / 100), dpi=100)
+    # Object-oriented API: no pyplot global state, safe to use from worker processes
+    fig = Figure(figsize=(image_width / 100, image_height / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
 
     # Set background
     ax.set_facecolor(palette['background'])
@@ -460,11 +503,10 @@ def plot_allocation_grid(top_level_prefix_entry, child_prefixes, relevant_ips, o
     draw_prefix_rectangles(ax, rectangles, cell_size, tenant_color_map)
 
     # Plot each allocated IP
-    plot_allocated_ips(ax, ip_details, cell_size, palette)
+    plot_allocated_ips(ax, ip_cells, cell_size, palette)
 
     # Finalize and save the plot
     finalize_plot(ax, image_width, image_height, top_level_prefix_entry)
 
-    plt.savefig(output_file, dpi=100, bbox_inches='tight', pad_inches=0)
-    plt.close()
+    fig.savefig(output_file, dpi=100, bbox_inches='tight', pad_inches=0)
     logging.debug(f"Prefix map {top_level_prefix} saved to {output_file}")
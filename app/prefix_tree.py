@@ -5,6 +5,64 @@ import ipaddress
 from collections import defaultdict
 
 
+class MaterializedTree:
+    def __init__(self, tree):
+        """
+        Index arrays over one PyTricia tree, built in a single pass.
+
+        Prefixes are stored in preorder (sorted by network address, then prefix length),
+        so the descendants of a node are the contiguous range after it up to subtree_end.
+
+        Args:
+            tree: The PyTricia tree for IPv4 or IPv6.
+        """
+        networks = sorted(
+            ((ipaddress.ip_network(prefix), prefix) for prefix in tree),
+            key=lambda item: (item[0].network_address, item[0].prefixlen),
+        )
+        self.prefixes = [prefix for _, prefix in networks]
+        self.prefixlens = [network.prefixlen for network, _ in networks]
+        self.data = [tree[prefix] for prefix in self.prefixes]
+        self.position = {prefix: i for i, prefix in enumerate(self.prefixes)}
+        self.parent = [-1] * len(networks)
+        self.subtree_end = [len(networks)] * len(networks)
+        self.children = [[] for _ in networks]
+        self.roots = []
+
+        # Sweep in preorder, keeping the chain of ancestors of the current prefix on a stack
+        stack = []
+        for i, (network, _) in enumerate(networks):
+            while stack and not network.subnet_of(networks[stack[-1]][0]):
+                self.subtree_end[stack.pop()] = i
+            if stack:
+                self.parent[i] = stack[-1]
+                self.children[stack[-1]].append(i)
+            else:
+                self.roots.append(i)
+            stack.append(i)
+
+        # Nested nodes, built bottom-up so every child node already exists
+        self.nodes = [None] * len(networks)
+        for i in reversed(range(len(networks))):
+            node = self.data[i].copy()
+            node['children'] = [self.nodes[child] for child in self.children[i]]
+            self.nodes[i] = node
+
+        self._by_length = {}
+
+    def descendants(self, i):
+        """Return the data of all descendants of node i, in preorder."""
+        return self.data[i + 1:self.subtree_end[i]]
+
+    def descendants_by_length(self, i):
+        """Return the descendant prefixes of node i ordered by prefix length, then address."""
+        result = self._by_length.get(i)
+        if result is None:
+            order = sorted(range(i + 1, self.subtree_end[i]), key=lambda j: (self.prefixlens[j], j))
+            result = self._by_length[i] = [self.prefixes[j] for j in order]
+        return list(result)
+
+
 class PrefixTree:
     def __init__(self):
         """
@@ -12,11 +70,15 @@ class PrefixTree:
         Trees are organized as a dictionary where:
         - Key: VRF ID (None for Global VRF).
         - Value: Dictionary containing IPv4 and IPv6 trees.
+
+        Queries use a MaterializedTree built once per tree on first use
+        and discarded when a prefix is added to that tree.
         """
         self.trees = defaultdict(lambda: {
             'ipv4': pytricia.PyTricia(32),
             'ipv6': pytricia.PyTricia(128)
         })
+        self._materialized = {}  # (vrf, tree_key): MaterializedTree
 
     def add_prefix(self, prefix_data):
         """
@@ -30,6 +92,28 @@ class PrefixTree:
         network = ipaddress.ip_network(prefix)
         tree_key = 'ipv4' if network.version == 4 else 'ipv6'
         self.trees[vrf][tree_key][prefix] = prefix_data
+        self._materialized.pop((vrf, tree_key), None)
+
+    def get_materialized(self, vrf, tree_key):
+        """Return the MaterializedTree of a VRF and IP version, or None for an unknown VRF."""
+        if vrf not in self.trees:
+            return None
+        materialized = self._materialized.get((vrf, tree_key))
+        if materialized is None:
+            materialized = self._materialized[(vrf, tree_key)] = MaterializedTree(self.trees[vrf][tree_key])
+        return materialized
+
+    def _locate(self, prefix, vrf):
+        """Return (MaterializedTree, node index) of a prefix, or (None, None) if not found."""
+        network = ipaddress.ip_network(prefix)
+        tree_key = 'ipv4' if network.version == 4 else 'ipv6'
+        materialized = self.get_materialized(vrf, tree_key)
+        if materialized is None:
+            return None, None
+        i = materialized.position.get(str(network))
+        if i is None:
+            return None, None
+        return materialized, i
 
     def build_tree(self, vrf=None):
         """
@@ -44,67 +128,90 @@ class PrefixTree:
         if vrf is not None:
             return {
                 'vrf': vrf,
-                'ipv4': self._build_subtree(self.trees[vrf]['ipv4']),
-                'ipv6': self._build_subtree(self.trees[vrf]['ipv6'])
+                'ipv4': self._build_subtree(vrf, 'ipv4'),
+                'ipv6': self._build_subtree(vrf, 'ipv6')
             }
         else:
             return {
                 vrf_id: {
                     'vrf': vrf_id,
-                    'ipv4': self._build_subtree(vrf_trees['ipv4']),
-                    'ipv6': self._build_subtree(vrf_trees['ipv6'])
+                    'ipv4': self._build_subtree(vrf_id, 'ipv4'),
+                    'ipv6': self._build_subtree(vrf_id, 'ipv6')
                 }
-                for vrf_id, vrf_trees in self.trees.items()
+                for vrf_id in list(self.trees)
             }
 
-    def _build_subtree(self, tree):
-        roots = []
-        for prefix in tree:
-            if not tree.parent(prefix):  # Only add root prefixes
-                roots.append(self._build_node(tree, prefix))
-        return roots
+    def _build_subtree(self, vrf, tree_key):
+        materialized = self.get_materialized(vrf, tree_key)
+        if materialized is None:
+            return []
+        return [materialized.nodes[i] for i in materialized.roots]
 
-    def _build_node(self, tree, prefix):
+    def get_subtree(self, prefix, vrf=None):
         """
-        Recursively build a node and its children.
+        Get the subtree starting from a specific prefix in a given VRF.
+        Nodes are shared between calls and must not be modified.
 
         Args:
-            tree: The PyTricia tree for IPv4 or IPv6.
-            prefix: The prefix string.
+            prefix (str): The prefix to get the subtree for.
+            vrf: The VRF ID (None for Global VRF).
 
         Returns:
-            dict: A node dictionary with children.
+            dict or None: The subtree dictionary, whose 'children' are the direct child nodes,
+                          or None if the prefix is not found.
         """
-        node_data = tree[prefix].copy()
-        node_data['children'] = []
-        for child_prefix in tree.children(prefix):
-            child_node = self._build_node(tree, child_prefix)
-            node_data['children'].append(child_node)
-        return node_data
+        materialized, i = self._locate(prefix, vrf)
+        if materialized is None:
+            return None
+        return materialized.nodes[i]
 
-    def get_subtree(self, prefix, vrf=None):
+    def get_descendants(self, prefix, vrf=None) -> list:
         """
-        Get the subtree starting from a specific prefix in a given VRF.
+        Get the data of all prefixes below a prefix in a given VRF, in address order.
 
         Args:
-            prefix (str): The prefix to get the subtree for.
+            prefix (str): The parent prefix.
             vrf: The VRF ID (None for Global VRF).
 
         Returns:
-            dict or None: The subtree dictionary or None if the prefix is not found.
+            list: Prefix data dictionaries, or an empty list if the prefix is not found.
         """
-        network = ipaddress.ip_network(prefix)
-        tree_key = 'ipv4' if network.version == 4 else 'ipv6'
-        tree = self.trees[vrf][tree_key]
-        if prefix in tree:
-            return self._build_node(tree, prefix)
-        return None
+        materialized, i = self._locate(prefix, vrf)
+        if materialized is None:
+            return []
+        return materialized.descendants(i)
+
+    def get_covering_prefixes(self, address, vrf=None) -> list:
+        """
+        Get the prefixes that contain an address or prefix in a given VRF.
+        The result is ordered from the most specific prefix up to the root.
 
+        Args:
+            address (str): An IP address or prefix (e.g., '10.0.1.5' or '10.0.1.0/24').
+            vrf: The VRF ID (None for Global VRF).
+
+        Returns:
+            list: Covering prefix strings, including an exact match.
+        """
+        network = ipaddress.ip_network(address, strict=False)
+        tree_key = 'ipv4' if network.version == 4 else 'ipv6'
+        if vrf not in self.trees:
+            return []
+        prefix = self.trees[vrf][tree_key].get_key(str(network))
+        if not prefix:
+            return []
+        materialized = self.get_materialized(vrf, tree_key)
+        covering = []
+        i = materialized.position[prefix]
+        while i >= 0:
+            covering.append(materialized.prefixes[i])
+            i = materialized.parent[i]
+        return covering
 
     def get_children_recursively(self, prefix: str, vrf: int) -> list:
         """
         Get all child prefixes recursively for the given prefix and VRF.
-        The result is ordered by prefix length from shortest to longest.
+        The result is ordered by prefix length from shortest to longest, then by address.
 
         Args:
             prefix (str): The parent prefix to search for children.
@@ -113,18 +220,7 @@ class PrefixTree:
         Returns:
             list: A list of child prefixes ordered by prefix length, without duplicates.
         """
-        subtree = self.get_subtree(prefix, vrf)
-        if not subtree:
+        materialized, i = self._locate(prefix, vrf)
+        if materialized is None:
             return []
-        
-        children = set()  # Use a set to eliminate duplicates
-
-        def traverse(node):
-            for child in node.get('children', []):
-                child_prefix = child['prefix']
-                if child_prefix not in children:
-                    children.add(child_prefix)
-                    traverse(child)
-
-        traverse(subtree)
-        return sorted(children, key=lambda p: ipaddress.ip_network(p).prefixlen)
+        return materialized.descendants_by_length(i)
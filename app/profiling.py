@@ -0,0 +1,282 @@
+# app/profiling.py
+
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import heapq
+import io
+import logging
+import os
+import pstats
+import threading
+
+from app.metrics import STAGE_SECONDS
+
+# Slowest prefixes listed in the report
+DEFAULT_TOP = 20
+
+# Functions listed per stage in the report
+TOP_FUNCTIONS = 15
+
+# Call paths below this fraction of the profiled time are left out of collapsed stacks
+MIN_STACK_FRACTION = 1e-4
+
+# Code outside any named stage
+OTHER_STAGE = 'other'
+
+# Profiles enabled in this thread, innermost last; only the innermost one is collecting
+_local = threading.local()
+
+# The profiler of the running update, if profiling is enabled
+_profiler = None
+
+
+@contextmanager
+def profiled(profile):
+    """
+    Collect a cProfile.Profile while the block runs. Only one profile collects at a time, so a
+    profile enabled inside another one pauses it: the outer profile excludes the inner block.
+    """
+    stack = _local.__dict__.setdefault('stack', [])
+    if stack:
+        stack[-1].disable()
+    stack.append(profile)
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        stack.pop()
+        if stack:
+            stack[-1].enable()
+
+
+@contextmanager
+def paused():
+    """Stop the collecting profile while the block runs, to keep profiler bookkeeping out of it."""
+    stack = _local.__dict__.get('stack')
+    profile = stack[-1] if stack else None
+    if profile is not None:
+        profile.disable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.enable()
+
+
+class StatsDump:
+    def __init__(self, profile):
+        """
+        The raw statistics of a profile, which unlike the profile itself can be pickled and
+        returned from a render worker. pstats.Stats accepts it in place of a profile, but takes
+        its statistics over; pass a copy() to keep them.
+        """
+        if profile is not None:
+            with paused():
+                profile.create_stats()
+            self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+    def copy(self):
+        dump = StatsDump(None)
+        dump.stats = dict(self.stats)
+        return dump
+
+
+def format_function(func):
+    """Return a one-line label for a pstats function key, without ';' so it fits collapsed stacks."""
+    filename, lineno, name = func
+    if filename == '~':
+        label = name
+    else:
+        path = os.path.join(*filename.split(os.sep)[-2:]) if os.sep in filename else filename
+        label = f"{name} ({path}:{lineno})"
+    return label.replace(';', ',')
+
+
+def collapse_stats(stats, root=None):
+    """
+    Convert profile statistics to collapsed stacks, as read by flamegraph.pl, speedscope or inferno.
+
+    cProfile records caller/callee pairs rather than whole stacks, so stacks are rebuilt from the
+    call graph, splitting the time of a function among its callers in proportion to the time
+    each caller spent in it.
+
+    Args:
+        stats (dict): pstats statistics, {func: (cc, nc, tt, ct, callers)}.
+        root (str): Frame prepended to every stack, such as the stage name.
+
+    Returns:
+        Counter: {stack: microseconds of own time}.
+    """
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    roots = [func for func, value in stats.items() if not any(caller in stats for caller in value[4])]
+    total = sum(stats[func][3] for func in roots)
+    min_time = total * MIN_STACK_FRACTION
+    stacks = Counter()
+
+    def walk(func, path, labels, tt, ct):
+        if ct < min_time:
+            return
+        if tt > 0:
+            stacks[';'.join(labels)] += tt * 1e6
+        func_ct = stats[func][3]
+        scale = ct / func_ct if func_ct else 0
+        for callee in callees.get(func, ()):
+            if callee in path:
+                continue  # Recursion; its time is already counted in the outer call
+            edge = stats[callee][4][func]
+            walk(callee, path | {callee}, labels + [format_function(callee)], edge[2] * scale, edge[3] * scale)
+
+    prefix = [root] if root else []
+    for func in roots:
+        cc, nc, tt, ct, callers = stats[func]
+        walk(func, {func}, prefix + [format_function(func)], tt, ct)
+    return Counter({stack: round(value) for stack, value in stacks.items() if round(value) > 0})
+
+
+class PipelineProfiler:
+    def __init__(self, output_dir, top=DEFAULT_TOP):
+        """
+        Profile an update by stage and by prefix, and write the results to output_dir:
+        <stage>.prof pstats files, stages.collapsed with the stage as the root frame of every
+        stack, prefix-<key>.prof files of the slowest prefixes, and report.txt.
+
+        Args:
+            output_dir (str): Directory for the results, created on write.
+            top (int): Number of slowest prefixes reported.
+        """
+        self.output_dir = output_dir
+        self.top = top
+        self.stages = {}  # Stage name -> pstats.Stats
+        self._prefixes = []  # Min-heap of the slowest prefixes
+        self._count = 0
+
+    @contextmanager
+    def stage(self, name):
+        profile = cProfile.Profile()
+        try:
+            with profiled(profile):
+                yield
+        finally:
+            # Failed stages are reported too, as profile_update writes the profile of failed updates
+            self._add_stats(name, profile)
+
+    def _add_stats(self, name, profile):
+        with paused():
+            if name in self.stages:
+                self.stages[name].add(profile)
+            else:
+                self.stages[name] = pstats.Stats(profile)
+
+    def add_prefix(self, job, seconds, stats):
+        """
+        Record the render of one prefix job.
+
+        Args:
+            job (dict): The prefix job, from build_prefix_job.
+            seconds (float): Render time.
+            stats (StatsDump): Profile of the render, added to the render stage.
+        """
+        with paused():
+            self._add_prefix(job, seconds, stats)
+
+    def _add_prefix(self, job, seconds, stats):
+        if stats is not None:
+            self._add_stats('render', stats.copy())
+        entry = {
+            'prefix': job['prefix_entry'].get('prefix'),
+            'vrf': job['prefix_entry'].get('vrf'),
+            'seconds': seconds,
+            'ip_addresses': len(job['ip_addresses']),
+            'child_prefixes': len(job['child_prefixes']),
+            'stats': stats,
+        }
+        self._count += 1
+        item = (seconds, self._count, entry)  # The counter breaks ties without comparing entries
+        if len(self._prefixes) < self.top:
+            heapq.heappush(self._prefixes, item)
+        elif self.top:
+            heapq.heappushpop(self._prefixes, item)
+
+    def slowest_prefixes(self):
+        return [entry for _, _, entry in sorted(self._prefixes, key=lambda item: item[0], reverse=True)]
+
+    def report(self):
+        """Return the stage times, top functions per stage and the slowest prefixes as text."""
+        lines = ["Stages (own time, excluding nested stages):"]
+        stages = sorted(self.stages.items(), key=lambda item: item[1].total_tt, reverse=True)
+        for name, stats in stages:
+            lines.append(f"  {name:<16} {stats.total_tt:>10.3f}s")
+        for name, stats in stages:
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+            lines += ["", f"== {name} =="] + [line for line in stream.getvalue().splitlines() if line.strip()]
+        lines += ["", f"Slowest {len(self._prefixes)} of {self._count} prefixes:"]
+        lines.append(f"  {'seconds':>9} {'IPs':>8} {'children':>8}  prefix")
+        for entry in self.slowest_prefixes():
+            lines.append(
+                f"  {entry['seconds']:>9.3f} {entry['ip_addresses']:>8} {entry['child_prefixes']:>8}  "
+                f"{entry['prefix']} (VRF {entry['vrf']})"
+            )
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stacks = Counter()
+        for name, stats in self.stages.items():
+            stats.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            stacks.update(collapse_stats(stats.stats, root=name))
+        with open(os.path.join(self.output_dir, 'stages.collapsed'), 'w') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        for entry in self.slowest_prefixes():
+            if entry['stats'] is not None:
+                key = f"{entry['vrf']}-{entry['prefix']}".replace('/', '_')
+                pstats.Stats(entry['stats']).dump_stats(os.path.join(self.output_dir, f"prefix-{key}.prof"))
+        with open(os.path.join(self.output_dir, 'report.txt'), 'w') as f:
+            f.write(self.report())
+
+
+def get_profiler():
+    """Return the profiler of the running update, or None if it is not profiled."""
+    return _profiler
+
+
+@contextmanager
+def profile_update(output_dir, top=DEFAULT_TOP):
+    """
+    Profile the update running in the block, writing the results to output_dir when it ends,
+    also when it fails. Code outside named stages is profiled as the 'other' stage.
+    """
+    global _profiler
+    profiler = PipelineProfiler(output_dir, top)
+    _profiler = profiler
+    try:
+        with profiler.stage(OTHER_STAGE):
+            yield profiler
+    finally:
+        _profiler = None
+        try:
+            profiler.write()
+            logging.info(f"Profile written to {output_dir}")
+        except OSError as e:
+            logging.error(f"Failed to write profile to {output_dir}: {e}")
+
+
+@contextmanager
+def stage(name):
+    """Time an update stage for the metrics and, while profiling, profile it separately."""
+    with STAGE_SECONDS.time(stage=name):
+        if _profiler is None:
+            yield
+        else:
+            with _profiler.stage(name):
+                yield
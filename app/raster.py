@@ -0,0 +1,244 @@
+# app/raster.py
+
+"""
+Direct NumPy raster renderer.
+
+Paints the same layout as plot_allocation_grid straight into an RGB array and
+encodes it as PNG, without creating matplotlib Artist objects.
+"""
+
+import ipaddress
+import logging
+import struct
+import zlib
+
+import numpy as np
+
+from app.color_design import blend_colors, color_to_rgb, design_color_palette
+from app.morton import prefix_bounding_boxes
+from app.plot_map import (
+    calculate_grid_dimensions,
+    construct_prefix_label,
+    create_allocation_grid,
+    determine_ip_colors,
+    get_max_bits,
+    get_prefix_rectangles,
+    get_tenant_color,
+)
+
+POINTS_PER_INCH = 72
+DPI = 100
+
+# 3x5 bitmap glyphs for navigation labels (only digits are ever drawn)
+DIGIT_GLYPHS = {
+    '0': ("111", "101", "101", "101", "111"),
+    '1': ("010", "110", "010", "010", "111"),
+    '2': ("111", "001", "111", "100", "111"),
+    '3': ("111", "001", "111", "001", "111"),
+    '4': ("101", "101", "111", "001", "001"),
+    '5': ("111", "100", "111", "001", "111"),
+    '6': ("111", "100", "111", "101", "111"),
+    '7': ("111", "001", "001", "001", "001"),
+    '8': ("111", "101", "111", "101", "111"),
+    '9': ("111", "101", "111", "001", "111"),
+}
+GLYPH_WIDTH = 3
+GLYPH_HEIGHT = 5
+
+
+def encode_png(rgba):
+    """
+    Encode an (H, W, 4) uint8 array as a PNG image.
+
+    Args:
+        rgba (numpy.ndarray): The image data.
+
+    Returns:
+        bytes: PNG file contents.
+    """
+    height, width, _ = rgba.shape
+    # Prepend filter type 0 (None) to every scanline
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", header),
+        chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)),
+        chunk(b"IEND", b""),
+    ])
+
+
+def _blend(canvas, index, rgb, alpha):
+    """Alpha-blend a solid color over the canvas pixels selected by index."""
+    if alpha >= 1.0:
+        canvas[index] = rgb
+    elif alpha > 0:
+        canvas[index] = canvas[index] * (1.0 - alpha) + np.asarray(rgb, dtype=np.float32) * alpha
+
+
+def _dotted(start, stop, on, off):
+    """Return the pixel positions of a dotted segment between start (inclusive) and stop (exclusive)."""
+    positions = np.arange(start, stop)
+    return positions[(positions - start) % (on + off) < on]
+
+
+def paint_sparse_grid(canvas, cell_size, grid_width, grid_height, palette):
+    """
+    Paint a sparse 16x16 grid with low-contrast dotted lines.
+    """
+    image_height, image_width, _ = canvas.shape
+    rgb = color_to_rgb(palette['grid_lines'])
+    cols = _dotted(0, image_width, 2, 2)
+    rows = _dotted(0, image_height, 2, 2)
+    for i in range(0, grid_height + 1, 16):
+        canvas[min(i * cell_size, image_height - 1), cols] = rgb
+    for i in range(0, grid_width + 1, 16):
+        canvas[rows, min(i * cell_size, image_width - 1)] = rgb
+
+
+def _label_metrics(cell_size):
+    """Return (glyph scale, box padding) in pixels for a label font of cell_size * 2 points."""
+    font_px = cell_size * 2 * DPI / POINTS_PER_INCH
+    scale = max(1, round(font_px * 0.72 / GLYPH_HEIGHT))
+    pad = max(1, round(font_px * 0.3))
+    return scale, pad
+
+
+def _paint_text(canvas, text, center_x, center_y, scale, pad, rgb):
+    """Paint bitmap text centered at (center_x, center_y) on a translucent white box."""
+    glyphs = [DIGIT_GLYPHS[c] for c in text if c in DIGIT_GLYPHS]
+    if not glyphs:
+        return
+    image_height, image_width, _ = canvas.shape
+    text_width = (len(glyphs) * (GLYPH_WIDTH + 1) - 1) * scale
+    text_height = GLYPH_HEIGHT * scale
+    left = int(round(center_x - text_width / 2))
+    top = int(round(center_y - text_height / 2))
+
+    box = (
+        slice(max(0, top - pad), min(image_height, top + text_height + pad)),
+        slice(max(0, left - pad), min(image_width, left + text_width + pad)),
+    )
+    _blend(canvas, box, (255, 255, 255), 0.3)
+
+    bitmap = np.zeros((GLYPH_HEIGHT, len(glyphs) * (GLYPH_WIDTH + 1)), dtype=bool)
+    for i, glyph in enumerate(glyphs):
+        for row, bits in enumerate(glyph):
+            for col, bit in enumerate(bits):
+                bitmap[row, i * (GLYPH_WIDTH + 1) + col] = bit == "1"
+    bitmap = np.kron(bitmap[:, :-1], np.ones((scale, scale), dtype=bool))
+    rows, cols = np.nonzero(bitmap)
+    rows += top
+    cols += left
+    inside = (rows >= 0) & (rows < image_height) & (cols >= 0) & (cols < image_width)
+    canvas[rows[inside], cols[inside]] = rgb
+
+
+def paint_navigation_labels(canvas, top_level_prefix, cell_size, grid_width, grid_height, palette):
+    """
+    Paint navigation labels for /24 prefixes on the grid.
+    """
+    top_network = ipaddress.ip_network(top_level_prefix)
+    if top_network.prefixlen > 24:
+        return
+
+    max_bits = get_max_bits(grid_width, grid_height)
+    subnets = list(top_network.subnets(new_prefix=24))
+    top_start = int(top_network.network_address)
+    offset_starts = np.array([int(subnet.network_address) - top_start for subnet in subnets], dtype=np.int64)
+    offset_ends = np.array([int(subnet.broadcast_address) - top_start for subnet in subnets], dtype=np.int64)
+    x1s, y1s, x2s, y2s = prefix_bounding_boxes(offset_starts, offset_ends, max_bits)
+
+    rgb = color_to_rgb(palette.get('grid_text', '#cccccc'))
+    scale, pad = _label_metrics(cell_size)
+    for subnet, x1, y1, x2, y2 in zip(subnets, x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist()):
+        label = construct_prefix_label(subnet)
+        _paint_text(canvas, label, (x1 + x2) * cell_size / 2, (y1 + y2) * cell_size / 2, scale, pad, rgb)
+
+
+def paint_prefix_rectangles(canvas, rectangles, cell_size, tenant_color_map):
+    """
+    Paint low-contrast prefix rectangles based on tenant, shorter prefixes first.
+    """
+    image_height, image_width, _ = canvas.shape
+    edge = (0, 0, 0)
+    ordered = sorted(rectangles, key=lambda r: int(r['prefix'].split('/')[1]))
+    for rect_info in ordered:
+        left = rect_info['x1'] * cell_size
+        top = rect_info['y1'] * cell_size
+        right = min((rect_info['x2'] + 1) * cell_size, image_width)
+        bottom = min((rect_info['y2'] + 1) * cell_size, image_height)
+        color = blend_colors(get_tenant_color(rect_info['tenant'], tenant_color_map), "#FFFFFF", 0.5)
+        fill = color_to_rgb(color)
+        if fill is not None:
+            canvas[top:bottom, left:right] = fill
+
+        # Dotted outline
+        cols = _dotted(left, right, 1, 1)
+        rows = _dotted(top, bottom, 1, 1)
+        canvas[top, cols] = edge
+        canvas[bottom - 1, cols] = edge
+        canvas[rows, left] = edge
+        canvas[rows, right - 1] = edge
+
+
+def paint_allocated_ips(canvas, ip_cells, cell_size, palette):
+    """
+    Paint allocated IP addresses, one inset square per cell.
+    """
+    if cell_size < 2 or not len(ip_cells['ips']):
+        return
+
+    codes, styles = determine_ip_colors(ip_cells['ips'], palette)
+    inset = np.arange(1, cell_size)
+    for code, (color, alpha) in enumerate(styles):
+        if color == 'none':  # Only paint if not transparent
+            continue
+        selected = codes == code
+        rows = ip_cells['y'][selected, None] * cell_size + inset
+        cols = ip_cells['x'][selected, None] * cell_size + inset
+        index = (rows[:, :, None], cols[:, None, :])
+        _blend(canvas, index, color_to_rgb(color), alpha)
+
+
+def render_allocation_grid(top_level_prefix_entry, child_prefixes, ip_table, output_file, cell_size,
+                           tenant_color_map):
+    """Rasterize the allocation grid directly with NumPy and save it as a PNG."""
+    top_level_prefix = top_level_prefix_entry.get("prefix", "").strip()
+    logging.info(top_level_prefix)
+
+    grid, ip_cells = create_allocation_grid(top_level_prefix, ip_table)
+    grid_width, grid_height = calculate_grid_dimensions(top_level_prefix)
+    max_bits = get_max_bits(grid_width, grid_height)
+    rectangles = get_prefix_rectangles(top_level_prefix, child_prefixes, max_bits)
+
+    palette = design_color_palette()
+
+    image_width = grid_width * cell_size
+    image_height = grid_height * cell_size
+    canvas = np.empty((image_height, image_width, 3), dtype=np.float32)
+    canvas[:] = color_to_rgb(palette['background'])
+
+    # Same stacking order as the matplotlib backend: grid, prefixes, labels, IP cells
+    paint_sparse_grid(canvas, cell_size, grid_width, grid_height, palette)
+    paint_prefix_rectangles(canvas, rectangles, cell_size, tenant_color_map)
+    paint_navigation_labels(canvas, top_level_prefix, cell_size, grid_width, grid_height, palette)
+    paint_allocated_ips(canvas, ip_cells, cell_size, palette)
+
+    rgba = np.empty((image_height, image_width, 4), dtype=np.uint8)
+    rgba[:, :, :3] = np.clip(np.rint(canvas), 0, 255)
+    rgba[:, :, 3] = 255
+
+    with open(output_file, 'wb') as f:
+        f.write(encode_png(rgba))
+    logging.debug(f"Prefix map {top_level_prefix} saved to {output_file}")
@@ -0,0 +1,194 @@
+# app/snapshot_store.py
+
+import ipaddress
+import json
+import logging
+import sqlite3
+
+SNAPSHOT_FILENAME = 'netbox.sqlite3'
+
+# Bump when the table layout changes; older stores are rebuilt
+SCHEMA_VERSION = 1
+
+DATASETS = ('prefixes', 'ip_addresses', 'tenants', 'vrfs')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prefixes (
+    id INTEGER PRIMARY KEY,
+    vrf INTEGER,
+    family INTEGER,
+    start INTEGER,
+    end INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prefixes_range ON prefixes (vrf, start, end);
+CREATE TABLE IF NOT EXISTS ip_addresses (
+    id INTEGER PRIMARY KEY,
+    vrf INTEGER,
+    family INTEGER,
+    address INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ip_addresses_address ON ip_addresses (vrf, address);
+CREATE TABLE IF NOT EXISTS tenants (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vrfs (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _object_id(value):
+    """Return the ID of a nested NetBox object, which may be a dict, a bare ID or None."""
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+def _network_range(value, strict):
+    """
+    Return (family, first, last) integer addresses of a prefix or address.
+    Only IPv4 ranges are indexed, since SQLite integers cannot hold IPv6 addresses.
+    """
+    try:
+        if strict:
+            network = ipaddress.ip_network(value, strict=False)
+        else:
+            network = ipaddress.ip_network(str(value).split('/')[0])
+    except ValueError:
+        logging.warning(f"Cannot index invalid address '{value}'")
+        return None, None, None
+    if network.version != 4:
+        return network.version, None, None
+    return 4, int(network.network_address), int(network.broadcast_address)
+
+
+def _row(name, item):
+    """Build the table row for a serialized NetBox record."""
+    data = json.dumps(item)
+    if name == 'prefixes':
+        family, start, end = _network_range(item.get('prefix'), strict=True)
+        return (item['id'], _object_id(item.get('vrf')), family, start, end, data)
+    if name == 'ip_addresses':
+        family, address, _ = _network_range(item.get('address'), strict=False)
+        return (item['id'], _object_id(item.get('vrf')), family, address, data)
+    return (item['id'], data)
+
+
+class SnapshotStore:
+    def __init__(self, path, readonly=False):
+        """
+        Local SQLite copy of the NetBox prefixes, IP addresses, tenants and VRFs.
+
+        Records are kept as serialized JSON, with the VRF and integer address range
+        extracted into indexed columns for range queries.
+
+        Args:
+            path (str): Database file, or ':memory:'.
+            readonly (bool): Open an existing database for queries only, without taking write locks.
+        """
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            return
+        self.conn = sqlite3.connect(path)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            logging.info("Snapshot store schema changed; rebuilding")
+            for name in DATASETS + ('meta',):
+                self.conn.execute(f"DROP TABLE IF EXISTS {name}")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """Commit on success, roll back on error."""
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+
+    def upsert(self, name, records):
+        """Insert or replace serialized records in a dataset."""
+        rows = [_row(name, item) for item in records]
+        if rows:
+            placeholders = ', '.join('?' * len(rows[0]))
+            self.conn.executemany(f"INSERT OR REPLACE INTO {name} VALUES ({placeholders})", rows)
+
+    def replace(self, name, records):
+        """Replace the whole dataset."""
+        self.conn.execute(f"DELETE FROM {name}")
+        self.upsert(name, records)
+
+    def delete(self, name, ids):
+        """Delete records by ID."""
+        self.conn.executemany(f"DELETE FROM {name} WHERE id = ?", [(object_id,) for object_id in ids])
+
+    def ids(self, name):
+        """Return the set of record IDs in a dataset."""
+        return {row[0] for row in self.conn.execute(f"SELECT id FROM {name}")}
+
+    def count(self, name):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+    def iter_records(self, name):
+        """Yield the records of a dataset one at a time, in ID order."""
+        for row in self.conn.execute(f"SELECT data FROM {name} ORDER BY id"):
+            yield json.loads(row[0])
+
+    def load(self, name):
+        """Return all records of a dataset, in ID order."""
+        return list(self.iter_records(name))
+
+    def load_all(self):
+        """Return all datasets as {name: list of records}."""
+        return {name: self.load(name) for name in DATASETS}
+
+    def prefixes_within(self, prefix, vrf=None):
+        """
+        Return the IPv4 prefixes of a VRF inside the given prefix, including itself.
+        vrf None selects the Global VRF.
+        """
+        _, start, end = _network_range(prefix, strict=True)
+        if start is None:
+            return []
+        rows = self.conn.execute(
+            "SELECT data FROM prefixes WHERE vrf IS ? AND start >= ? AND start <= ? AND end <= ? "
+            "ORDER BY start, end DESC",
+            (vrf, start, end, end),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def ip_addresses_within(self, prefix, vrf=None):
+        """
+        Return the IPv4 addresses of a VRF inside the given prefix, sorted by address.
+        vrf None selects the Global VRF.
+        """
+        _, start, end = _network_range(prefix, strict=True)
+        if start is None:
+            return []
+        rows = self.conn.execute(
+            "SELECT data FROM ip_addresses WHERE vrf IS ? AND address BETWEEN ? AND ? ORDER BY address, id",
+            (vrf, start, end),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
@@ -2,58 +2,210 @@ import threading
 import time
 import logging
 
+from app.invalidation import merge_scopes
+
+# Seconds after the last webhook before an update starts
+DEFAULT_DEBOUNCE_INTERVAL = 60
+
+# Seconds after the first pending webhook by which an update starts, even while webhooks keep arriving
+DEFAULT_MAX_WAIT = 300
+
+
+class UpdateCancelled(Exception):
+    """Raised at a stage boundary when a running update is preempted by newer webhooks."""
+
+
+def check_cancelled(cancel, stage):
+    """
+    Stop an update at a stage boundary if it was preempted.
+
+    Args:
+        cancel (threading.Event): Set by the scheduler to preempt the update, or None.
+        stage (str): Name of the stage about to start, for logging.
+
+    Raises:
+        UpdateCancelled: If cancel is set.
+    """
+    if cancel is not None and cancel.is_set():
+        raise UpdateCancelled(f"Update preempted before {stage}")
+
+
 class UpdaterManager:
-    def __init__(self, updater_function, debounce_interval=60):
+    def __init__(self, updater_function, debounce_interval=DEFAULT_DEBOUNCE_INTERVAL,
+                 scoped_updater_function=None, max_wait=DEFAULT_MAX_WAIT):
+        """
+        Run updates on webhooks from a single scheduler thread.
+
+        Webhooks are debounced: an update starts debounce_interval seconds after the last
+        webhook, but no later than max_wait seconds after the first pending one. Work queued
+        until then is coalesced into one update. Webhooks received while an update runs preempt
+        it: the update stops at its next stage boundary and its work is queued again with the
+        new webhooks. An update whose work has waited longer than max_wait is not preempted,
+        so a steady stream of webhooks cannot starve it.
+
+        Args:
+            updater_function (callable): Full update, called with a cancel keyword argument.
+            debounce_interval (float): Quiet period in seconds before an update starts.
+            scoped_updater_function (callable): Called with a {vrf: set of prefixes} scope and a cancel
+                keyword argument; returns False to request a full update instead.
+            max_wait (float): Upper bound in seconds on the delay of a pending webhook.
+        """
         self.updater_function = updater_function
+        self.scoped_updater_function = scoped_updater_function
         self.debounce_interval = debounce_interval
-        self.last_run_time = 0  # Time when the updater last ran
-        self.next_run_time = float('inf')  # Next scheduled run time
-        self.last_webhook_time = 0  # Time of the last webhook received
+        self.max_wait = max_wait
+        self.pending_full = False  # A pending webhook could not be scoped
+        self.pending_scope = {}  # Prefixes affected by pending webhooks
+        self.pending_events = 0  # Webhooks received since the last update started
+        self.first_event_time = None  # Time of the oldest pending webhook
+        self.last_event_time = None  # Time of the newest pending webhook
         self.updater_running = False
+        self.last_run = None  # Stats of the last finished update
+        self.last_success = None  # Stats of the last successful update
+        self.runs = 0
+        self.preemptions = 0
+        self._cancel = None  # Event preempting the running update
+        self._running_since = None  # first_event_time of the work being run
+        self._stopped = False
         self.lock = threading.Lock()
+        self._wakeup = threading.Condition(self.lock)
         self.updater_thread = threading.Thread(target=self._updater_loop)
         self.updater_thread.daemon = True
         self.updater_thread.start()
 
-    def webhook_received(self):
+    def webhook_received(self, scope=None):
+        """
+        Schedule an update. Scopes of webhooks received before the update starts are merged;
+        a webhook without a scope (None) schedules a full update.
+        """
         now = time.time()
         with self.lock:
-            self.last_webhook_time = now
-            # If the next run time is in the past or infinite, set it to now
-            if self.next_run_time <= now or self.next_run_time == float('inf'):
-                self.next_run_time = now
+            if scope is None or self.scoped_updater_function is None:
+                self.pending_full = True
+            else:
+                merge_scopes(self.pending_scope, scope)
+            self.pending_events += 1
+            if self.first_event_time is None:
+                self.first_event_time = now
+            self.last_event_time = now
+            if self.updater_running and not self._cancel.is_set() and now - self._running_since < self.max_wait:
+                logging.info("Webhook received during update; preempting it.")
+                self._cancel.set()
+                self.preemptions += 1
+            self._wakeup.notify()
         logging.info("Webhook received.")
 
+    def stats(self):
+        """
+        Return the scheduler state: queue depth, whether an update is running, and the last run.
+        """
+        with self.lock:
+            return {
+                'pending_events': self.pending_events,
+                'pending_full': self.pending_full,
+                'pending_prefixes': sum(len(prefixes) for prefixes in self.pending_scope.values()),
+                'next_run_time': self._next_run_time(),
+                'running': self.updater_running,
+                'runs': self.runs,
+                'preemptions': self.preemptions,
+                'last_run': dict(self.last_run) if self.last_run else None,
+                'last_success': dict(self.last_success) if self.last_success else None,
+            }
+
+    def stop(self):
+        """Stop the scheduler thread after the running update, if any."""
+        with self.lock:
+            self._stopped = True
+            if self._cancel is not None:
+                self._cancel.set()
+            self._wakeup.notify()
+        self.updater_thread.join()
+
+    def _next_run_time(self):
+        if self.first_event_time is None:
+            return None
+        return min(self.last_event_time + self.debounce_interval, self.first_event_time + self.max_wait)
+
     def _updater_loop(self):
         while True:
-            now = time.time()
             with self.lock:
-                # Only run updater if a webhook has been received since the last run
-                if (not self.updater_running and 
-                    self.last_webhook_time > self.last_run_time and 
-                    self.next_run_time <= now):
-                    self.updater_running = True
-                    threading.Thread(target=self._run_updater).start()
-            time.sleep(1)  # Sleep to prevent busy waiting
-
-    def _run_updater(self):
+                while True:
+                    if self._stopped:
+                        return
+                    next_run_time = self._next_run_time()
+                    if next_run_time is None:
+                        self._wakeup.wait()
+                        continue
+                    delay = next_run_time - time.time()
+                    if delay <= 0:
+                        break
+                    self._wakeup.wait(delay)
+                work = (self.pending_full, self.pending_scope, self.pending_events, self.first_event_time)
+                self.pending_full = False
+                self.pending_scope = {}
+                self.pending_events = 0
+                self.first_event_time = None
+                self.last_event_time = None
+                self.updater_running = True
+                self._running_since = work[3]
+                self._cancel = threading.Event()
+                cancel = self._cancel
+            self._run_updater(work, cancel)
+
+    def _run_updater(self, work, cancel):
+        run_full, scope, events, first_event_time = work
         start_time = time.time()
+        result = 'failed'
         try:
-            logging.info("Starting updater...")
-            self.updater_function()
+            if run_full:
+                logging.info(f"Starting updater for {events} webhooks...")
+                result = 'ok' if self.updater_function(cancel=cancel) else 'failed'
+            elif scope:
+                logging.info(f"Starting scoped updater for {events} webhooks...")
+                if self.scoped_updater_function(scope, cancel=cancel) is False:
+                    logging.warning("Scoped update failed; falling back to full update.")
+                    check_cancelled(cancel, "full update")
+                    run_full = True
+                    result = 'ok' if self.updater_function(cancel=cancel) else 'failed'
+                else:
+                    result = 'ok'
             logging.info("Updater finished.")
+        except UpdateCancelled as e:
+            result = 'preempted'
+            logging.info(f"{e}; requeueing its work.")
         except Exception as e:
             logging.error(f"Updater encountered an error: {e}")
         finally:
             end_time = time.time()
             with self.lock:
-                self.last_run_time = end_time
+                if result == 'preempted':
+                    # Merge the unfinished work back; it keeps its place in the max-wait window
+                    if run_full or self.scoped_updater_function is None:
+                        self.pending_full = True
+                    else:
+                        merge_scopes(self.pending_scope, scope)
+                    self.pending_events += events
+                    if self.first_event_time is None:
+                        self.first_event_time = first_event_time
+                        self.last_event_time = end_time
+                    else:
+                        self.first_event_time = min(self.first_event_time, first_event_time)
                 self.updater_running = False
-                # Check if new webhooks have been received during the updater run
-                if self.last_webhook_time > start_time:
-                    self.next_run_time = end_time  # Schedule the updater to run immediately
+                self._cancel = None
+                self._running_since = None
+                self.runs += 1
+                self.last_run = {
+                    'kind': 'full' if run_full else 'scoped',
+                    'result': result,
+                    'events': events,
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'duration': end_time - start_time,
+                    'queue_delay': start_time - first_event_time,
+                }
+                if result == 'ok':
+                    self.last_success = self.last_run
+                if self.first_event_time is not None:
                     logging.info("New webhook received during update; scheduling next run.")
                 else:
-                    # No new webhooks; set next_run_time to infinity
-                    self.next_run_time = float('inf')
                     logging.info("No recent webhooks; updater will remain idle.")
@@ -0,0 +1,275 @@
+# app/updater_worker.py
+
+import atexit
+from contextlib import contextmanager
+import fcntl
+import logging
+from multiprocessing.connection import Client, Listener
+import os
+import subprocess
+import threading
+import time
+
+from app.generations import current_generation
+from app.updater_manager import DEFAULT_DEBOUNCE_INTERVAL, DEFAULT_MAX_WAIT, UpdaterManager
+
+SOCKET_FILENAME = 'updater.sock'
+
+# Seconds to wait for a spawned worker to accept connections
+SPAWN_TIMEOUT = 30
+
+# Seconds between attempts to resubscribe to a worker that went away
+RECONNECT_INTERVAL = 5
+
+# Stats reported by RemoteUpdater while no worker is running
+NOT_RUNNING_STATS = {'worker': 'not running', 'running': False}
+
+
+def get_socket_path(output_dir):
+    return os.path.join(output_dir, SOCKET_FILENAME)
+
+
+def _is_listening(address):
+    try:
+        Client(address, family='AF_UNIX').close()
+        return True
+    except OSError:
+        return False
+
+
+class UpdaterWorker:
+    def __init__(self, address, output_dir, updater_function, scoped_updater_function=None,
+                 debounce_interval=DEFAULT_DEBOUNCE_INTERVAL, max_wait=DEFAULT_MAX_WAIT):
+        """
+        Run updates in a process of their own, scheduled by an UpdaterManager, on requests
+        received over a Unix socket. Subscribed clients are notified of every published generation.
+
+        Requests are dictionaries with a 'type':
+            webhook: Schedule an update of the 'scope' ({vrf: set of prefixes}, or None for a full update).
+            stats: Return the scheduler stats.
+            subscribe: Keep the connection open and send {'event': 'published', 'generation': ...} messages.
+
+        Args:
+            address (str): Socket path.
+            output_dir (str): Output directory whose published generation is watched.
+            updater_function (callable): Full update, see UpdaterManager.
+            scoped_updater_function (callable): Scoped update, see UpdaterManager.
+            debounce_interval (float): See UpdaterManager.
+            max_wait (float): See UpdaterManager.
+        """
+        self.address = address
+        self.output_dir = output_dir
+        self.generation = current_generation(output_dir)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stopped = False
+        self.manager = UpdaterManager(
+            self._watch_publish(updater_function),
+            debounce_interval,
+            self._watch_publish(scoped_updater_function) if scoped_updater_function else None,
+            max_wait,
+        )
+
+    def _watch_publish(self, fn):
+        def run(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._check_published()
+        return run
+
+    def _check_published(self):
+        generation = current_generation(self.output_dir)
+        if generation == self.generation:
+            return
+        self.generation = generation
+        message = {'event': 'published', 'generation': generation}
+        with self._lock:
+            for conn in list(self._subscribers):
+                try:
+                    conn.send(message)
+                except OSError:
+                    self._subscribers.remove(conn)
+                    conn.close()
+        logging.debug(f"Notified {len(self._subscribers)} subscribers of generation {generation}")
+
+    def _handle(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                kind = message.get('type')
+                if kind == 'webhook':
+                    self.manager.webhook_received(message.get('scope'))
+                    conn.send({'status': 'ok'})
+                elif kind == 'stats':
+                    conn.send(self.manager.stats())
+                elif kind == 'subscribe':
+                    with self._lock:
+                        conn.send({'status': 'ok', 'generation': self.generation})
+                        self._subscribers.append(conn)
+                    return
+                else:
+                    conn.send({'status': 'error', 'message': f"Unknown request type: {kind}"})
+        except (EOFError, OSError):
+            conn.close()
+
+    def serve_forever(self):
+        """Accept requests until stop is called."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        if os.path.exists(self.address):
+            if _is_listening(self.address):
+                raise RuntimeError(f"Another updater worker is listening on {self.address}")
+            os.remove(self.address)  # Left behind by a worker that was killed
+        # Only the owner may connect, as requests are unpickled
+        umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, family='AF_UNIX')
+        finally:
+            os.umask(umask)
+        logging.info(f"Updater worker listening on {self.address}")
+        try:
+            while not self._stopped:
+                try:
+                    conn = self._listener.accept()
+                except OSError as e:
+                    if self._stopped:
+                        break
+                    logging.error(f"Updater worker failed to accept a connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            self.manager.stop()
+
+    def stop(self):
+        """Stop serving after the running update stops at its next stage."""
+        self._stopped = True
+        # Wake up the blocking accept
+        _is_listening(self.address)
+
+
+class RemoteUpdater:
+    def __init__(self, address, spawn_command=None, on_published=None):
+        """
+        Client of an UpdaterWorker, with the webhook_received and stats methods of UpdaterManager.
+
+        Args:
+            address (str): Socket path of the worker.
+            spawn_command (list): Command starting the worker when it is not running, or None
+                                  if it is started separately (e.g., as a service).
+            on_published (callable): Called with the generation ID whenever the worker publishes one.
+        """
+        self.address = address
+        self.spawn_command = spawn_command
+        self.on_published = on_published
+        self._conn = None
+        self._process = None
+        self._subscriber = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @contextmanager
+    def _spawn_lock(self):
+        """
+        Hold an exclusive lock on a file next to the socket, so that of several web processes
+        finding no worker, only one starts it and the others connect to it.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        with open(f"{self.address}.lock", 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _spawn(self):
+        if self._process is None or self._process.poll() is not None:
+            logging.info(f"Starting updater worker: {' '.join(self.spawn_command)}")
+            self._process = subprocess.Popen(self.spawn_command)
+
+    def _connect(self, spawn=True):
+        try:
+            return Client(self.address, family='AF_UNIX')
+        except OSError:
+            if self.spawn_command is None or not spawn:
+                raise
+        with self._spawn_lock():
+            # Another web process may have started the worker while this one waited for the lock
+            try:
+                return Client(self.address, family='AF_UNIX')
+            except OSError:
+                pass
+            self._spawn()
+            deadline = time.time() + SPAWN_TIMEOUT
+            while True:
+                try:
+                    return Client(self.address, family='AF_UNIX')
+                except OSError:
+                    if time.time() > deadline or self._process.poll() is not None:
+                        raise RuntimeError("Updater worker did not start")
+                    time.sleep(0.1)
+
+    def _request(self, message, spawn=True):
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = self._connect(spawn)
+                    self._start_subscriber()
+                try:
+                    self._conn.send(message)
+                    return self._conn.recv()
+                except (EOFError, OSError):
+                    # The worker restarted; retry once on a new connection
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+
+    def _start_subscriber(self):
+        if self.on_published is None or self._subscriber is not None:
+            return
+        self._subscriber = threading.Thread(target=self._subscribe, daemon=True)
+        self._subscriber.start()
+
+    def _subscribe(self):
+        while True:
+            try:
+                conn = Client(self.address, family='AF_UNIX')
+                try:
+                    conn.send({'type': 'subscribe'})
+                    conn.recv()
+                    while True:
+                        message = conn.recv()
+                        if message.get('event') == 'published':
+                            self.on_published(message['generation'])
+                finally:
+                    conn.close()
+            except (EOFError, OSError) as e:
+                logging.debug(f"Updater worker subscription lost: {e}")
+            time.sleep(RECONNECT_INTERVAL)
+
+    def webhook_received(self, scope=None):
+        """Schedule an update in the worker, see UpdaterManager.webhook_received."""
+        self._request({'type': 'webhook', 'scope': scope})
+
+    def stats(self):
+        """
+        Return the scheduler stats of the worker. A worker that this client would spawn is not
+        started for it: while none is running, NOT_RUNNING_STATS is returned instead.
+        """
+        try:
+            return self._request({'type': 'stats'}, spawn=False)
+        except OSError:
+            if self.spawn_command is None:
+                raise
+            return dict(NOT_RUNNING_STATS)
+
+    def close(self):
+        """Close the connection and stop the worker if it was spawned by this client."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
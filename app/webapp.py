@@ -1,16 +1,32 @@
 # app/webapp.py
 
 import json
-from threading import Thread
-from flask import Flask, Blueprint, redirect, request, jsonify, send_from_directory, render_template, url_for
+from threading import Lock, Thread
+from flask import (
+    Flask, Blueprint, Response, redirect, request, jsonify, send_file, send_from_directory, render_template,
+    g, stream_template, stream_with_context, url_for,
+)
 from dotenv import load_dotenv
 import logging
 import subprocess
 import os
-
-from app.cli import full_update
+import sys
+import time
+from werkzeug.wsgi import wrap_file
+
+from app.data_store import FORMATS, find_precompressed, read_payload
+from app.generations import get_current_dir, get_generation_dir
+from app.invalidation import build_prefix_tree_from_saved, scope_webhook
+from app.lazy_render import DEFAULT_CACHE_SIZE, RENDER_CACHE_DIR, LazyRenderer
+from app.log_tail import LEVELS, tail_log
 from app.logging_config import setup_logging
-from app.updater_manager import UpdaterManager
+from app.metrics import (
+    CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, UPDATER_LAST_DURATION, UPDATER_LAST_SUCCESS, UPDATER_QUEUED,
+    UPDATER_RUNNING, UPDATER_UP,
+)
+from app.snapshot_store import SNAPSHOT_FILENAME
+from app.updater_manager import DEFAULT_DEBOUNCE_INTERVAL, DEFAULT_MAX_WAIT, UpdaterManager
+from app.updater_worker import RemoteUpdater, get_socket_path
 
 load_dotenv()
 setup_logging()
@@ -22,6 +38,27 @@ OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', OUTPUT_DIR)
 
 NETBOX_URL = os.getenv('NETBOX_API_URL')
 
+LOG_FILE = os.getenv('LOG_FILE', 'ip_allocation.log')
+
+# Lines per page of /errors
+LOG_PAGE_SIZE = 200
+LOG_MAX_PAGE_SIZE = 2000
+
+# Generation-stamped URLs never change content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# In lazy render mode, images missing from the output are rendered on first request
+RENDER_MODE = os.getenv('RENDER_MODE', 'eager')
+lazy_renderer = None
+if RENDER_MODE == 'lazy':
+    lazy_renderer = LazyRenderer(
+        os.getenv('SNAPSHOT_DB', os.path.join(OUTPUT_DIR, SNAPSHOT_FILENAME)),
+        os.path.join(OUTPUT_DIR, RENDER_CACHE_DIR),
+        int(os.getenv('CELL_SIZE', 4)),
+        os.getenv('RENDERER'),
+        int(os.getenv('RENDER_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+    )
+
 # Initialize Flask app
 app = Flask(
     __name__,
@@ -32,7 +69,44 @@ app = Flask(
 
 bp = Blueprint('app', __name__, url_prefix=BASE_PATH)
 
-updater_manager = UpdaterManager(full_update, debounce_interval=60)
+# thread: update inside the web process; process: in a worker process started on the first webhook;
+# daemon: in a worker started separately with 'python -m app.cli --daemon'
+UPDATER_MODE = os.getenv('UPDATER_MODE', 'process')
+UPDATER_SOCKET = os.getenv('UPDATER_SOCKET', get_socket_path(os.path.abspath(OUTPUT_DIR)))
+
+# Metrics of the updater worker, appended to /metrics
+UPDATER_METRICS_FILE = os.getenv('METRICS_TEXTFILE', os.path.join(os.path.abspath(OUTPUT_DIR), 'updater.prom'))
+
+
+def run_full_update(cancel=None):
+    # app.cli pulls in the rendering and NetBox stack; import it on the first update, not on startup
+    from app.cli import full_update
+    return full_update(cancel=cancel)
+
+
+def run_scoped_update(scope, cancel=None):
+    from app.cli import update_prefixes
+    return update_prefixes(scope, cancel=cancel)
+
+
+if UPDATER_MODE == 'thread':
+    updater_manager = UpdaterManager(
+        run_full_update,
+        debounce_interval=float(os.getenv('UPDATE_DEBOUNCE', DEFAULT_DEBOUNCE_INTERVAL)),
+        scoped_updater_function=run_scoped_update,
+        max_wait=float(os.getenv('UPDATE_MAX_WAIT', DEFAULT_MAX_WAIT)),
+    )
+else:
+    spawn_command = None
+    if UPDATER_MODE == 'process':
+        # The CLI defaults to another cell size than the web app
+        spawn_command = [
+            sys.executable, '-m', 'app.cli', '--daemon', '--socket', UPDATER_SOCKET,
+            '--cell_size', os.getenv('CELL_SIZE', '4'), '--metrics-file', UPDATER_METRICS_FILE,
+        ]
+    updater_manager = RemoteUpdater(
+        UPDATER_SOCKET, spawn_command, on_published=lambda generation: metadata_cache.invalidate(),
+    )
 
 
 def sanitize_name(name):
@@ -55,6 +129,27 @@ def reconstruct_prefix(sanitized_prefix):
         return sanitized_prefix.replace('_', '.')
 
 
+def render_missing_image(filename):
+    """
+    Render an image missing from the output in lazy render mode.
+
+    Args:
+        filename (str): Image file name, 'address_map-<vrf>-<prefix>.png'.
+
+    Returns:
+        str or None: Path of the rendered image, or None if the prefix is unknown.
+    """
+    if lazy_renderer is None or not filename.startswith('address_map-') or not filename.endswith('.png'):
+        return None
+    vrf_key, _, sanitized_prefix = filename[len('address_map-'):-len('.png')].partition('-')
+    metadata = metadata_cache.get()
+    prefix_entry = metadata.get_prefix(vrf_key, sanitized_prefix)
+    if prefix_entry is None:
+        return None
+    vrf = None if vrf_key == 'None' else int(vrf_key)
+    return lazy_renderer.render(prefix_entry['prefix'], vrf, metadata.data_dir)
+
+
 def get_netbox_url():
     if NETBOX_URL:
         return NETBOX_URL.rstrip('/')
@@ -62,24 +157,107 @@ def get_netbox_url():
         return request.host_url.rstrip('/')
 
 
+def get_data_dir():
+    """
+    Return the directory of the published output generation.
+    Resolve it once per request, so all files of a response come from the same generation.
+    """
+    return get_current_dir(OUTPUT_DIR)
+
+
+class Metadata:
+    def __init__(self, data_dir, vrfs, prefix_tree):
+        """
+        Parsed vrf.json and prefix_tree.json of one output generation, indexed for lookups.
+        Shared between requests and must not be modified.
+
+        Args:
+            data_dir (str): The generation directory the files were read from.
+            vrfs (list): VRF dictionaries.
+            prefix_tree (dict): Prefix lists keyed by VRF ID string ('None' for Global).
+        """
+        self.data_dir = data_dir
+        self.vrfs = vrfs
+        self.prefix_tree = prefix_tree
+        self.vrfs_by_id = {str(vrf['id']): vrf for vrf in vrfs}
+        self.prefixes_by_name = {
+            vrf_key: {entry['sanitized']: entry for entry in vrf_data.get('prefixes', [])}
+            for vrf_key, vrf_data in prefix_tree.items()
+        }
+        self._scope_tree = None
+        self._lock = Lock()
+
+    def get_vrf(self, vrf):
+        """Return the VRF dictionary for a VRF ID string, or None."""
+        return self.vrfs_by_id.get(vrf)
+
+    def get_prefixes(self, vrf):
+        """Return the prefix list of a VRF ID string."""
+        return self.prefix_tree.get(vrf, {}).get('prefixes', [])
+
+    def get_prefix(self, vrf, sanitized_prefix):
+        """Return the prefix entry for a VRF ID string and sanitized prefix, or None."""
+        return self.prefixes_by_name.get(vrf, {}).get(sanitized_prefix)
+
+    def get_scope_tree(self):
+        """Return the (PrefixTree, tenant counts) used to scope webhooks, built on first use."""
+        with self._lock:
+            if self._scope_tree is None and self.prefix_tree:
+                self._scope_tree = build_prefix_tree_from_saved(self.prefix_tree)
+            return self._scope_tree
+
+
+class MetadataCache:
+    def __init__(self, output_dir):
+        """
+        Keep the parsed metadata of the published output generation in memory.
+
+        Every lookup checks the current generation and the file modification times,
+        which costs a few stat calls, and reloads the files only when they changed.
+
+        Args:
+            output_dir (str): Output directory.
+        """
+        self.output_dir = output_dir
+        self._key = None
+        self._metadata = None
+        self._lock = Lock()
+
+    def _load_json(self, path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def get(self):
+        """
+        Return the Metadata of the published generation.
+        """
+        data_dir = get_current_dir(self.output_dir)
+        paths = [os.path.join(data_dir, 'vrf.json'), os.path.join(data_dir, 'prefix_tree.json')]
+        key = (data_dir,) + tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in paths)
+        with self._lock:
+            if key != self._key:
+                self._metadata = Metadata(data_dir, self._load_json(paths[0], []), self._load_json(paths[1], {}))
+                self._key = key
+                logging.debug(f"Loaded metadata of {len(self._metadata.vrfs)} VRFs from {data_dir}")
+            return self._metadata
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        with self._lock:
+            self._key = None
+
+
+metadata_cache = MetadataCache(OUTPUT_DIR)
+
+
 def load_vrf_data():
-    vrf_filepath = os.path.join(OUTPUT_DIR, 'vrf.json')
-    if os.path.exists(vrf_filepath):
-        with open(vrf_filepath, 'r') as f:
-            vrfs = json.load(f)
-        return vrfs
-    else:
-        return []
+    return metadata_cache.get().vrfs
 
 
 def load_prefix_tree():
-    prefix_tree_filepath = os.path.join(OUTPUT_DIR, 'prefix_tree.json')
-    if os.path.exists(prefix_tree_filepath):
-        with open(prefix_tree_filepath, 'r') as f:
-            prefix_tree = json.load(f)
-        return prefix_tree
-    else:
-        return {}
+    return metadata_cache.get().prefix_tree
 
 
 prefix_map = Blueprint('prefix_map', __name__)
@@ -138,32 +316,95 @@ def webhook():
     if event_type in relevant_events:
         logging.info(f"Processing event: {event_type}")
         try:
-            # Trigger the visualization script
-            updater_manager.webhook_received()
+            # Re-render only the affected prefixes when the change can be scoped
+            scope = None
+            scope_tree = metadata_cache.get().get_scope_tree()
+            if scope_tree:
+                prefix_tree, tenant_counts = scope_tree
+                scope = scope_webhook(data, prefix_tree, tenant_counts)
+            updater_manager.webhook_received(scope)
             return jsonify({"status": "success", "message": "Update scheduled."}), 200
 
         except subprocess.CalledProcessError as e:
             logging.error(f"Error updating visualization grid: {e}")
             return jsonify({'status': 'error', 'message': str(e)}), 500
+        except (OSError, RuntimeError) as e:
+            logging.error(f"Cannot reach the updater worker: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 503
     else:
         logging.info(f"Ignored event: {event_type}")
         return jsonify({'status': 'ignored'}), 200
 
 
+@bp.route('/updater', methods=['GET'])
+def updater_status():
+    """
+    Endpoint to report the update queue depth and the last update run.
+    """
+    return jsonify(updater_manager.stats())
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint to expose metrics in the Prometheus text format.
+    Pipeline metrics of a separate updater worker are read from the textfile it writes after every update.
+    """
+    try:
+        stats = updater_manager.stats()
+        if stats.get('worker') == 'not running':
+            # The worker is started on the first webhook, not by scrapes
+            UPDATER_UP.set(0)
+            UPDATER_RUNNING.set(0)
+        else:
+            UPDATER_UP.set(1)
+            UPDATER_RUNNING.set(int(stats['running']))
+            UPDATER_QUEUED.set(stats['pending_events'])
+            if stats['last_success']:
+                UPDATER_LAST_SUCCESS.set(stats['last_success']['end_time'])
+                UPDATER_LAST_DURATION.set(stats['last_success']['duration'])
+    except (OSError, RuntimeError) as e:
+        logging.warning(f"Cannot read updater stats: {e}")
+        UPDATER_UP.set(0)
+
+    body = REGISTRY.render()
+    if UPDATER_MODE != 'thread' and os.path.exists(UPDATER_METRICS_FILE):
+        with open(UPDATER_METRICS_FILE, 'r') as f:
+            body += f.read()
+    return Response(body, mimetype=CONTENT_TYPE)
+
+
 @bp.route('/errors', methods=['GET'])
 def show_errors():
     """
-    Endpoint to display recent error logs.
+    Endpoint to display recent log lines, newest page first.
+
+    Query parameters:
+        level: Only show lines of this level or above (e.g., ERROR or WARNING).
+        cursor: Show the lines before this cursor, from the link to older lines.
+        limit: Lines per page.
     """
+    level = request.args.get('level', '').upper() or None
+    cursor = request.args.get('cursor')
+    try:
+        limit = min(max(int(request.args.get('limit', LOG_PAGE_SIZE)), 1), LOG_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = LOG_PAGE_SIZE
+
     try:
-        with open('ip_allocation.log', 'r') as log_file:
-            logs = log_file.readlines()
-        # Render logs in an HTML template
-        return render_template('errors.html', logs=logs)
+        logs, next_cursor = tail_log(LOG_FILE, limit=limit, cursor=cursor, level=level)
     except Exception as e:
         logging.error(f"Failed to read log file: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    older_url = None
+    if next_cursor:
+        older_url = url_for('app.show_errors', level=level, cursor=next_cursor, limit=limit)
+    # Render logs in an HTML template, streamed as it renders
+    return Response(stream_with_context(stream_template(
+        'errors.html', logs=logs, level=level, levels=list(LEVELS), older_url=older_url,
+    )))
+
 
 @bp.route('/')
 @bp.route('/map')
@@ -174,13 +415,12 @@ def index():
 
 @bp.route('/map/<vrf>', methods=['GET'])
 def vrf_view(vrf):
-    prefix_tree = load_prefix_tree()
-    vrfs = load_vrf_data()
-    vrf_info = next((v for v in vrfs if str(v['id']) == vrf), None)
+    metadata = metadata_cache.get()
+    vrf_info = metadata.get_vrf(vrf)
     if not vrf_info and vrf != 'None':
         return render_template('error.html', message="VRF not found"), 404
 
-    prefixes = prefix_tree.get(vrf, {}).get('prefixes', [])
+    prefixes = metadata.get_prefixes(vrf)
     return render_template('vrf.html', vrf=vrf_info, prefixes=prefixes, netbox_url=get_netbox_url())
 
 
@@ -189,8 +429,8 @@ def serve_map(vrf, prefix):
     """
     Serve the visualization page for a given VRF and prefix.
     """
-    vrfs = load_vrf_data()
-    vrf_info = next((v for v in vrfs if str(v['id']) == vrf), None)
+    metadata = metadata_cache.get()
+    vrf_info = metadata.get_vrf(vrf)
 
     # Reconstruct the display prefix from the sanitized prefix
     display_prefix = reconstruct_prefix(prefix)
@@ -199,66 +439,133 @@ def serve_map(vrf, prefix):
     sanitized_prefix = sanitize_name(prefix)
 
     image_filename = f"address_map-{sanitized_vrf}-{sanitized_prefix}.png"
-    data_filename = f"data-{sanitized_vrf}-{sanitized_prefix}.json"
 
-    if not os.path.exists(os.path.join(OUTPUT_DIR, image_filename)):
+    data_dir = metadata.data_dir
+    prefix_entry = metadata.get_prefix(sanitized_vrf, sanitized_prefix)
+    # In lazy render mode, the image is rendered when the page requests it
+    if not os.path.exists(os.path.join(data_dir, image_filename)) and not (lazy_renderer and prefix_entry):
         return f"Visualization for prefix {prefix} not found.", 404
 
+    # Stamp the image URL with its generation, so browsers can cache it forever
+    generation = os.path.basename(data_dir) if data_dir != OUTPUT_DIR else None
+    if generation:
+        image_filename = f"{generation}/{image_filename}"
+
     return render_template(
         'map.html',
         netbox_url=get_netbox_url(),
         vrf=vrf_info,
         prefix=display_prefix,
-        # prefix_id=prefix["id"],
+        prefix_id=prefix_entry['id'] if prefix_entry else None,
         image_filename=image_filename,
-        data_filename=data_filename
     )
 
 
 @bp.route('/data/<vrf>/<path:prefix>', methods=['GET'])
 def serve_data(vrf, prefix):
     """
-    Serve the JSON data file for a given VRF and prefix, including navigation URLs.
+    Serve the data for a given VRF and prefix from the VRF data store, including a navigation URL.
+
+    The format (JSON or packed) is chosen by the Accept header. Large payloads are sent
+    precompressed when Accept-Encoding allows; the bytes are streamed without being decoded.
     """
     sanitized_vrf = sanitize_name(vrf)
     sanitized_prefix = sanitize_name(prefix)
 
-    data_filename = f"data-{sanitized_vrf}-{sanitized_prefix}.json"
-    json_filepath = os.path.join(OUTPUT_DIR, data_filename)
-
-    if not os.path.exists(json_filepath):
-        return jsonify({'error': 'Data not found.'}), 404
+    mimetypes = {mimetype: fmt for fmt, mimetype in FORMATS.items()}
+    fmt = mimetypes[request.accept_mimetypes.best_match(list(mimetypes), default=FORMATS['json'])]
 
+    data_dir = get_data_dir()
     try:
-        # Load the existing JSON data
-        with open(json_filepath, 'r') as f:
-            data = json.load(f)
-
-        # Add URLs for navigation
-        def add_urls(node):
-            node['url'] = f"/map/{sanitize_name(node.get('vrf', 'None'))}/{sanitize_name(node['prefix'])}"
-            if 'children' in node:
-                for child in node['children']:
-                    add_urls(child)
-
-        add_urls(data)
-        return jsonify(data), 200
+        precompressed = find_precompressed(
+            data_dir, sanitized_vrf, sanitized_prefix, fmt, lambda encoding: request.accept_encodings[encoding] > 0
+        )
+        if precompressed:
+            encoding, path = precompressed
+            response = Response(
+                wrap_file(request.environ, open(path, 'rb')), mimetype=FORMATS[fmt], direct_passthrough=True
+            )
+            response.headers['Content-Encoding'] = encoding
+            response.content_length = os.path.getsize(path)
+        else:
+            encoding = 'identity'
+            body = read_payload(data_dir, sanitized_vrf, sanitized_prefix, fmt)
+            if body is None:
+                return jsonify({'error': 'Data not found.'}), 404
+            response = Response(body, mimetype=FORMATS[fmt])
+        response.vary.update(('Accept', 'Accept-Encoding'))
+
+        # The data changes only with the generation; let browsers revalidate cheaply
+        if data_dir != OUTPUT_DIR:
+            response.set_etag(f"{os.path.basename(data_dir)}-{fmt}-{encoding}")
+            response.cache_control.no_cache = True
+            response.make_conditional(request)
+        return response
 
     except Exception as e:
-        logging.error(f"Failed to load prefix tree data: {e}")
+        logging.error(f"Failed to load prefix data: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @bp.route('/images/<filename>', methods=['GET'])
 def serve_image(filename):
     """
-    Serve image files from the output directory.
+    Serve image files from the published output generation, rendering missing ones in lazy render mode.
+    """
+    data_dir = get_data_dir()
+    rendered = None
+    if not os.path.exists(os.path.join(data_dir, filename)):
+        rendered = render_missing_image(filename)
+    if rendered:
+        response = send_file(rendered, max_age=0)
+    else:
+        response = send_from_directory(data_dir, filename, max_age=0)
+    response.cache_control.no_cache = True
+    return response
+
+
+@bp.route('/images/<generation>/<filename>', methods=['GET'])
+def serve_generation_image(generation, filename):
+    """
+    Serve image files from a given output generation. Their content never changes, so they are cached for good.
     """
-    return send_from_directory(OUTPUT_DIR, filename)
+    generation_dir = get_generation_dir(OUTPUT_DIR, generation)
+    if generation_dir is None:
+        return f"Generation {generation} not found.", 404
+    rendered = None
+    if not os.path.exists(os.path.join(generation_dir, filename)):
+        rendered = render_missing_image(filename)
+    if rendered:
+        response = send_file(rendered, max_age=IMMUTABLE_MAX_AGE)
+    else:
+        response = send_from_directory(generation_dir, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 app.register_blueprint(bp)
 
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    """Record the request latency per route; the route pattern keeps the number of label values bounded."""
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
 @app.route('/', methods=['GET'])
 def root_redirect():
     """
@@ -0,0 +1,231 @@
+# benchmarks/fake_netbox.py
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import ipaddress
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+import urllib.request
+import uuid
+
+API_VERSION = '4.1'
+
+# NetBox PAGINATE_COUNT and MAX_PAGE_SIZE defaults
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 1000
+
+# List endpoints and the dataset each one serves, with the webhook model name
+ENDPOINTS = {
+    'ipam/prefixes': ('prefixes', 'prefix'),
+    'ipam/ip-addresses': ('ip_addresses', 'ipaddress'),
+    'tenancy/tenants': ('tenants', 'tenant'),
+    'ipam/vrfs': ('vrfs', 'vrf'),
+}
+
+# Fields of nested objects, as NetBox returns them inside other objects
+NESTED_FIELDS = ('id', 'url', 'display', 'name')
+
+
+class FakeNetbox(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, dataset, address=('127.0.0.1', 0), latency=0.0, page_size=DEFAULT_PAGE_SIZE,
+                 max_page_size=DEFAULT_MAX_PAGE_SIZE, webhook_url=None):
+        """
+        Local stand-in for the NetBox REST API, serving a dataset such as generate_dataset returns.
+
+        List views paginate with limit/offset and next links and support the filters used by
+        this application: fields, brief, last_updated__gte, parent and vrf_id. Objects are
+        returned as NetBox returns them, with nested VRFs and tenants.
+
+        Args:
+            dataset (dict): 'prefixes', 'ip_addresses', 'tenants' and 'vrfs' record lists.
+            address (tuple): Listening (host, port); port 0 picks a free port.
+            latency (float): Seconds added to every response.
+            page_size (int): Page size when a request has no limit.
+            max_page_size (int): Upper bound of the limit parameter; limit=0 also returns this many.
+            webhook_url (str): URL that change events are posted to, or None.
+        """
+        super().__init__(address, FakeNetboxHandler)
+        self.latency = latency
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.webhook_url = webhook_url
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._thread = None
+
+        now = datetime.now(timezone.utc) - timedelta(days=1)
+        self.datasets = {}
+        for name in ('prefixes', 'ip_addresses', 'tenants', 'vrfs'):
+            self.datasets[name] = {}
+            for record in dataset[name]:
+                self.datasets[name][record['id']] = dict(record, last_updated=now.isoformat())
+        self._clock = now
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _nested(self, name, object_id):
+        if object_id is None:
+            return None
+        record = self.datasets[name].get(object_id)
+        if record is None:
+            return {'id': object_id}
+        endpoint = next(path for path, (dataset, _) in ENDPOINTS.items() if dataset == name)
+        nested = {key: record.get(key) for key in NESTED_FIELDS if key in record}
+        nested.update(id=object_id, url=f"{self.url}/api/{endpoint}/{object_id}/", display=record.get('name'))
+        return nested
+
+    def render(self, name, record, brief=False):
+        """Return a record as the API serializes it."""
+        if brief:
+            return {'id': record['id'], 'url': f"{self.url}/api/{name}/{record['id']}/"}
+        rendered = dict(record)
+        if 'vrf' in rendered:
+            rendered['vrf'] = self._nested('vrfs', record.get('vrf'))
+        if 'tenant' in rendered:
+            rendered['tenant'] = self._nested('tenants', record.get('tenant'))
+        if name == 'ip_addresses':
+            rendered['tags'] = [{'id': i, 'name': tag, 'slug': tag} for i, tag in enumerate(record.get('tags', []))]
+        return rendered
+
+    def query(self, name, params):
+        """Return the records of a dataset matching list view filters, in ID order."""
+        with self.lock:
+            records = sorted(self.datasets[name].values(), key=lambda record: record['id'])
+        since = params.get('last_updated__gte')
+        if since:
+            since = datetime.fromisoformat(since.replace('Z', '+00:00'))
+            records = [record for record in records if datetime.fromisoformat(record['last_updated']) >= since]
+        if 'vrf_id' in params:
+            vrf = None if params['vrf_id'] == 'null' else int(params['vrf_id'])
+            records = [record for record in records if record.get('vrf') == vrf]
+        if 'parent' in params:
+            parent = ipaddress.ip_network(params['parent'], strict=False)
+            field = 'address' if name == 'ip_addresses' else 'prefix'
+            records = [
+                record for record in records
+                if ipaddress.ip_interface(record[field]).ip in parent
+            ]
+        return records
+
+    def update(self, name, object_id, **changes):
+        """
+        Change an object as a NetBox user would, and post a webhook for it.
+
+        Returns:
+            dict: The webhook payload.
+        """
+        with self.lock:
+            prechange = dict(self.datasets[name][object_id])
+            # Timestamps always advance, even for several changes within a clock tick
+            self._clock = max(self._clock + timedelta(microseconds=1), datetime.now(timezone.utc))
+            postchange = dict(prechange, last_updated=self._clock.isoformat(), **changes)
+            self.datasets[name][object_id] = postchange
+        return self.emit_webhook(name, 'updated', prechange, postchange)
+
+    def emit_webhook(self, name, event, prechange, postchange):
+        """Post a NetBox webhook for a change to webhook_url, if it is set."""
+        model = next(model for dataset, model in ENDPOINTS.values() if dataset == name)
+        payload = {
+            'event': event,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'model': model,
+            'username': 'load-test',
+            'request_id': str(uuid.uuid4()),
+            'data': self.render(name, postchange or prechange),
+            'snapshots': {'prechange': prechange, 'postchange': postchange},
+        }
+        if self.webhook_url:
+            request = urllib.request.Request(
+                self.webhook_url, data=json.dumps(payload).encode(), method='POST',
+                headers={'Content-Type': 'application/json'},
+            )
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+        return payload
+
+
+class FakeNetboxHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug(f"Fake NetBox: {format % args}")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('API-Version', API_VERSION)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            self.server.bytes_sent += len(data)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        path = url.path.strip('/')
+        with server.lock:
+            server.requests[path] += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if path == 'api':
+            return self._send_json(200, {endpoint.split('/')[0]: f"{server.url}/api/{endpoint.split('/')[0]}/"
+                                         for endpoint in ENDPOINTS})
+        if path == 'api/status':
+            return self._send_json(200, {'netbox-version': API_VERSION})
+        endpoint = path[len('api/'):] if path.startswith('api/') else None
+        if endpoint not in ENDPOINTS:
+            return self._send_json(404, {'detail': 'Not found.'})
+
+        name = ENDPOINTS[endpoint][0]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            records = server.query(name, params)
+        except ValueError as e:
+            return self._send_json(400, {'detail': str(e)})
+        limit = int(params.get('limit', server.page_size))
+        limit = min(limit, server.max_page_size) if limit else server.max_page_size
+        offset = int(params.get('offset', 0))
+        page = records[offset:offset + limit]
+
+        brief = params.get('brief') in ('1', 'true', 'True')
+        results = [server.render(name, record, brief) for record in page]
+        fields = params.get('fields')
+        if fields and not brief:
+            keep = set(fields.split(','))
+            results = [{key: value for key, value in result.items() if key in keep} for result in results]
+
+        def link(new_offset):
+            return f"{server.url}/{path}/?{urlencode(dict(params, limit=limit, offset=new_offset))}"
+
+        self._send_json(200, {
+            'count': len(records),
+            'next': link(offset + limit) if offset + limit < len(records) else None,
+            'previous': link(max(offset - limit, 0)) if offset > 0 else None,
+            'results': results,
+        })
@@ -0,0 +1,193 @@
+# benchmarks/load.py
+
+import argparse
+from contextlib import contextmanager
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.fake_netbox import DEFAULT_MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE, FakeNetbox
+from benchmarks.run import SCALES
+from benchmarks.synthetic import generate_dataset
+
+# Seconds to wait for webhook-triggered updates to finish
+WEBHOOK_TIMEOUT = 600
+
+
+class StageRecorder:
+    def __init__(self, server, trace_memory=True):
+        """
+        Measure wall time, NetBox requests and peak Python memory of harness stages.
+
+        Args:
+            server (FakeNetbox): Server whose request counter is read.
+            trace_memory (bool): Track peak memory with tracemalloc, which slows the stages down.
+        """
+        self.server = server
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        requests = self.server.request_count
+        bytes_sent = self.server.bytes_sent
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        stage = {
+            'stage': name,
+            'wall': wall,
+            'requests': self.server.request_count - requests,
+            'bytes': self.server.bytes_sent - bytes_sent,
+            'peak_memory': tracemalloc.get_traced_memory()[1] if self.trace_memory else None,
+        }
+        self.stages.append(stage)
+        logging.info(f"{name}: {wall:.2f}s, {stage['requests']} requests")
+
+    def report(self):
+        lines = [f"{'stage':<28} {'wall':>9} {'requests':>9} {'MiB sent':>9} {'peak MiB':>9}"]
+        for stage in self.stages:
+            peak = f"{stage['peak_memory'] / 2 ** 20:>9.1f}" if stage['peak_memory'] is not None else f"{'-':>9}"
+            lines.append(
+                f"{stage['stage']:<28} {stage['wall']:>8.2f}s {stage['requests']:>9} "
+                f"{stage['bytes'] / 2 ** 20:>9.1f} {peak}"
+            )
+        lines.append(f"Process peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+        return '\n'.join(lines)
+
+
+def wait_until_idle(updater_manager, runs_before, timeout=WEBHOOK_TIMEOUT):
+    """Wait until the updater ran at least once since runs_before and has no pending work."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stats = updater_manager.stats()
+        if stats['runs'] > runs_before and not stats['running'] and not stats['pending_events']:
+            return stats
+        time.sleep(0.05)
+    raise TimeoutError("Webhook updates did not finish")
+
+
+def run_harness(dataset, output_dir, recorder, changes=20, webhooks=20, debounce=1.0, seed=0, renderer='raster'):
+    """
+    Drive NetboxAddressManager, full_update and the /webhook path against a FakeNetbox.
+
+    Args:
+        dataset (dict): The dataset served by recorder.server.
+        output_dir (str): Output directory of the updates.
+        recorder (StageRecorder): Collects the stage measurements.
+        changes (int): IP addresses changed before the delta sync.
+        webhooks (int): IP addresses changed with webhooks, in one burst.
+        debounce (float): Webhook debounce interval in seconds.
+        seed (int): Seed for picking the changed IP addresses.
+        renderer (str): Renderer of the updates.
+    """
+    server = recorder.server
+    rng = random.Random(seed)
+    os.environ.update({
+        'NETBOX_API_URL': server.url,
+        'NETBOX_API_TOKEN': 'load-test',
+        'OUTPUT_DIR': output_dir,
+        'UPDATER_MODE': 'thread',
+        'UPDATE_DEBOUNCE': str(debounce),
+        'RENDERER': renderer,
+    })
+
+    from app.cli import full_update
+    from app.netbox_integration import NetboxAddressManager
+
+    with recorder.stage('fetch_all'):
+        NetboxAddressManager(fetch=True)
+
+    os.environ['SYNC_MODE'] = 'full'
+    with recorder.stage('full_update (full sync)'):
+        if not full_update():
+            raise RuntimeError("Full update failed")
+
+    for ip_id in rng.sample(sorted(server.datasets['ip_addresses']), changes):
+        server.update('ip_addresses', ip_id, status='reserved')
+    os.environ['SYNC_MODE'] = 'delta'
+    with recorder.stage('full_update (delta sync)'):
+        if not full_update():
+            raise RuntimeError("Delta update failed")
+
+    # The web app reads its settings on import
+    from werkzeug.serving import make_server
+    from app import webapp
+
+    http_server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    server.webhook_url = f"http://127.0.0.1:{http_server.server_port}{webapp.BASE_PATH}/webhook"
+    try:
+        runs_before = webapp.updater_manager.stats()['runs']
+        with recorder.stage('webhooks → scoped update'):
+            for ip_id in rng.sample(sorted(server.datasets['ip_addresses']), webhooks):
+                server.update('ip_addresses', ip_id, status='deprecated')
+            stats = wait_until_idle(webapp.updater_manager, runs_before)
+        logging.info(f"Updater: {stats['runs'] - runs_before} runs, last {stats['last_run']}")
+
+        prefix_id = rng.choice(sorted(server.datasets['prefixes']))
+        runs_before = stats['runs']
+        with recorder.stage('webhook → prefix change'):
+            # Prefix changes that alter the set of tenants recolor every map and update everything
+            server.update('prefixes', prefix_id, tenant=None)
+            wait_until_idle(webapp.updater_manager, runs_before)
+    finally:
+        server.webhook_url = None
+        http_server.shutdown()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load test the NetBox fetch and update paths against a fake NetBox.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium", help="Dataset scale (default: medium).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the dataset (default: 0).")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every NetBox response.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"NetBox page size for requests without a limit (default: {DEFAULT_PAGE_SIZE}).")
+    parser.add_argument("--max-page-size", type=int, default=DEFAULT_MAX_PAGE_SIZE,
+                        help=f"NetBox page size limit, also used for limit=0 (default: {DEFAULT_MAX_PAGE_SIZE}).")
+    parser.add_argument("--changes", type=int, default=20, help="IP addresses changed before the delta sync.")
+    parser.add_argument("--webhooks", type=int, default=20, help="IP addresses changed with webhooks.")
+    parser.add_argument("--debounce", type=float, default=1.0, help="Webhook debounce interval in seconds.")
+    parser.add_argument("-r", "--renderer", default="raster", help="Renderer of the updates (default: raster).")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Do not measure peak memory per stage.")
+    parser.add_argument("--json", help="Also write the measurements to this JSON file.")
+    parser.add_argument("-l", "--log-level", default="WARNING", help="Logging level (default: WARNING).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()),
+                        format='%(asctime)s %(levelname)-8s %(message)s')
+    dataset = generate_dataset(**dict(SCALES[args.scale], seed=args.seed))
+    server = FakeNetbox(
+        dataset, latency=args.latency, page_size=args.page_size, max_page_size=args.max_page_size,
+    ).start()
+    recorder = StageRecorder(server, trace_memory=not args.no_tracemalloc)
+    if recorder.trace_memory:
+        tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            run_harness(
+                dataset, output_dir, recorder, args.changes, args.webhooks, args.debounce, args.seed, args.renderer,
+            )
+    finally:
+        server.stop()
+
+    print(f"Dataset: {len(dataset['prefixes'])} prefixes, {len(dataset['ip_addresses'])} IP addresses")
+    print(recorder.report())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'stages': recorder.stages}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
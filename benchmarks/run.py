@@ -0,0 +1,245 @@
+# benchmarks/run.py
+
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.cli import DEFAULT_RENDERER, RENDERERS, build_prefix_tree, process_all_prefixes
+from app.ip_index import IPIndex
+from app.plot_map import (
+    build_tenant_color_map, calculate_grid_dimensions, create_allocation_grid, get_max_bits,
+    get_prefix_rectangles, plot_allocation_grid,
+)
+from benchmarks.synthetic import generate_dataset
+
+DEFAULT_RESULTS_FILE = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+# Dataset scales selectable by name; any parameter can still be overridden on the command line
+SCALES = {
+    'small': {'vrfs': 1, 'roots': 1, 'root_prefixlen': 20, 'depth': 2, 'fanout': 4, 'ip_density': 0.2},
+    'medium': {'vrfs': 2, 'roots': 2, 'root_prefixlen': 16, 'depth': 3, 'fanout': 6, 'ip_density': 0.2},
+    'large': {'vrfs': 8, 'roots': 4, 'root_prefixlen': 16, 'depth': 4, 'fanout': 8, 'ip_density': 0.3},
+}
+
+
+def bench_prefix_tree(dataset, context):
+    prefixes = dataset['prefixes']
+    roots = [(entry['vrf'], entry['prefix']) for entry in prefixes if entry['status'] == 'container']
+
+    def run():
+        prefix_tree_obj = build_prefix_tree(prefixes)
+        # Queries build the materialized index arrays on first use
+        for vrf, prefix in roots:
+            prefix_tree_obj.get_descendants(prefix, vrf)
+    return run
+
+
+def bench_create_allocation_grid(dataset, context):
+    ip_table = context['ip_index'].lookup_table(context['root']['prefix'], context['root']['vrf'])
+    return lambda: create_allocation_grid(context['root']['prefix'], ip_table)
+
+
+def bench_get_prefix_rectangles(dataset, context):
+    prefix = context['root']['prefix']
+    grid_width, grid_height = calculate_grid_dimensions(prefix)
+    max_bits = get_max_bits(grid_width, grid_height)
+    return lambda: get_prefix_rectangles(prefix, context['children'], max_bits)
+
+
+def bench_plot_allocation_grid(dataset, context):
+    root = context['root']
+    ip_table = context['ip_index'].lookup_table(root['prefix'], root['vrf'])
+    output_file = os.path.join(context['work_dir'], 'plot.png')
+    tenant_color_map = build_tenant_color_map(dataset['prefixes'])
+    return lambda: plot_allocation_grid(
+        root, context['children'], ip_table, output_file, context['cell_size'], tenant_color_map,
+    )
+
+
+def bench_process_all_prefixes(dataset, context):
+    output_dir = os.path.join(context['work_dir'], 'output')
+
+    def run():
+        # Start empty, so every prefix is rendered instead of skipped by the manifest
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        process_all_prefixes(
+            dataset['prefixes'], dataset['ip_addresses'], context['cell_size'], output_dir,
+            context['renderer'], context['workers'],
+        )
+    return run
+
+
+def bench_webapp_import(dataset, context):
+    # A fresh interpreter each run, as when a container or a web server worker starts
+    work_dir = os.path.join(context['work_dir'], 'webapp')
+    os.makedirs(work_dir, exist_ok=True)
+    env = dict(os.environ, OUTPUT_DIR=work_dir, UPDATER_MODE='daemon')
+    command = [sys.executable, '-c', 'import app.webapp']
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return lambda: subprocess.run(command, cwd=repo_dir, env=env, check=True, capture_output=True)
+
+
+BENCHMARKS = {
+    'prefix_tree': bench_prefix_tree,
+    'create_allocation_grid': bench_create_allocation_grid,
+    'get_prefix_rectangles': bench_get_prefix_rectangles,
+    'plot_allocation_grid': bench_plot_allocation_grid,
+    'process_all_prefixes': bench_process_all_prefixes,
+    'webapp_import': bench_webapp_import,
+}
+
+
+def time_callable(fn, repeat):
+    """Run fn repeat times and return the wall times in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(params, names=None, repeat=3, cell_size=4, renderer=DEFAULT_RENDERER, workers=1):
+    """
+    Generate a synthetic dataset and time the selected benchmarks on it.
+
+    Args:
+        params (dict): generate_dataset arguments.
+        names (list): Keys of BENCHMARKS to run, or None for all.
+        repeat (int): Timed runs per benchmark.
+        cell_size (int): Cell size in pixels for rendering.
+        renderer (str): Renderer used by process_all_prefixes.
+        workers (int): Render workers used by process_all_prefixes.
+
+    Returns:
+        dict: The result record, as stored in the results file.
+    """
+    dataset = generate_dataset(**params)
+    prefix_tree_obj = build_prefix_tree(dataset['prefixes'])
+    # The root prefix with the most descendants is the most expensive map
+    root = max(
+        (entry for entry in dataset['prefixes'] if entry['status'] == 'container'),
+        key=lambda entry: len(prefix_tree_obj.get_descendants(entry['prefix'], entry['vrf'])),
+    )
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        context = {
+            'ip_index': IPIndex(dataset['ip_addresses']),
+            'root': root,
+            'children': prefix_tree_obj.get_descendants(root['prefix'], root['vrf']),
+            'work_dir': work_dir,
+            'cell_size': cell_size,
+            'renderer': renderer,
+            'workers': workers,
+        }
+        for name in names or BENCHMARKS:
+            times = time_callable(BENCHMARKS[name](dataset, context), repeat)
+            results[name] = {'min': min(times), 'median': statistics.median(times), 'runs': len(times)}
+            logging.info(f"{name}: min {min(times):.4f}s, median {statistics.median(times):.4f}s")
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'params': params,
+        'settings': {'cell_size': cell_size, 'renderer': renderer, 'workers': workers},
+        'dataset': {key: len(dataset[key]) for key in ('prefixes', 'ip_addresses', 'vrfs')},
+        'results': results,
+    }
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(record, path):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def find_baseline(history, record):
+    """Return the latest stored result with the same dataset and settings, or None."""
+    for previous in reversed(history):
+        if previous.get('params') == record['params'] and previous.get('settings') == record['settings']:
+            return previous
+    return None
+
+
+def format_report(record, baseline=None):
+    lines = [
+        f"Dataset: {record['dataset']['prefixes']} prefixes, {record['dataset']['ip_addresses']} IP addresses, "
+        f"{record['dataset']['vrfs']} VRFs"
+    ]
+    if baseline:
+        lines.append(f"Compared with {baseline['revision'] or 'unknown revision'} at {baseline['timestamp']}")
+    for name, result in record['results'].items():
+        line = f"{name:<24} {result['min']:>10.4f}s"
+        previous = (baseline or {}).get('results', {}).get(name)
+        if previous and previous['min']:
+            line += f" {(result['min'] / previous['min'] - 1) * 100:>+8.1f}%"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on a synthetic NetBox dataset.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium", help="Dataset scale (default: medium).")
+    parser.add_argument("--vrfs", type=int, help="Number of VRFs besides the Global VRF.")
+    parser.add_argument("--roots", type=int, help="Root prefixes per VRF.")
+    parser.add_argument("--root-prefixlen", type=int, help="Prefix length of the root prefixes.")
+    parser.add_argument("--depth", type=int, help="Nesting levels below the root prefixes.")
+    parser.add_argument("--fanout", type=int, help="Maximum number of child prefixes per prefix.")
+    parser.add_argument("--ip-density", type=float, help="Fraction of leaf prefix addresses allocated.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the dataset (default: 0).")
+    parser.add_argument("-b", "--benchmark", action="append", choices=sorted(BENCHMARKS),
+                        help="Benchmark to run; repeat for several (default: all).")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Timed runs per benchmark (default: 3).")
+    parser.add_argument("-c", "--cell_size", type=int, default=4, help="Cell size in pixels (default: 4).")
+    parser.add_argument("-r", "--renderer", choices=sorted(RENDERERS), default=DEFAULT_RENDERER,
+                        help=f"Renderer used by process_all_prefixes (default: {DEFAULT_RENDERER}).")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Render worker processes (default: 1).")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_FILE,
+                        help="JSON lines file the results are appended to and compared with.")
+    parser.add_argument("--no-save", action="store_true", help="Do not append the results to the results file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.WARNING)
+    params = dict(SCALES[args.scale], seed=args.seed)
+    for key in ('vrfs', 'roots', 'root_prefixlen', 'depth', 'fanout', 'ip_density'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+
+    record = run_benchmarks(params, args.benchmark, args.repeat, args.cell_size, args.renderer, args.workers)
+    print(format_report(record, find_baseline(load_results(args.results), record)))
+    if not args.no_save:
+        save_result(record, args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/synthetic.py
+
+import ipaddress
+import itertools
+import random
+
+IP_STATUSES = ('active', 'active', 'active', 'reserved', 'dhcp', 'deprecated')
+IP_ROLES = (None, None, None, None, 'vip', 'anycast')
+PREFIX_STATUSES = ('active', 'active', 'reserved', 'container')
+
+
+def _carve(network, count, rng, min_prefixlen, max_prefixlen):
+    """
+    Pick up to count non-overlapping subnets of network, with random lengths between the bounds.
+    """
+    subnets = []
+    taken = []
+    attempts = count * 4
+    while len(subnets) < count and attempts:
+        attempts -= 1
+        prefixlen = rng.randint(max(min_prefixlen, network.prefixlen + 1), max_prefixlen)
+        if prefixlen > network.max_prefixlen:
+            break
+        size = 1 << (network.max_prefixlen - prefixlen)
+        slots = network.num_addresses // size
+        start = int(network.network_address) + rng.randrange(slots) * size
+        subnet = ipaddress.ip_network((start, prefixlen))
+        if any(subnet.overlaps(other) for other in taken):
+            continue
+        taken.append(subnet)
+        subnets.append(subnet)
+    return sorted(subnets)
+
+
+def generate_dataset(vrfs=2, roots=2, root_prefixlen=16, depth=3, fanout=6, ip_density=0.2,
+                     tenants=12, seed=0):
+    """
+    Generate a NetBox-like dataset of nested prefixes and the IP addresses allocated in them.
+
+    Every VRF (plus the Global VRF) gets the same root prefixes in 10.0.0.0/8. Each prefix is split
+    into up to fanout subnets of random lengths, down to depth levels, mixing larger and smaller
+    blocks as in real allocations. IP addresses fill the leaf prefixes.
+
+    Args:
+        vrfs (int): Number of VRFs besides the Global VRF.
+        roots (int): Root prefixes per VRF.
+        root_prefixlen (int): Prefix length of the root prefixes, at least 8 (e.g., 16).
+        depth (int): Nesting levels below the roots.
+        fanout (int): Maximum number of child prefixes per prefix.
+        ip_density (float): Fraction of the addresses of each leaf prefix that are allocated.
+        tenants (int): Number of tenants assigned to prefixes; some prefixes have no tenant.
+        seed (int): Random seed; the same arguments always produce the same dataset.
+
+    Returns:
+        dict: 'prefixes', 'ip_addresses', 'vrfs' and 'tenants' lists in the shape fetched from NetBox.
+    """
+    rng = random.Random(seed)
+    vrf_list = [{'id': i, 'name': f"vrf-{i}", 'rd': f"65000:{i}"} for i in range(1, vrfs + 1)]
+    tenant_list = [{'id': i, 'name': f"tenant-{i}"} for i in range(1, tenants + 1)]
+    prefixes = []
+    ip_addresses = []
+
+    # Leaf prefixes are at most /30 and take several levels below the root
+    step = max(1, (30 - root_prefixlen) // max(depth, 1))
+
+    def add_prefix(network, vrf, level, tenant):
+        if level and rng.random() < 0.3:
+            tenant = rng.choice(tenant_list)['id'] if rng.random() < 0.8 else None
+        prefixes.append({
+            'id': len(prefixes) + 1,
+            'prefix': str(network),
+            'vrf': vrf,
+            'tenant': tenant,
+            'status': 'container' if level < depth else rng.choice(PREFIX_STATUSES),
+        })
+        children = []
+        if level < depth:
+            children = _carve(
+                network, rng.randint(1, fanout), rng,
+                network.prefixlen + 1, min(network.prefixlen + step, 30),
+            )
+        for child in children:
+            add_prefix(child, vrf, level + 1, tenant)
+        if not children:
+            hosts = network.num_addresses
+            count = min(hosts, max(1, int(hosts * ip_density)))
+            for offset in sorted(rng.sample(range(hosts), count)):
+                ip_addresses.append({
+                    'id': len(ip_addresses) + 1,
+                    'address': f"{network.network_address + offset}/{network.prefixlen}",
+                    'vrf': vrf,
+                    'status': rng.choice(IP_STATUSES),
+                    'role': rng.choice(IP_ROLES),
+                    'tags': [],
+                })
+
+    # VRFs reuse the same address space, as they do in practice
+    root_networks = list(itertools.islice(
+        ipaddress.ip_network('10.0.0.0/8').subnets(new_prefix=root_prefixlen), roots
+    ))
+    for vrf in [None] + [item['id'] for item in vrf_list]:
+        for root in root_networks:
+            add_prefix(root, vrf, 0, rng.choice(tenant_list)['id'])
+
+    return {
+        'prefixes': prefixes,
+        'ip_addresses': ip_addresses,
+        'vrfs': vrf_list,
+        'tenants': tenant_list,
+    }
@@ -21,6 +21,31 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    // Media type of the packed prefix data (see app/data_store.py)
+    const PACKED_MIMETYPE = "application/vnd.prefix-map.packed";
+    const PACKED_RECORD_SIZE = 16;
+
+    // Decode a packed payload: 'PMAP', header length, JSON header, then fixed-width IP records
+    function decodePacked(buffer) {
+        const view = new DataView(buffer);
+        const headerLength = view.getUint32(4, true);
+        const data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+        const ipAddresses = [];
+        for (let i = 0; i < data.count; i++) {
+            const offset = 8 + headerLength + i * PACKED_RECORD_SIZE;
+            const address = view.getUint32(offset + 4, true);
+            const tenant = view.getInt32(offset + 8, true);
+            ipAddresses.push({
+                id: view.getUint32(offset, true),
+                address: `${address >>> 24}.${(address >>> 16) & 255}.${(address >>> 8) & 255}.${address & 255}/${view.getUint8(offset + 12)}`,
+                vrf: data.vrf,
+                tenant: tenant < 0 ? null : tenant,
+            });
+        }
+        data.ip_addresses = ipAddresses;
+        return data;
+    }
+
     // Show a spinner as the busy indicator
     function showBusyIndicator(parentElement) {
         const spinner = document.createElement("div");
@@ -45,11 +70,14 @@ document.addEventListener("DOMContentLoaded", () => {
 
         showBusyIndicator(parentElement);
 
-        fetch(treeUrl)
+        fetch(treeUrl, { headers: { "Accept": `${PACKED_MIMETYPE}, application/json;q=0.5` } })
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`Failed to fetch prefix tree data from URL: ${treeUrl}`);
                 }
+                if (response.headers.get("Content-Type") === PACKED_MIMETYPE) {
+                    return response.arrayBuffer().then(decodePacked);
+                }
                 return response.json();
             })
             .then(data => {
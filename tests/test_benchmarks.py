@@ -0,0 +1,43 @@
+import ipaddress
+
+from app.cli import build_prefix_tree
+from benchmarks.run import find_baseline, format_report, run_benchmarks
+from benchmarks.synthetic import generate_dataset
+
+
+def test_generate_dataset_is_deterministic():
+    assert generate_dataset(seed=3) == generate_dataset(seed=3)
+    assert generate_dataset(seed=3) != generate_dataset(seed=4)
+
+
+def test_generate_dataset_nests_prefixes_and_ips():
+    dataset = generate_dataset(vrfs=2, roots=2, root_prefixlen=20, depth=3, fanout=3, ip_density=0.1)
+    prefixes = dataset['prefixes']
+    assert {entry['vrf'] for entry in prefixes} == {None, 1, 2}
+    assert len({(entry['vrf'], entry['prefix']) for entry in prefixes}) == len(prefixes), "Prefixes should be unique"
+
+    prefix_tree = build_prefix_tree(prefixes)
+    for vrf in (None, 1, 2):
+        roots = prefix_tree.build_tree()[vrf]['ipv4']
+        assert [node['prefix'] for node in roots] == ['10.0.0.0/20', '10.0.16.0/20']
+    assert any(entry['prefix'].endswith(('/22', '/23', '/24')) for entry in prefixes), "Roots should be split"
+
+    assert dataset['ip_addresses']
+    for ip in dataset['ip_addresses']:
+        covering = prefix_tree.get_covering_prefixes(ip['address'].split('/')[0], ip['vrf'])
+        assert covering, f"IP {ip['address']} should be inside a prefix"
+        assert ipaddress.ip_interface(ip['address']).network == ipaddress.ip_network(covering[0])
+
+
+def test_run_benchmarks(tmp_path):
+    params = {'vrfs': 1, 'roots': 1, 'root_prefixlen': 24, 'depth': 2, 'fanout': 2, 'ip_density': 0.2}
+    record = run_benchmarks(params, repeat=1, renderer='raster')
+    assert set(record['results']) == {
+        'prefix_tree', 'create_allocation_grid', 'get_prefix_rectangles', 'plot_allocation_grid',
+        'process_all_prefixes', 'webapp_import',
+    }
+    assert all(result['min'] >= 0 for result in record['results'].values())
+
+    assert find_baseline([record], dict(record)) is record
+    assert find_baseline([record], dict(record, params=dict(params, vrfs=2))) is None
+    assert '%' in format_report(record, record), "Reports should compare with the baseline"
@@ -1,19 +1,24 @@
 import pytest
-from app.webapp import build_prefix_tree
+from app.cli import build_prefix_tree
 
 @pytest.fixture
 def mock_prefixes():
     return [
-        {"prefix": "10.0.0.0/16", "children": 3},
-        {"prefix": "10.0.1.0/24", "children": 0},
-        {"prefix": "10.0.2.0/24", "children": 0},
-        {"prefix": "10.0.3.0/24", "children": 0},
-        {"prefix": "192.168.0.0/16", "children": 1},
-        {"prefix": "192.168.1.0/24", "children": 0}
+        {"id": 1, "prefix": "10.0.0.0/16", "vrf": None, "tenant": None},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": None},
+        {"id": 3, "prefix": "10.0.2.0/24", "vrf": None, "tenant": None},
+        {"id": 4, "prefix": "10.0.3.0/24", "vrf": None, "tenant": None},
+        {"id": 5, "prefix": "192.168.0.0/16", "vrf": None, "tenant": None},
+        {"id": 6, "prefix": "192.168.1.0/24", "vrf": None, "tenant": None}
     ]
 
+
+def to_nested(nodes):
+    return {node["prefix"]: to_nested(node["children"]) for node in nodes}
+
+
 def test_build_prefix_tree(mock_prefixes):
-    result = build_prefix_tree(mock_prefixes)
+    result = to_nested(build_prefix_tree(mock_prefixes).build_tree(None)[None]["ipv4"])
     expected_tree = {
         "10.0.0.0/16": {
             "10.0.1.0/24": {},
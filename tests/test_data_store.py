@@ -0,0 +1,144 @@
+import gzip
+import json
+import os
+
+import pytest
+from app import data_store
+from app.cli import build_prefix_tree
+from app.data_store import (
+    PRECOMPRESS_MIN_SIZE, decode_packed, find_precompressed, get_store_paths, read_payload, save_data_stores,
+)
+from app.ip_index import IPIndex
+
+
+@pytest.fixture
+def prefix_tree():
+    return build_prefix_tree([
+        {"id": 1, "prefix": "10.0.0.0/16", "vrf": None, "tenant": 1},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 2},
+        {"id": 3, "prefix": "10.0.1.128/25", "vrf": None, "tenant": None},
+        {"id": 4, "prefix": "10.0.2.0/24", "vrf": None, "tenant": None},
+        {"id": 5, "prefix": "10.0.0.0/16", "vrf": 7, "tenant": None},
+    ])
+
+
+def make_ips(*entries):
+    return IPIndex([{"id": ip_id, "address": address, "vrf": vrf, "tenant": 3} for ip_id, address, vrf in entries])
+
+
+def read(output_dir, vrf, prefix):
+    data = json.loads(read_payload(str(output_dir), vrf, prefix))
+    children = [child["prefix"] for child in data["child_prefixes"]]
+    return data["prefix"], children, [ip["id"] for ip in data["ip_addresses"]]
+
+
+def test_each_ip_is_stored_once(tmp_path, prefix_tree):
+    ips = make_ips(
+        (1, "10.0.1.200/24", None), (2, "10.0.1.5/24", None), (3, "10.0.2.1/24", None), (4, "10.0.1.5/24", 7)
+    )
+    save_data_stores(str(tmp_path), prefix_tree, ips)
+
+    ips_path, _, _ = get_store_paths(str(tmp_path), None)
+    with open(ips_path) as f:
+        assert [json.loads(line)["id"] for line in f] == [2, 1, 3], \
+            "Global IPs should be stored once, sorted by address"
+
+    prefix, children, ip_ids = read(tmp_path, "None", "10_0_0_0_16")
+    assert prefix == "10.0.0.0/16"
+    assert children == ["10.0.1.0/24", "10.0.1.128/25", "10.0.2.0/24"], "Descendants should be listed in preorder"
+    assert ip_ids == [2, 1, 3]
+    assert read(tmp_path, "None", "10_0_1_0_24")[1:] == (["10.0.1.128/25"], [2, 1])
+    assert read(tmp_path, "None", "10_0_1_128_25")[1:] == ([], [1])
+    assert read(tmp_path, "7", "10_0_0_0_16")[2] == [4], "VRFs should have separate stores"
+    assert read_payload(str(tmp_path), "None", "192_168_0_0_16") is None
+    assert read_payload(str(tmp_path), "8", "10_0_0_0_16") is None
+
+
+def test_packed_payload_matches_json(tmp_path, prefix_tree):
+    save_data_stores(str(tmp_path), prefix_tree, make_ips((1, "10.0.1.200/24", None), (2, "10.0.1.5/25", None)))
+    data = json.loads(read_payload(str(tmp_path), "None", "10_0_1_0_24"))
+    header, records = decode_packed(read_payload(str(tmp_path), "None", "10_0_1_0_24", "packed"))
+
+    assert header["prefix"] == data["prefix"]
+    assert header["child_prefixes"] == data["child_prefixes"]
+    assert header["count"] == len(records) == 2
+    assert records["id"].tolist() == [ip["id"] for ip in data["ip_addresses"]]
+    assert records["address"].tolist() == [0x0A000105, 0x0A0001C8]
+    assert records["prefixlen"].tolist() == [25, 24]
+    assert records["tenant"].tolist() == [3, 3]
+
+
+def test_large_payloads_are_precompressed(tmp_path, prefix_tree):
+    count = PRECOMPRESS_MIN_SIZE // 16
+    ips = make_ips(*((i + 1, f"10.0.{2 + i // 250}.{i % 250 + 1}/16", None) for i in range(count)))
+    save_data_stores(str(tmp_path), prefix_tree, ips)
+
+    for fmt in ("json", "packed"):
+        encoding, path = find_precompressed(
+            str(tmp_path), "None", "10_0_0_0_16", fmt, lambda encoding: encoding == "gzip"
+        )
+        with open(path, "rb") as f:
+            assert gzip.decompress(f.read()) == read_payload(str(tmp_path), "None", "10_0_0_0_16", fmt)
+    assert find_precompressed(str(tmp_path), "None", "10_0_1_0_24", "json", lambda encoding: True) is None, \
+        "Small payloads should not be precompressed"
+    assert find_precompressed(str(tmp_path), "None", "10_0_0_0_16", "json", lambda encoding: False) is None
+
+
+def test_scoped_update_keeps_ips_outside_scope(tmp_path, prefix_tree):
+    save_data_stores(
+        str(tmp_path), prefix_tree, make_ips((1, "10.0.1.5/24", None), (2, "10.0.2.1/24", None), (3, "10.0.0.1/16", 7))
+    )
+
+    # Only the IPs inside 10.0.1.0/24 were refetched: one changed, one added
+    save_data_stores(
+        str(tmp_path), prefix_tree, make_ips((1, "10.0.1.6/24", None), (4, "10.0.1.7/24", None)),
+        ip_scope={(None, "10.0.1.0/24")},
+    )
+    assert read(tmp_path, "None", "10_0_0_0_16")[2] == [1, 4, 2]
+    assert read(tmp_path, "None", "10_0_2_0_24")[2] == [2], "IPs outside the refreshed range should be kept"
+    assert read(tmp_path, "7", "10_0_0_0_16")[2] == [3], "VRFs outside the scope should be kept"
+    _, records = decode_packed(read_payload(str(tmp_path), "None", "10_0_0_0_16", "packed"))
+    assert records["id"].tolist() == [1, 4, 2], "Packed records should follow the JSON lines"
+
+
+def test_scoped_update_rewrites_only_target_payloads(tmp_path, prefix_tree, monkeypatch):
+    monkeypatch.setattr(data_store, "PRECOMPRESS_MIN_SIZE", 1)
+    save_data_stores(str(tmp_path), prefix_tree, make_ips((1, "10.0.1.5/24", None), (2, "10.0.2.1/24", None)))
+    _, kept_path = find_precompressed(str(tmp_path), "None", "10_0_2_0_24", "json", lambda encoding: True)
+    kept_inode = os.stat(kept_path).st_ino
+
+    save_data_stores(
+        str(tmp_path), prefix_tree, make_ips((1, "10.0.1.6/24", None)),
+        ip_scope={(None, "10.0.1.0/24")}, targets={(None, "10.0.1.0/24"), (None, "10.0.0.0/16")},
+    )
+    assert os.stat(kept_path).st_ino == kept_inode, "Payloads outside the targets should not be rewritten"
+    for prefix in ("10_0_0_0_16", "10_0_1_0_24", "10_0_2_0_24"):
+        _, path = find_precompressed(str(tmp_path), "None", prefix, "json", lambda encoding: encoding == "gzip")
+        with open(path, "rb") as f:
+            assert gzip.decompress(f.read()) == read_payload(str(tmp_path), "None", prefix)
+
+
+def test_index_is_parsed_once(tmp_path, prefix_tree, monkeypatch):
+    save_data_stores(str(tmp_path), prefix_tree, make_ips((1, "10.0.1.5/24", None)))
+    loads = []
+    monkeypatch.setattr(data_store.json, "load", lambda f: loads.append(f.name) or json.loads(f.read()))
+    for _ in range(3):
+        read_payload(str(tmp_path), "None", "10_0_1_0_24")
+    assert len(loads) <= 1, "The index should be reused while unchanged"
+
+    save_data_stores(str(tmp_path), prefix_tree, make_ips((1, "10.0.1.5/24", None), (2, "10.0.1.6/24", None)))
+    assert read(tmp_path, "None", "10_0_1_0_24")[2] == [1, 2], "A replaced index should be reloaded"
+
+
+def test_scoped_update_skips_other_vrfs(tmp_path, prefix_tree):
+    save_data_stores(str(tmp_path), prefix_tree, make_ips((1, "10.0.1.5/24", None), (2, "10.0.0.1/16", 7)))
+    vrf_files = {path: os.stat(path).st_ino for path in get_store_paths(str(tmp_path), 7)}
+
+    save_data_stores(
+        str(tmp_path), prefix_tree, make_ips((1, "10.0.1.6/24", None)),
+        ip_scope={(None, "10.0.1.0/24")}, targets={(None, "10.0.1.0/24"), (None, "10.0.0.0/16")},
+    )
+    assert {path: os.stat(path).st_ino for path in vrf_files} == vrf_files, \
+        "Stores of VRFs outside the scope should not be rewritten"
+    assert read(tmp_path, "7", "10_0_0_0_16")[2] == [2]
+    assert read(tmp_path, "None", "10_0_1_0_24")[2] == [1]
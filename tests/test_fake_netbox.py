@@ -0,0 +1,63 @@
+import pytest
+from app.cli import build_prefix_tree
+from app.invalidation import scope_webhook
+from app.netbox_integration import NetboxAddressManager
+from app.netbox_sync import query_params
+from benchmarks.fake_netbox import FakeNetbox
+from benchmarks.load import StageRecorder
+from benchmarks.synthetic import generate_dataset
+
+
+@pytest.fixture
+def dataset():
+    return generate_dataset(vrfs=1, roots=1, root_prefixlen=22, depth=2, fanout=3, ip_density=0.3)
+
+
+@pytest.fixture
+def netbox(dataset):
+    server = FakeNetbox(dataset, page_size=7, max_page_size=20).start()
+    yield server
+    server.stop()
+
+
+def test_fetch_all_pages(netbox, dataset):
+    mgr = NetboxAddressManager(netbox.url, "token", fetch=True, concurrency=2)
+    assert [prefix["id"] for prefix in mgr.get_prefixes()] == [prefix["id"] for prefix in dataset["prefixes"]]
+    assert len(mgr.get_ip_addresses()) == len(dataset["ip_addresses"])
+    assert mgr.get_prefixes()[0]["vrf"] is None
+    # pynetbox requests one page past the end when the count is a multiple of the page size
+    assert netbox.requests["api/ipam/ip-addresses"] in (6, 7), "limit=0 should return pages of the maximum page size"
+
+
+def test_filters(netbox, dataset):
+    vrf_ips = netbox.query("ip_addresses", {"vrf_id": "1"})
+    assert vrf_ips and all(ip["vrf"] == 1 for ip in vrf_ips)
+    assert len(netbox.query("ip_addresses", {"vrf_id": "null"})) + len(vrf_ips) == len(dataset["ip_addresses"])
+
+    leaf = dataset["prefixes"][-1]["prefix"]
+    mgr = NetboxAddressManager(netbox.url, "token", fetch=False)
+    inside = mgr.fetch_ip_addresses_within([(None, leaf)])
+    assert len(inside) == len(netbox.query("ip_addresses", {"parent": leaf, "vrf_id": "null"}))
+
+    first = dataset["ip_addresses"][0]["id"]
+    since = netbox.update("ip_addresses", first, status="reserved")["snapshots"]["postchange"]["last_updated"]
+    changed = mgr.nb.ipam.ip_addresses.filter(**query_params("ip_addresses", last_updated__gte=since))
+    assert [item.id for item in changed] == [first]
+
+
+def test_webhook_payload_is_scoped(netbox, dataset):
+    ip = dataset["ip_addresses"][0]
+    payload = netbox.update("ip_addresses", ip["id"], status="deprecated")
+    assert payload["model"] == "ipaddress" and payload["event"] == "updated"
+    assert payload["snapshots"]["prechange"]["status"] == ip["status"]
+    scope = scope_webhook(payload, build_prefix_tree(dataset["prefixes"]))
+    assert scope and ip["vrf"] in scope
+
+
+def test_stage_recorder_counts_requests(netbox):
+    recorder = StageRecorder(netbox, trace_memory=False)
+    with recorder.stage("fetch"):
+        NetboxAddressManager(netbox.url, "token", fetch=True)
+    stage = recorder.stages[0]
+    assert stage["requests"] >= 4 and stage["bytes"] > 0
+    assert "fetch" in recorder.report()
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from app.generations import collect_garbage, current_generation, get_generation_dir, list_generations, new_generation
+
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_generation_is_published_atomically(tmp_path):
+    output_dir = str(tmp_path)
+    with new_generation(output_dir) as first:
+        write(os.path.join(first, "a.png"), "one")
+        assert current_generation(output_dir) is None, "A generation should not be visible while it is written"
+    assert read(tmp_path / "current" / "a.png") == "one"
+
+    with new_generation(output_dir) as second:
+        assert read(os.path.join(second, "a.png")) == "one", "New generations should start from the previous one"
+        os.remove(os.path.join(second, "a.png"))
+        write(os.path.join(second, "a.png"), "two")
+        assert read(tmp_path / "current" / "a.png") == "one"
+    assert read(tmp_path / "current" / "a.png") == "two"
+    assert read(os.path.join(first, "a.png")) == "one", "Replacing a file should not change older generations"
+
+
+def test_failed_generation_is_not_published(tmp_path):
+    output_dir = str(tmp_path)
+    with new_generation(output_dir):
+        pass
+    published = current_generation(output_dir)
+    with pytest.raises(RuntimeError):
+        with new_generation(output_dir):
+            raise RuntimeError("update failed")
+    assert current_generation(output_dir) == published
+    assert len(list_generations(output_dir)) == 2, "Failed generations should be kept to resume from"
+
+
+def test_old_generations_are_collected(tmp_path):
+    output_dir = str(tmp_path)
+    for _ in range(4):
+        with new_generation(output_dir, keep=2):
+            pass
+    generations = list_generations(output_dir)
+    assert len(generations) == 2
+    assert current_generation(output_dir) == generations[-1]
+    assert collect_garbage(output_dir, keep=0) == generations[:1], "The published generation should never be removed"
+
+
+def test_generation_dir_rejects_paths(tmp_path):
+    with new_generation(str(tmp_path)):
+        pass
+    assert get_generation_dir(str(tmp_path), current_generation(str(tmp_path)))
+    assert get_generation_dir(str(tmp_path), "..") is None
+    assert get_generation_dir(str(tmp_path), "../generations") is None
+
+
+def test_failed_generations_do_not_count_as_kept(tmp_path):
+    output_dir = str(tmp_path)
+    with new_generation(output_dir, keep=2):
+        pass
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            with new_generation(output_dir, keep=2):
+                raise RuntimeError("update failed")
+    first, *failed = list_generations(output_dir)
+    assert collect_garbage(output_dir, keep=2) == failed[:-1], "Only the newest failed generation should be kept"
+
+    with new_generation(output_dir, keep=2):
+        pass
+    assert list_generations(output_dir) == [first, current_generation(output_dir)], \
+        "Published generations should be kept instead of failed ones"
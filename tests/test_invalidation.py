@@ -0,0 +1,81 @@
+import pytest
+from collections import Counter
+
+from app.invalidation import expand_scope, scope_webhook
+from app.prefix_tree import PrefixTree
+
+
+@pytest.fixture
+def prefix_tree():
+    tree = PrefixTree()
+    for i, (prefix, vrf, tenant) in enumerate([
+        ("10.0.0.0/16", None, 1),
+        ("10.0.1.0/24", None, 2),
+        ("10.0.2.0/24", None, 2),
+        ("10.0.0.0/16", 5, 1),
+    ]):
+        tree.add_prefix({"id": i, "prefix": prefix, "vrf": vrf, "tenant": tenant})
+    return tree
+
+
+@pytest.fixture
+def tenant_counts():
+    return Counter({1: 2, 2: 2})
+
+
+def test_ip_move_scopes_old_and_new_location(prefix_tree):
+    payload = {
+        "event": "updated",
+        "model": "ipaddress",
+        "data": {"address": "10.0.2.7/24", "vrf": None},
+        "snapshots": {
+            "prechange": {"address": "10.0.1.7/24", "vrf": 5},
+            "postchange": {"address": "10.0.2.7/24", "vrf": None},
+        },
+    }
+    scope = scope_webhook(payload, prefix_tree)
+    assert scope == {5: {"10.0.0.0/16"}, None: {"10.0.2.0/24", "10.0.0.0/16"}}, \
+        "Both the old and the new location should be re-rendered with their ancestors"
+
+
+def test_ip_is_scoped_by_host_not_by_mask(prefix_tree):
+    prefix_tree.add_prefix({"id": 10, "prefix": "10.0.1.128/25", "vrf": None, "tenant": 2})
+    payload = {
+        "event": "created",
+        "model": "ipaddress",
+        "data": {"address": "10.0.1.200/24", "vrf": None},
+        "snapshots": {"prechange": None, "postchange": {"address": "10.0.1.200/24", "vrf": None}},
+    }
+    scope = scope_webhook(payload, prefix_tree)
+    assert scope == {None: {"10.0.1.128/25", "10.0.1.0/24", "10.0.0.0/16"}}, \
+        "Prefixes longer than the IP mask should be in scope"
+
+
+def test_new_prefix_is_scoped_with_ancestors(prefix_tree, tenant_counts):
+    payload = {
+        "event": "created",
+        "model": "prefix",
+        "data": {"prefix": "10.0.3.0/24", "vrf": {"id": 5}, "tenant": {"id": 2}},
+        "snapshots": {"prechange": None, "postchange": {"prefix": "10.0.3.0/24", "vrf": 5, "tenant": 2}},
+    }
+    scope = scope_webhook(payload, prefix_tree, tenant_counts)
+    assert scope == {5: {"10.0.0.0/16", "10.0.3.0/24"}}
+    assert expand_scope(scope, prefix_tree) == {(5, "10.0.0.0/16"), (5, "10.0.3.0/24")}
+
+
+def test_new_tenant_requires_full_update(prefix_tree, tenant_counts):
+    payload = {
+        "event": "updated",
+        "model": "prefix",
+        "data": {"prefix": "10.0.1.0/24", "vrf": None, "tenant": 3},
+        "snapshots": {
+            "prechange": {"prefix": "10.0.1.0/24", "vrf": None, "tenant": 2},
+            "postchange": {"prefix": "10.0.1.0/24", "vrf": None, "tenant": 3},
+        },
+    }
+    assert scope_webhook(payload, prefix_tree, tenant_counts) is None, "Tenant colors would change"
+
+
+def test_unscoped_model_requires_full_update(prefix_tree):
+    payload = {"event": "updated", "model": "vrf", "data": {"id": 5, "name": "red"}}
+    assert scope_webhook(payload, prefix_tree) is None
@@ -0,0 +1,38 @@
+import pytest
+from app.ip_index import IPIndex
+
+
+@pytest.fixture
+def ip_index():
+    return IPIndex([
+        {"id": 1, "address": "10.0.1.20/24", "vrf": None},
+        {"id": 2, "address": "10.0.0.5/24", "vrf": None},
+        {"id": 3, "address": "10.0.1.20/24", "vrf": 1},
+        {"id": 4, "address": "10.1.0.1/16", "vrf": None},
+        {"id": 5, "address": "2001:db8::1/64", "vrf": None},
+        {"id": 6, "address": "", "vrf": None},
+        {"id": 7, "address": "not-an-ip", "vrf": None},
+    ])
+
+
+def test_lookup_returns_sorted_members(ip_index):
+    ip_ints, entries = ip_index.lookup("10.0.0.0/16", None)
+    assert [e["id"] for e in entries] == [2, 1], "Should return Global VRF members sorted by address"
+    assert ip_ints.tolist() == [167772165, 167772436], "Integer addresses should match the entries"
+
+
+def test_lookup_respects_vrf(ip_index):
+    _, entries = ip_index.lookup("10.0.1.0/24", 1)
+    assert [e["id"] for e in entries] == [3], "Should only return members of the requested VRF"
+
+
+def test_lookup_range_boundaries(ip_index):
+    _, entries = ip_index.lookup("10.0.0.0/24", None)
+    assert [e["id"] for e in entries] == [2], "Range should stop at the broadcast address"
+
+
+def test_lookup_unknown_vrf_and_ipv6(ip_index):
+    ip_ints, entries = ip_index.lookup("10.0.0.0/8", 999)
+    assert len(ip_ints) == 0 and entries == [], "Unknown VRF should be empty"
+    ip_ints, entries = ip_index.lookup("2001:db8::/32", None)
+    assert len(ip_ints) == 0 and entries == [], "IPv6 prefixes are not indexed"
@@ -0,0 +1,28 @@
+from app.ip_table import IPTable
+
+
+def test_round_trip_and_interning():
+    records = [
+        {
+            "id": 1, "address": "10.0.0.1/24", "vrf": None, "tenant": {"id": 3}, "status": "active", "role": None,
+            "tags": [],
+        },
+        {"id": 2, "address": "10.0.0.2/24", "vrf": 5, "tenant": None, "status": "active", "role": "vip", "tags": [7]},
+        {"id": 3, "address": "2001:db8::1/64", "vrf": None, "status": "active"},
+    ]
+    table = IPTable.from_records(iter(records))
+    assert len(table) == 2, "IPv6 addresses should be dropped"
+    assert table.values["status"] == [None, "active"], "Repeated values should be interned once"
+    assert table.to_records(("id", "address", "vrf", "tenant", "tags")) == [
+        {"id": 1, "address": "10.0.0.1/24", "vrf": None, "tenant": 3, "tags": []},
+        {"id": 2, "address": "10.0.0.2/24", "vrf": 5, "tenant": None, "tags": [7]},
+    ]
+
+
+def test_fingerprint_ignores_interning_order():
+    a = {"id": 1, "address": "10.0.0.1/24", "status": "active"}
+    b = {"id": 2, "address": "10.0.0.2/24", "status": "reserved"}
+    first = IPTable.from_records([a, b]).take([1])
+    second = IPTable.from_records([b]).take([0])
+    assert first.fingerprint() == second.fingerprint(), "Equal rows should have equal fingerprints"
+    assert first.fingerprint() != IPTable.from_records([a]).fingerprint()
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+import pytest
+from app import lazy_render
+from app.cli import build_prefix_tree, process_all_prefixes, select_prewarm_targets
+from app.lazy_render import LazyRenderer, RenderCache, SingleFlight
+from app.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def prefixes():
+    return [
+        {"id": 1, "prefix": "10.0.0.0/23", "vrf": None, "tenant": 1, "status": "active"},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 2, "status": "active"},
+        {"id": 3, "prefix": "10.0.1.0/25", "vrf": None, "tenant": 2, "status": "active"},
+    ]
+
+
+@pytest.fixture
+def snapshot_db(tmp_path, prefixes):
+    path = str(tmp_path / "netbox.sqlite3")
+    with SnapshotStore(path) as store:
+        store.replace("prefixes", prefixes)
+        store.replace("ip_addresses", [{"id": 1, "address": "10.0.1.1/24", "vrf": None, "status": "active"}])
+    store.close()
+    return path
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "image"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow))) for _ in range(4)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["image"] * 4
+    assert len(calls) == 1, "Concurrent calls for one key should run the function once"
+
+
+def test_render_cache_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+
+    cache.put("a", write)
+    cache.put("b", write)
+    os.utime(cache.get("a"), (1, 1))
+    os.utime(cache.get("b"), (2, 2))
+    assert cache.get("a"), "A hit should mark the image as used"
+    cache.put("c", write)
+    assert cache.get("b") is None, "The least recently used image should be evicted"
+    assert cache.get("a") and cache.get("c")
+    assert cache.size == 200
+
+
+def test_lazy_renderer_caches_by_input(tmp_path, snapshot_db):
+    renderer = LazyRenderer(snapshot_db, str(tmp_path / "cache"), 2, "raster")
+    path = renderer.render("10.0.1.0/24", None, str(tmp_path))
+    assert path and os.path.getsize(path) > 0
+    assert renderer.render("10.0.1.0/24", None, str(tmp_path)) == path, "Unchanged prefixes should hit the cache"
+    assert renderer.render("10.0.1.0/25", None, str(tmp_path)) != path
+    assert renderer.render("10.9.0.0/16", None, str(tmp_path)) is None
+
+
+def test_prewarm_renders_only_hot_prefixes(tmp_path, prefixes):
+    assert select_prewarm_targets(build_prefix_tree(prefixes), 1) == {(None, "10.0.0.0/23"), (None, "10.0.1.0/24")}
+
+    process_all_prefixes(prefixes, [], 2, str(tmp_path), "raster")
+    process_all_prefixes(prefixes, [], 2, str(tmp_path), "raster", prewarm_depth=0)
+    assert (tmp_path / "address_map-None-10_0_0_0_23.png").exists()
+    assert not (tmp_path / "address_map-None-10_0_1_0_24.png").exists(), "Other images are rendered on demand"
+    assert (tmp_path / "index-None.json").exists(), "Data stores should cover all prefixes"
+
+
+def test_cached_images_skip_the_snapshot_store(tmp_path, snapshot_db, monkeypatch):
+    renderer = LazyRenderer(snapshot_db, str(tmp_path / "cache"), 2, "raster")
+    path = renderer.render("10.0.1.0/24", None, str(tmp_path))
+
+    def no_store(*args, **kwargs):
+        raise AssertionError("A cached image should be served without opening the snapshot store")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(lazy_render, "SnapshotStore", no_store)
+        assert renderer.render("10.0.1.0/24", None, str(tmp_path)) == path
+
+    with SnapshotStore(snapshot_db) as store:
+        store.replace("ip_addresses", [{"id": 2, "address": "10.0.1.2/24", "vrf": None, "status": "active"}])
+    store.close()
+    assert renderer.render("10.0.1.0/24", None, str(tmp_path)) != path, "A changed snapshot should be re-read"
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from app.log_tail import read_lines_backward, tail_log
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("".join(
+        f"2024-01-01 00:00:{i:02d} {'ERROR' if i % 3 == 0 else 'INFO'}    message {i}\n" for i in range(30)
+    ))
+    return str(path)
+
+
+def messages(lines):
+    return [int(line.rsplit(" ", 1)[1]) for line in lines]
+
+
+def test_lines_are_read_backward_across_blocks(tmp_path):
+    path = tmp_path / "small.log"
+    path.write_bytes(b"first\n\nsecond line\nthird")
+    with open(path, "rb") as f:
+        result = list(read_lines_backward(f, os.path.getsize(path), block_size=4))
+    assert result == [(19, b"third"), (7, b"second line"), (0, b"first")]
+
+
+def test_pages_follow_the_cursor_backward(log_file):
+    lines, cursor = tail_log(log_file, limit=10)
+    assert messages(lines) == list(range(20, 30)), "The first page should hold the newest lines in file order"
+    lines, cursor = tail_log(log_file, limit=10, cursor=cursor)
+    assert messages(lines) == list(range(10, 20))
+    lines, cursor = tail_log(log_file, limit=10, cursor=cursor)
+    assert messages(lines) == list(range(0, 10))
+    assert cursor is None, "There should be no cursor at the start of the log"
+
+
+def test_level_filter(log_file):
+    lines, cursor = tail_log(log_file, limit=4, level="ERROR")
+    assert messages(lines) == [18, 21, 24, 27]
+    lines, cursor = tail_log(log_file, limit=100, level="ERROR", cursor=cursor)
+    assert messages(lines) == [0, 3, 6, 9, 12, 15]
+    assert cursor is None
+
+
+def test_scan_is_bounded(log_file):
+    lines, cursor = tail_log(log_file, limit=100, level="CRITICAL", max_scan=200)
+    assert lines == []
+    assert cursor, "A bounded scan should return a cursor to continue from"
+
+
+def test_rotated_logs_are_continued(log_file):
+    rotated = log_file + ".1"
+    os.rename(log_file, rotated)
+    os.utime(rotated, (1, 1))
+    with open(log_file, "w") as f:
+        f.write("2024-01-02 00:00:00 WARNING  message 30\n")
+
+    lines, cursor = tail_log(log_file, limit=3)
+    assert messages(lines) == [28, 29, 30]
+    lines, cursor = tail_log(log_file, limit=3, cursor=cursor)
+    assert messages(lines) == [25, 26, 27]
+    assert tail_log(log_file, cursor="missing:10") == ([], None)
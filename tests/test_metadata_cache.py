@@ -0,0 +1,41 @@
+import json
+import os
+
+from app.generations import new_generation
+from app.webapp import MetadataCache
+
+
+def publish(output_dir, vrfs, prefix_tree):
+    with new_generation(output_dir) as generation_dir:
+        for name, data in (("vrf.json", vrfs), ("prefix_tree.json", prefix_tree)):
+            path = os.path.join(generation_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+            with open(path, "w") as f:
+                json.dump(data, f)
+
+
+def test_metadata_is_cached_per_generation(tmp_path):
+    output_dir = str(tmp_path)
+    prefix_tree = {"5": {"prefixes": [{"id": 9, "prefix": "10.0.0.0/8", "sanitized": "10_0_0_0_8", "tenant": None}]}}
+    publish(output_dir, [{"id": 5, "name": "blue"}], prefix_tree)
+    cache = MetadataCache(output_dir)
+
+    metadata = cache.get()
+    assert cache.get() is metadata, "Unchanged files should not be reloaded"
+    assert metadata.get_vrf("5")["name"] == "blue"
+    assert metadata.get_vrf("6") is None
+    assert metadata.get_prefix("5", "10_0_0_0_8")["id"] == 9
+    assert [entry["prefix"] for entry in metadata.get_prefixes("5")] == ["10.0.0.0/8"]
+    prefix_tree_obj, tenant_counts = metadata.get_scope_tree()
+    assert prefix_tree_obj.get_covering_prefixes("10.1.2.3", 5) == ["10.0.0.0/8"]
+
+    publish(output_dir, [{"id": 5, "name": "green"}], prefix_tree)
+    assert cache.get().get_vrf("5")["name"] == "green", "A new generation should be picked up"
+
+
+def test_metadata_without_output(tmp_path):
+    metadata = MetadataCache(str(tmp_path)).get()
+    assert metadata.vrfs == []
+    assert metadata.get_prefixes("None") == []
+    assert metadata.get_scope_tree() is None
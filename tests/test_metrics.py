@@ -0,0 +1,75 @@
+import pytest
+from app.cli import process_all_prefixes
+from app.metrics import REGISTRY, Counter, Gauge, Histogram, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def sample(text, line_start):
+    """Return the value of the first sample line starting with line_start."""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_counter_and_gauge(registry):
+    counter = Counter('jobs', "Jobs run.", ('result',), registry=registry)
+    gauge = Gauge('up', "Up.", registry=registry)
+    counter.inc(result='ok')
+    counter.inc(2, result='ok')
+    gauge.set(1)
+    text = registry.render()
+    assert "# TYPE jobs counter" in text
+    assert sample(text, 'jobs_total{result="ok"}') == 3
+    assert sample(text, 'up') == 1
+    with pytest.raises(ValueError):
+        counter.inc(status='ok')
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram('latency', "Latency.", ('route',), registry=registry, buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, route='/')
+    text = registry.render()
+    assert sample(text, 'latency_bucket{route="/",le="0.1"}') == 1
+    assert sample(text, 'latency_bucket{route="/",le="1.0"}') == 2
+    assert sample(text, 'latency_bucket{route="/",le="+Inf"}') == 3
+    assert sample(text, 'latency_count{route="/"}') == 3
+    assert sample(text, 'latency_sum{route="/"}') == pytest.approx(5.55)
+
+
+def test_empty_families_are_omitted(registry):
+    Histogram('unused', "Never observed.", registry=registry)
+    assert registry.render() == "", "Families without samples should not be rendered"
+
+
+def test_duplicate_names_are_rejected(registry):
+    Gauge('up', "Up.", registry=registry)
+    with pytest.raises(ValueError):
+        Gauge('up', "Up again.", registry=registry)
+
+
+def test_write_textfile(tmp_path, registry):
+    Gauge('up', "Up.", registry=registry).set(1)
+    path = tmp_path / "updater.prom"
+    registry.write_textfile(str(path))
+    assert path.read_text() == registry.render()
+    assert [p.name for p in tmp_path.iterdir()] == ["updater.prom"], "Temporary files should be renamed away"
+
+
+def test_update_stages_are_timed(tmp_path):
+    prefixes = [{"id": 1, "prefix": "10.0.0.0/24", "vrf": None, "tenant": 1}]
+    ip_addresses = [{"id": 1, "address": "10.0.0.1/24", "vrf": None, "status": "active", "role": None, "tags": []}]
+    before = REGISTRY.render()
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster")
+    after = REGISTRY.render()
+    for stage in ("tree_build", "ip_index", "ip_filter", "json_write", "data_stores"):
+        key = f'prefix_map_stage_seconds_count{{stage="{stage}"}}'
+        assert (sample(after, key) or 0) > (sample(before, key) or 0), f"Stage {stage} should be timed"
+    key = 'prefix_map_rendered_prefixes_total{result="ok"}'
+    assert (sample(after, key) or 0) == (sample(before, key) or 0) + 1
+    assert sample(after, 'prefix_map_render_seconds_count{renderer="raster"}') >= 1
@@ -0,0 +1,52 @@
+import ipaddress
+
+import numpy as np
+import pytest
+from app.morton import morton_decode_array, morton_encode_array, prefix_bounding_boxes
+from app.plot_map import calculate_bounding_box, decode_offset, get_prefix_rectangles, morton_decode
+
+
+@pytest.fixture
+def offsets():
+    return np.arange(0, 1 << 16, 7, dtype=np.int64)
+
+
+def test_decode_matches_scalar(offsets):
+    xs, ys = morton_decode_array(offsets, 8)
+    expected = [morton_decode(int(z), 8) for z in offsets]
+    assert list(zip(xs.tolist(), ys.tolist())) == expected, "Batch decode should match the scalar bit loop"
+
+
+def test_encode_is_inverse_of_decode(offsets):
+    xs, ys = morton_decode_array(offsets, 8)
+    assert np.array_equal(morton_encode_array(xs, ys, 8), offsets), "Encode should invert decode"
+
+
+def test_decode_offset_rectangular_grid():
+    # /23 prefix: 32x16 grid made of two 16x16 squares
+    offsets = np.arange(512, dtype=np.int64)
+    xs, ys = decode_offset(offsets, 5, 32, 16)
+    expected = [decode_offset(int(z), 5, 32, 16) for z in offsets]
+    assert list(zip(xs.tolist(), ys.tolist())) == expected, "Array and scalar decode should agree"
+    assert xs.max() == 31 and ys.max() == 15, "Offsets should cover the whole grid"
+
+
+def test_prefix_bounding_boxes_match_scalar():
+    top = ipaddress.ip_network("10.0.0.0/16")
+    subnets = list(top.subnets(new_prefix=21)) + list(top.subnets(new_prefix=24))[:20]
+    starts = [int(s.network_address) - int(top.network_address) for s in subnets]
+    ends = [int(s.broadcast_address) - int(top.network_address) for s in subnets]
+    x1, y1, x2, y2 = prefix_bounding_boxes(starts, ends, 8)
+    expected = [calculate_bounding_box(s, top, 8) for s in subnets]
+    assert list(zip(x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist())) == expected
+
+
+def test_get_prefix_rectangles_skips_outside():
+    prefixes = [
+        {"prefix": "10.0.1.0/24", "tenant": 1},
+        {"prefix": "10.1.0.0/24", "tenant": 2},
+        {"prefix": ""},
+    ]
+    rectangles = get_prefix_rectangles("10.0.0.0/16", prefixes, 8)
+    assert [r['prefix'] for r in rectangles] == ["10.0.1.0/24"], "Only prefixes inside the top prefix are mapped"
+    assert (rectangles[0]['x1'], rectangles[0]['y1'], rectangles[0]['x2'], rectangles[0]['y2']) == (16, 0, 31, 15)
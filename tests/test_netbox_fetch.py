@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from app.netbox_integration import NetboxAddressManager
+
+PAGE_SIZE = 5
+
+
+class StubNetbox(ThreadingHTTPServer):
+    """Minimal stand-in for the NetBox list API, recording queries and peak concurrency."""
+
+    def __init__(self, datasets):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.datasets = datasets
+        self.queries = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            server.queries.append((url.path, params))
+            records = server.datasets.get(url.path.strip("/").split("/", 1)[1], [])
+            fields = params.get("fields")
+            if fields:
+                records = [{k: v for k, v in r.items() if k in fields.split(",")} for r in records]
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", 0)) or PAGE_SIZE
+            page = records[offset:offset + limit]
+            more = offset + limit < len(records)
+            time.sleep(0.02)
+            next_url = f"http://{self.headers['Host']}{url.path}?offset={offset + limit}&limit={limit}"
+            body = json.dumps({
+                "count": len(records),
+                "next": next_url if more else None,
+                "previous": None,
+                "results": page,
+            }).encode()
+        finally:
+            with server.lock:
+                server.active -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def netbox():
+    datasets = {
+        "ipam/prefixes": [{"id": i, "prefix": f"10.{i}.0.0/16", "vrf": None, "comments": "x"} for i in range(1, 13)],
+        "ipam/ip-addresses": [
+            {"id": i, "address": f"10.1.0.{i}/24", "vrf": None, "assigned_object": {"id": 1}} for i in range(1, 31)
+        ],
+        "tenancy/tenants": [{"id": 1, "name": "t1", "slug": "t1"}],
+        "ipam/vrfs": [{"id": 5, "name": "red", "rd": None}],
+    }
+    server = StubNetbox(datasets)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_all_concurrent_with_projection(netbox):
+    url = f"http://127.0.0.1:{netbox.server_address[1]}"
+    mgr = NetboxAddressManager(api_url=url, api_token="token", concurrency=2)
+    assert [p["id"] for p in mgr.get_prefixes()] == list(range(1, 13)), \
+        "All prefix pages should be merged, sorted by ID"
+    assert len(mgr.get_ip_addresses()) == 30
+    assert "comments" not in mgr.get_prefixes()[0], "Unused fields should not be requested"
+    assert all("fields" in params for _, params in netbox.queries), "Every list request should project fields"
+    assert 1 < netbox.peak <= 2, "Requests should run concurrently within the configured limit"
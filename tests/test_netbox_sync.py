@@ -0,0 +1,113 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from app.cli import save_vrf_data
+from app.netbox_sync import DATASET_FIELDS, DeltaSync
+from app.snapshot_store import SnapshotStore
+
+
+class FakeRecord:
+    def __init__(self, data):
+        self.data = data
+
+    def serialize(self):
+        return dict(self.data)
+
+
+class FakeEndpoint:
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    def all(self):
+        self.calls.append("all")
+        return [FakeRecord(item) for item in self.objects.values()]
+
+    def filter(self, **kwargs):
+        self.calls.append(kwargs)
+        items = self.objects.values()
+        if "last_updated__gte" in kwargs:
+            items = [item for item in items if item["last_updated"] >= kwargs["last_updated__gte"]]
+        return [FakeRecord(item) for item in items]
+
+
+@pytest.fixture
+def nb():
+    return SimpleNamespace(
+        ipam=SimpleNamespace(prefixes=FakeEndpoint(), ip_addresses=FakeEndpoint(), vrfs=FakeEndpoint()),
+        tenancy=SimpleNamespace(tenants=FakeEndpoint()),
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / "netbox.sqlite3"))
+    yield store
+    store.close()
+
+
+def fetch_data(fetch_method, data_type):
+    return [item.serialize() for item in fetch_method()]
+
+
+def add_ip(nb, object_id, address, last_updated):
+    nb.ipam.ip_addresses.objects[object_id] = {
+        "id": object_id, "address": address, "last_updated": last_updated,
+    }
+
+
+def test_delta_sync_merges_changes(nb, store):
+    add_ip(nb, 1, "10.0.0.1/24", "2024-01-01T00:00:00+00:00")
+    add_ip(nb, 2, "10.0.0.2/24", "2024-01-02T00:00:00+00:00")
+    DeltaSync(store).sync(nb, fetch_data)
+    assert [ip["id"] for ip in store.load("ip_addresses")] == [1, 2]
+    assert "last_updated__gte" not in nb.ipam.ip_addresses.calls[0], "First sync should fetch everything"
+
+    add_ip(nb, 3, "10.0.0.3/24", "2024-01-03T00:00:00+00:00")
+    nb.ipam.ip_addresses.objects[1]["address"] = "10.0.0.9/24"  # Changed without touching last_updated
+    DeltaSync(store).sync(nb, fetch_data)
+    high_water = nb.ipam.ip_addresses.calls[-1]["last_updated__gte"]
+    assert "2024-01-01T23:59" < high_water < "2024-01-02T00:00:00+00:00", \
+        "The high-water mark should trail the newest timestamp by the overlap"
+    assert [ip["address"] for ip in store.load("ip_addresses")] == ["10.0.0.1/24", "10.0.0.2/24", "10.0.0.3/24"], \
+        "Only objects changed since the high-water mark should be fetched"
+
+
+def test_objects_changed_during_a_sync_are_fetched_again(nb, store):
+    add_ip(nb, 1, "10.0.0.1/24", "2024-01-01T00:00:00+00:00")
+    add_ip(nb, 2, "10.0.0.2/24", "2024-01-01T00:00:00+00:00")
+    nb.tenancy.tenants.objects[1] = {"id": 1, "name": "t", "last_updated": "2024-06-01T00:00:00+00:00"}
+
+    def paginated_fetch_data(fetch_method, data_type):
+        records = fetch_method()
+        first_page = [record.serialize() for record in records[:1]]
+        if data_type == "ip_addresses":
+            # Both IPs change while the second page is requested; only the second sees it
+            nb.ipam.ip_addresses.objects[1].update(address="10.0.0.11/24", last_updated="2024-01-02T00:00:01+00:00")
+            nb.ipam.ip_addresses.objects[2].update(address="10.0.0.12/24", last_updated="2024-01-02T00:00:02+00:00")
+        return first_page + [record.serialize() for record in records[1:]]
+
+    DeltaSync(store).sync(nb, paginated_fetch_data)
+    assert [ip["address"] for ip in store.load("ip_addresses")] == ["10.0.0.1/24", "10.0.0.12/24"]
+
+    DeltaSync(store).sync(nb, fetch_data)
+    assert [ip["address"] for ip in store.load("ip_addresses")] == ["10.0.0.11/24", "10.0.0.12/24"], \
+        "Changes missed by a paginated fetch should be picked up by the next sync"
+
+
+def test_reconcile_drops_deleted_objects(nb, store):
+    add_ip(nb, 1, "10.0.0.1/24", "2024-01-01T00:00:00+00:00")
+    add_ip(nb, 2, "10.0.0.2/24", "2024-01-02T00:00:00+00:00")
+    sync = DeltaSync(store, reconcile_interval=0)
+    sync.sync(nb, fetch_data)
+    del nb.ipam.ip_addresses.objects[1]
+    sync.sync(nb, fetch_data)
+    assert [ip["id"] for ip in store.load("ip_addresses")] == [2], "Deleted objects should be removed on reconcile"
+
+
+def test_vrf_fields_cover_saved_vrf_data(tmp_path):
+    save_vrf_data([{"id": 1}], str(tmp_path))
+    with open(tmp_path / "vrf.json") as f:
+        saved = json.load(f)[0]
+    assert set(saved) <= set(DATASET_FIELDS["vrfs"]), "Every saved VRF field should be fetched from NetBox"
@@ -0,0 +1,52 @@
+import matplotlib.image
+import numpy as np
+import pytest
+from app.color_design import design_color_palette
+from app.ip_index import IPIndex
+from app.ip_table import IPTable
+from app.plot_batched import get_grid_figure, plot_allocation_grid_batched
+from app.plot_map import build_tenant_color_map, plot_allocation_grid
+
+
+@pytest.fixture
+def prefixes():
+    return [
+        {"id": 1, "prefix": "10.0.0.0/23", "vrf": None, "tenant": None},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 7},
+        {"id": 3, "prefix": "10.0.1.128/25", "vrf": None, "tenant": 8},
+    ]
+
+
+@pytest.fixture
+def ip_table():
+    ips = [
+        {"address": "10.0.0.0/24", "status": "active", "role": None},
+        {"address": "10.0.0.9/24", "status": "reserved", "role": None},
+        {"address": "10.0.1.5/24", "status": "active", "role": "anycast"},
+        {"address": "10.0.1.6/24", "status": "inactive", "role": None},
+    ]
+    return IPIndex(ips).lookup_table("10.0.0.0/23")
+
+
+def test_matches_matplotlib_renderer(tmp_path, prefixes, ip_table):
+    tenant_color_map = build_tenant_color_map(prefixes)
+    plot_allocation_grid(prefixes[0], prefixes[1:], ip_table, str(tmp_path / "patches.png"), 4, tenant_color_map)
+    plot_allocation_grid_batched(
+        prefixes[0], prefixes[1:], ip_table, str(tmp_path / "batched.png"), 4, tenant_color_map
+    )
+    expected = matplotlib.image.imread(tmp_path / "patches.png")
+    image = matplotlib.image.imread(tmp_path / "batched.png")
+    assert np.array_equal(image, expected), "Collections should draw the same pixels as patches"
+
+
+def test_figure_is_reused_across_prefixes(tmp_path, prefixes, ip_table):
+    tenant_color_map = build_tenant_color_map(prefixes)
+    plot_allocation_grid_batched(prefixes[0], prefixes[1:], ip_table, str(tmp_path / "a.png"), 4, tenant_color_map)
+    figure = get_grid_figure(32, 16, 4, design_color_palette())
+    assert not figure.ax.collections, "Per-prefix collections should be removed after saving"
+
+    other = {"id": 4, "prefix": "10.0.2.0/23", "vrf": None, "tenant": None}
+    plot_allocation_grid_batched(other, [], IPTable.from_records([]), str(tmp_path / "b.png"), 4, tenant_color_map)
+    assert get_grid_figure(32, 16, 4, design_color_palette()) is figure, "Prefixes of one size should share a figure"
+    assert [label.get_text() for label in figure.labels] == ["2", "3"], "Labels should follow the prefix"
+    assert (tmp_path / "b.png").exists()
@@ -0,0 +1,29 @@
+import pytest
+from app.prefix_tree import PrefixTree
+
+
+@pytest.fixture
+def prefix_tree():
+    tree = PrefixTree()
+    for prefix in ["10.2.0.0/16", "10.1.1.0/24", "10.0.0.0/8", "10.1.0.0/16", "10.1.1.128/25", "192.168.0.0/16"]:
+        tree.add_prefix({"prefix": prefix, "vrf": 1})
+    return tree
+
+
+def test_get_subtree_has_direct_children(prefix_tree):
+    subtree = prefix_tree.get_subtree("10.0.0.0/8", 1)
+    assert [child["prefix"] for child in subtree["children"]] == ["10.1.0.0/16", "10.2.0.0/16"]
+    assert [child["prefix"] for child in subtree["children"][0]["children"]] == ["10.1.1.0/24"]
+
+
+def test_get_descendants_in_address_order(prefix_tree):
+    descendants = prefix_tree.get_descendants("10.0.0.0/8", 1)
+    assert [d["prefix"] for d in descendants] == ["10.1.0.0/16", "10.1.1.0/24", "10.1.1.128/25", "10.2.0.0/16"]
+    assert prefix_tree.get_descendants("10.0.0.0/8", 2) == [], "Unknown VRF should have no descendants"
+
+
+def test_adding_prefix_refreshes_tree(prefix_tree):
+    assert prefix_tree.get_covering_prefixes("10.3.0.1", 1) == ["10.0.0.0/8"]
+    prefix_tree.add_prefix({"prefix": "10.3.0.0/16", "vrf": 1})
+    assert prefix_tree.get_covering_prefixes("10.3.0.1", 1) == ["10.3.0.0/16", "10.0.0.0/8"]
+    assert "10.3.0.0/16" in prefix_tree.get_children_recursively("10.0.0.0/8", 1)
@@ -0,0 +1,91 @@
+import json
+import threading
+
+import pytest
+from app.cli import process_all_prefixes, run_prefix_job
+from app.data_store import read_payload
+from app.ip_table import IPTable
+from app.updater_manager import UpdateCancelled
+
+
+@pytest.fixture
+def prefixes():
+    return [
+        {"id": 1, "prefix": "10.0.0.0/23", "vrf": None, "tenant": 1},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 2},
+        {"id": 3, "prefix": "10.0.0.0/23", "vrf": 5, "tenant": None},
+    ]
+
+
+@pytest.fixture
+def ip_addresses():
+    return [
+        {"id": 1, "address": "10.0.0.1/24", "vrf": None, "status": "active", "role": None, "tags": []},
+        {"id": 2, "address": "10.0.1.1/24", "vrf": None, "status": "active", "role": None, "tags": []},
+        {"id": 3, "address": "10.0.1.2/24", "vrf": 5, "status": "active", "role": None, "tags": []},
+    ]
+
+
+def load_data(output_dir, vrf, prefix):
+    return json.loads(read_payload(str(output_dir), vrf, prefix))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_process_all_prefixes(tmp_path, prefixes, ip_addresses, workers):
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster", workers)
+    data = load_data(tmp_path, "None", "10_0_0_0_23")
+    assert [ip["id"] for ip in data["ip_addresses"]] == [1, 2], "Global VRF prefix should only hold Global IPs"
+    assert [child["prefix"] for child in data["child_prefixes"]] == ["10.0.1.0/24"]
+    data = load_data(tmp_path, "5", "10_0_0_0_23")
+    assert [ip["id"] for ip in data["ip_addresses"]] == [3], "VRF prefix should only hold its own IPs"
+    assert (tmp_path / "address_map-5-10_0_0_0_23.png").exists()
+    assert (tmp_path / "prefix_tree.json").exists()
+    assert not list(tmp_path.glob("data-*.json")), "Per-prefix data files should not be written"
+
+
+def test_run_prefix_job_isolates_errors(tmp_path):
+    job = {
+        "prefix_entry": {"prefix": "not-a-prefix"},
+        "child_prefixes": [],
+        "ip_addresses": IPTable.from_records([]),
+    }
+    context = {"cell_size": 2, "tenant_color_map": {}, "output_dir": str(tmp_path), "renderer": "raster"}
+    prefix, error = run_prefix_job(job, context)
+    assert prefix == "not-a-prefix"
+    assert error, "Errors should be reported instead of raised"
+
+
+def test_unchanged_prefixes_are_skipped(tmp_path, prefixes, ip_addresses):
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster")
+    parent = tmp_path / "address_map-None-10_0_0_0_23.png"
+    other_vrf = tmp_path / "address_map-5-10_0_0_0_23.png"
+    parent.write_bytes(b"sentinel")
+    other_vrf.write_bytes(b"sentinel")
+
+    ip_addresses[1]["status"] = "reserved"
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster")
+    assert parent.read_bytes() != b"sentinel", "Prefix with a changed IP should be re-rendered"
+    assert other_vrf.read_bytes() == b"sentinel", "Unchanged prefix should not be re-rendered"
+
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster", force=True)
+    assert other_vrf.read_bytes() != b"sentinel", "Force should re-render everything"
+
+
+def test_removed_prefixes_lose_their_images(tmp_path, prefixes, ip_addresses):
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster")
+    process_all_prefixes(prefixes[:2], ip_addresses, 2, str(tmp_path), "raster")
+    assert not (tmp_path / "address_map-5-10_0_0_0_23.png").exists(), "Images of removed prefixes should be deleted"
+    assert not list(tmp_path.glob("index-5.*")), "Stores of VRFs without prefixes should be deleted"
+    assert (tmp_path / "address_map-None-10_0_1_0_24.png").exists()
+
+
+def test_cancelled_update_stops_between_jobs(tmp_path, prefixes, ip_addresses):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(UpdateCancelled):
+        process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster", cancel=cancel)
+    assert len(list(tmp_path.glob("address_map-*.png"))) == 1, "Rendering should stop after the running job"
+    assert not (tmp_path / "prefix_tree.json").exists()
+
+    process_all_prefixes(prefixes, ip_addresses, 2, str(tmp_path), "raster")
+    assert len(list(tmp_path.glob("address_map-*.png"))) == 3
@@ -0,0 +1,81 @@
+import cProfile
+import pstats
+
+import pytest
+
+from app.cli import process_all_prefixes
+from app.profiling import PipelineProfiler, collapse_stats, get_profiler, profile_update, profiled
+
+
+def inner():
+    return sum(i * i for i in range(20000))
+
+
+def outer():
+    return inner() + inner()
+
+
+def busy_outside():
+    return sum(i for i in range(20000))
+
+
+def function_names(profile):
+    return {name for _, _, name in pstats.Stats(profile).stats}
+
+
+def test_collapse_stats_rebuilds_stacks():
+    profile = cProfile.Profile()
+    with profiled(profile):
+        outer()
+    stacks = collapse_stats(pstats.Stats(profile).stats, root="stage")
+    assert stacks, "The profile should produce stacks"
+    assert all(stack.startswith("stage;") for stack in stacks), "Every stack should start with the root frame"
+    assert any("outer (" in stack and stack.index("outer (") < stack.find("inner (") for stack in stacks), \
+        "inner should be nested below outer"
+    assert all(count > 0 for count in stacks.values())
+
+
+def test_nested_profiles_are_exclusive():
+    outer_profile = cProfile.Profile()
+    inner_profile = cProfile.Profile()
+    with profiled(outer_profile):
+        busy_outside()
+        with profiled(inner_profile):
+            inner()
+        busy_outside()
+    assert "inner" in function_names(inner_profile)
+    assert "inner" not in function_names(outer_profile), "The outer profile should pause during the inner one"
+    assert "busy_outside" in function_names(outer_profile), "The outer profile should resume after the inner one"
+
+
+def test_profile_update_reports_stages_and_prefixes(tmp_path):
+    prefixes = [
+        {"id": 1, "prefix": "10.0.0.0/23", "vrf": None, "tenant": 1},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 2},
+    ]
+    ip_addresses = [{"id": 1, "address": "10.0.1.1/24", "vrf": None, "status": "active", "role": None, "tags": []}]
+    profile_dir = tmp_path / "profile"
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    with profile_update(str(profile_dir), top=1):
+        assert get_profiler() is not None
+        process_all_prefixes(prefixes, ip_addresses, 2, str(output_dir), "raster")
+    assert get_profiler() is None
+
+    for stage in ("other", "tree_build", "ip_index", "render", "data_stores"):
+        assert (profile_dir / f"{stage}.prof").exists(), f"Stage {stage} should be profiled"
+    collapsed = (profile_dir / "stages.collapsed").read_text().splitlines()
+    assert any(line.startswith("render;") for line in collapsed)
+    assert len(list(profile_dir.glob("prefix-*.prof"))) == 1, "Only the slowest prefixes should be kept"
+    report = (profile_dir / "report.txt").read_text()
+    assert "Slowest 1 of 2 prefixes" in report
+
+
+def test_failed_stage_is_recorded(tmp_path):
+    profiler = PipelineProfiler(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with profiler.stage("render"):
+            inner()
+            raise RuntimeError("render failed")
+    assert "inner" in {name for _, _, name in profiler.stages["render"].stats}, \
+        "A failed stage should keep its profile"
@@ -0,0 +1,46 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from app.ip_index import IPIndex
+from app.plot_map import build_tenant_color_map
+from app.raster import encode_png, render_allocation_grid
+
+
+@pytest.fixture
+def prefixes():
+    return [
+        {"id": 1, "prefix": "10.0.0.0/23", "vrf": None, "tenant": None},
+        {"id": 2, "prefix": "10.0.1.0/24", "vrf": None, "tenant": 7},
+    ]
+
+
+def read_png(data):
+    assert data[:8] == b"\x89PNG\r\n\x1a\n", "Should start with the PNG signature"
+    width, height = struct.unpack(">II", data[16:24])
+    idat_len = struct.unpack(">I", data[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(data[41:41 + idat_len]), dtype=np.uint8)
+    return raw.reshape(height, width * 4 + 1)[:, 1:].reshape(height, width, 4)
+
+
+def test_encode_png_round_trip():
+    rgba = np.random.default_rng(0).integers(0, 256, size=(5, 7, 4), dtype=np.uint8)
+    assert np.array_equal(read_png(encode_png(rgba)), rgba), "Decoded pixels should match the input"
+
+
+def test_render_allocation_grid(tmp_path, prefixes):
+    ips = [
+        {"address": "10.0.0.0/24", "status": "active", "role": None},
+        {"address": "10.0.1.5/24", "status": "active", "role": "anycast"},
+    ]
+    ip_table = IPIndex(ips).lookup_table("10.0.0.0/23")
+    output_file = tmp_path / "map.png"
+    render_allocation_grid(
+        prefixes[0], prefixes[1:], ip_table, str(output_file), 4, build_tenant_color_map(prefixes)
+    )
+    image = read_png(output_file.read_bytes())
+    assert image.shape == (16 * 4, 32 * 4, 4), "A /23 should render as a 32x16 cell grid"
+    assert tuple(image[2, 2, :3]) == (0, 0, 0), "First IP cell should be painted black"
+    # 10.0.1.5 is offset 5 in the right-hand square: x = 16 + 3, y = 0
+    assert tuple(image[2, 19 * 4 + 2, :3]) == (255, 0, 0), "Special role should be painted red"
@@ -0,0 +1,37 @@
+import pytest
+from app.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def store():
+    store = SnapshotStore(":memory:")
+    with store:
+        store.replace("prefixes", [
+            {"id": 1, "prefix": "10.0.0.0/16", "vrf": None},
+            {"id": 2, "prefix": "10.0.1.0/24", "vrf": None},
+            {"id": 3, "prefix": "10.0.1.0/24", "vrf": {"id": 5}},
+            {"id": 4, "prefix": "2001:db8::/32", "vrf": None},
+        ])
+        store.replace("ip_addresses", [
+            {"id": 1, "address": "10.0.1.20/24", "vrf": None},
+            {"id": 2, "address": "10.0.1.5/24", "vrf": None},
+            {"id": 3, "address": "10.0.1.5/24", "vrf": 5},
+            {"id": 4, "address": "10.1.0.1/16", "vrf": None},
+        ])
+    yield store
+    store.close()
+
+
+def test_range_queries(store):
+    assert [p["id"] for p in store.prefixes_within("10.0.0.0/16")] == [1, 2], "Should select by VRF and range"
+    assert [p["id"] for p in store.prefixes_within("10.0.1.0/24", 5)] == [3]
+    assert [ip["id"] for ip in store.ip_addresses_within("10.0.1.0/24")] == [2, 1], "Should sort by address"
+    assert store.ip_addresses_within("2001:db8::/32") == [], "IPv6 ranges are not indexed"
+
+
+def test_upsert_and_delete(store):
+    with store:
+        store.upsert("ip_addresses", [{"id": 1, "address": "10.1.0.2/16", "vrf": None}])
+        store.delete("ip_addresses", [4])
+    assert [ip["address"] for ip in store.load("ip_addresses")] == ["10.1.0.2/16", "10.0.1.5/24", "10.0.1.5/24"]
+    assert [ip["id"] for ip in store.ip_addresses_within("10.1.0.0/16")] == [1], "Address index should follow updates"
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+from app.updater_manager import UpdateCancelled, UpdaterManager, check_cancelled
+
+
+class Recorder:
+    def __init__(self, block=None):
+        self.calls = []
+        self.started = threading.Event()
+        self.block = block
+
+    def full(self, cancel=None):
+        self.calls.append(('full', None))
+        return self._run(cancel)
+
+    def scoped(self, scope, cancel=None):
+        self.calls.append(('scoped', {vrf: set(prefixes) for vrf, prefixes in scope.items()}))
+        return self._run(cancel)
+
+    def _run(self, cancel):
+        self.started.set()
+        if self.block is not None:
+            # Simulate stages of a long update
+            while not self.block.is_set():
+                check_cancelled(cancel, "next stage")
+                time.sleep(0.01)
+        return True
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def managers():
+    created = []
+    yield created
+    for manager in created:
+        manager.stop()
+
+
+def test_burst_is_debounced_into_one_update(managers):
+    recorder = Recorder()
+    manager = UpdaterManager(recorder.full, 0.2, recorder.scoped, max_wait=10)
+    managers.append(manager)
+    for i in range(50):
+        manager.webhook_received({None: {f"10.0.{i}.0/24"}})
+    assert manager.stats()['pending_events'] == 50
+    assert wait_for(lambda: manager.stats()['runs'] == 1)
+    time.sleep(0.3)
+    assert len(recorder.calls) == 1, "A burst of webhooks should coalesce into one update"
+    kind, scope = recorder.calls[0]
+    assert kind == 'scoped' and len(scope[None]) == 50
+    assert manager.stats()['last_run']['events'] == 50
+
+
+def test_unscoped_webhook_coalesces_into_full_update(managers):
+    recorder = Recorder()
+    manager = UpdaterManager(recorder.full, 0.1, recorder.scoped)
+    managers.append(manager)
+    manager.webhook_received({None: {"10.0.0.0/24"}})
+    manager.webhook_received(None)
+    assert wait_for(lambda: manager.stats()['runs'] == 1)
+    assert recorder.calls == [('full', None)]
+
+
+def test_max_wait_bounds_debounce(managers):
+    recorder = Recorder()
+    manager = UpdaterManager(recorder.full, 0.2, max_wait=0.3)
+    managers.append(manager)
+    start = time.time()
+    # Webhooks keep arriving more often than the debounce interval
+    while not recorder.calls and time.time() - start < 3:
+        manager.webhook_received()
+        time.sleep(0.05)
+    assert recorder.calls, "An update should start within max_wait despite continuous webhooks"
+    assert time.time() - start < 1
+
+
+def test_webhook_preempts_running_update(managers):
+    block = threading.Event()
+    recorder = Recorder(block)
+    manager = UpdaterManager(recorder.full, 0.05, recorder.scoped, max_wait=10)
+    managers.append(manager)
+    manager.webhook_received({None: {"10.0.0.0/24"}})
+    assert recorder.started.wait(5)
+    manager.webhook_received({None: {"10.0.1.0/24"}})
+    assert wait_for(lambda: manager.stats()['preemptions'] == 1 and manager.stats()['runs'] >= 1)
+    block.set()
+    assert wait_for(lambda: manager.stats()['last_run']['result'] == 'ok')
+    stats = manager.stats()
+    assert stats['pending_events'] == 0
+    assert recorder.calls[-1] == ('scoped', {None: {"10.0.0.0/24", "10.0.1.0/24"}}), \
+        "Preempted work should be requeued with the new webhook"
+
+
+def test_starving_update_is_not_preempted(managers):
+    block = threading.Event()
+    recorder = Recorder(block)
+    manager = UpdaterManager(recorder.full, 0, max_wait=0)
+    managers.append(manager)
+    manager.webhook_received()
+    assert recorder.started.wait(5)
+    manager.webhook_received()
+    block.set()
+    assert wait_for(lambda: manager.stats()['runs'] == 2)
+    assert manager.stats()['preemptions'] == 0
+
+
+def test_check_cancelled():
+    check_cancelled(None, "stage")
+    cancel = threading.Event()
+    check_cancelled(cancel, "stage")
+    cancel.set()
+    with pytest.raises(UpdateCancelled):
+        check_cancelled(cancel, "stage")
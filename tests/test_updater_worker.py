@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+
+import pytest
+from app.cli import UpdateState
+from app.generations import new_generation
+from app.updater_worker import RemoteUpdater, UpdaterWorker, get_socket_path
+
+
+@pytest.fixture
+def worker(tmp_path):
+    calls = []
+
+    def full(cancel=None):
+        calls.append(None)
+        with new_generation(str(tmp_path)):
+            pass
+        return True
+
+    def scoped(scope, cancel=None):
+        calls.append(scope)
+        return True
+
+    worker = UpdaterWorker(get_socket_path(str(tmp_path)), str(tmp_path), full, scoped, debounce_interval=0.05)
+    worker.calls = calls
+    thread = threading.Thread(target=worker.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while worker._listener is None and time.time() < deadline:
+        time.sleep(0.01)
+    yield worker
+    worker.stop()
+    thread.join(5)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_remote_webhooks_run_in_worker(worker):
+    published = []
+    client = RemoteUpdater(worker.address, on_published=published.append)
+    client.webhook_received({None: {"10.0.0.0/24"}})
+    assert wait_for(lambda: client.stats()['runs'] == 1)
+    assert worker.calls == [{None: {"10.0.0.0/24"}}]
+
+    client.webhook_received()
+    assert wait_for(lambda: len(published) == 1), "Subscribers should be notified of published generations"
+    assert published[0] == worker.generation
+    client.close()
+
+
+def test_second_worker_refuses_the_socket(worker, tmp_path):
+    other = UpdaterWorker(worker.address, str(tmp_path), lambda cancel=None: True)
+    with pytest.raises(RuntimeError):
+        other.serve_forever()
+    other.manager.stop()
+
+
+def test_remote_updater_without_worker(tmp_path):
+    client = RemoteUpdater(get_socket_path(str(tmp_path)))
+    with pytest.raises(OSError):
+        client.webhook_received()
+
+
+def test_update_state_reuses_prefix_tree():
+    prefixes = [{"id": 1, "prefix": "10.0.0.0/16", "vrf": None, "tenant": 1, "status": "active"}]
+    state = UpdateState()
+    tree = state.get_prefix_tree(prefixes)
+    changed_status = [dict(prefixes[0], status="reserved")]
+    assert state.get_prefix_tree(changed_status) is tree, "Fields outside the tree should not rebuild it"
+    assert state.get_prefix_tree(prefixes + [{"id": 2, "prefix": "10.1.0.0/16"}]) is not tree
+
+
+def test_stats_do_not_spawn_the_worker(tmp_path):
+    marker = tmp_path / "spawned"
+    client = RemoteUpdater(get_socket_path(str(tmp_path)), [sys.executable, "-c", f"open({str(marker)!r}, 'w')"])
+    assert client.stats() == {"worker": "not running", "running": False}
+    assert client._process is None and not marker.exists(), "Reading stats should not start a worker"
+    client.close()
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of the rendering and NetBox stack, which the web app must not load before serving
+HEAVY_MODULES = ('app.cli', 'app.plot_map', 'app.raster', 'app.netbox_integration', 'matplotlib', 'pynetbox', 'PIL')
+
+IMPORT_SCRIPT = f"""
+import json, sys
+import app.webapp
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def import_webapp(tmp_path, **env):
+    """Import the web app in a fresh interpreter and return the heavy modules it loaded."""
+    env = dict(os.environ, OUTPUT_DIR=str(tmp_path), **env)
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT], cwd=REPO_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("updater_mode", ["thread", "process", "daemon"])
+@pytest.mark.parametrize("render_mode", ["eager", "lazy"])
+def test_webapp_starts_without_rendering_stack(tmp_path, updater_mode, render_mode):
+    loaded = import_webapp(tmp_path, UPDATER_MODE=updater_mode, RENDER_MODE=render_mode, UPDATE_DEBOUNCE='3600')
+    assert loaded == [], f"Importing the web app should not load {loaded}"